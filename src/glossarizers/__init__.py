@@ -1,4 +1,41 @@
-from .ckan_glossarizer import *
-from .socrata_glossarizer import *
-# Don't import pager because it inits Ghostdriver+PhantomJS which massively slows down typing due to a bug.
-# from .pager import *
\ No newline at end of file
+"""
+The package namespace re-exports everything in `socrata_glossarizer` and `ckan_glossarizer` (the former taking
+precedence where the two share a name), and every submodule. None of it is imported until it is first used, as the
+glossarizers between them pull in pandas, pysocrata, selenium and so on, which makes `import glossarizers` take the
+better part of a second, a cost paid again by every short-lived CLI and worker process. The pager, which starts a
+PhantomJS process, is likewise left alone until it is needed.
+
+Attribute lookups are made lazy by swapping the class of the package module for one with a `__getattr__` (module-level
+`__getattr__` functions only work on Python 3.7 and up). Note that `from glossarizers import *` therefore imports
+nothing; import from the glossarizers themselves instead.
+"""
+
+import importlib
+import importlib.util
+import sys
+import types
+
+
+# The submodules whose contents the package namespace re-exports, in order of precedence.
+_REEXPORTED = ('socrata_glossarizer', 'ckan_glossarizer')
+
+
+class _LazyPackage(types.ModuleType):
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError("module {0!r} has no attribute {1!r}".format(self.__name__, name))
+
+        if importlib.util.find_spec("{0}.{1}".format(self.__name__, name)) is not None:
+            return importlib.import_module("{0}.{1}".format(self.__name__, name))
+
+        for module_name in _REEXPORTED:
+            module = importlib.import_module("{0}.{1}".format(self.__name__, module_name))
+            if hasattr(module, name):
+                value = getattr(module, name)
+                setattr(self, name, value)
+                return value
+
+        raise AttributeError("module {0!r} has no attribute {1!r}".format(self.__name__, name))
+
+
+sys.modules[__name__].__class__ = _LazyPackage
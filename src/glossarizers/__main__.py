@@ -0,0 +1,10 @@
+"""
+Runs the `glossarizers` command-line crawl runner. See `cli.py`.
+"""
+
+import sys
+
+from .cli import main
+
+
+sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Benchmarks the CKAN `package_show` crawl against a local stub CKAN server, at a range of concurrency settings.
+
+The stub server serves a synthetic catalog.data.ug-shaped portal of `--packages` packages, sleeping `--latency`
+seconds before answering each request to simulate the round trip to a real portal. "sequential" opens a new connection
+for every request, "pooled" reuses connections from the shared session. Run from this directory:
+
+    python ckan_crawl_benchmark.py --packages 500 --latency 0.05
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import ckan_glossarizer
+from glossarizers.crawler import fetch_json_all
+from glossarizers.session import get_session
+from glossarizers import throttle
+import requests
+
+
+def stub_package(package_id):
+    return {
+        'success': True,
+        'result': {
+            'id': package_id,
+            'title': "Package {0}".format(package_id),
+            'notes': "A synthetic package.",
+            'license_title': "Creative Commons Attribution",
+            'organization': {'title': "Stub Bureau of Statistics"},
+            'tags': [{'name': "Population"}],
+            'metadata_created': "2017-02-15T09:02:54.210714",
+            'metadata_modified': "2017-02-15T10:26:35.978534",
+            'resources': [{'url': "http://127.0.0.1/{0}/data.csv".format(package_id), 'format': "CSV",
+                           'name': "data"}]
+        }
+    }
+
+
+class StubCKANHandler(BaseHTTPRequestHandler):
+    # Keep connections alive, as a real portal would. Headers and body are written separately, so disable Nagle's
+    # algorithm, lest every response on a kept-alive connection stall waiting on a delayed ACK.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    packages = 0
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlparse(self.path)
+
+        if url.path == "/api/3/action/package_list":
+            body = {'success': True, 'result': ["package-{0}".format(i) for i in range(self.packages)]}
+        elif url.path == "/api/3/action/package_show":
+            body = stub_package(parse_qs(url.query)['id'][0])
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubCKANServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def serve(packages, latency):
+    handler = type('Handler', (StubCKANHandler,), {'packages': packages, 'latency': latency})
+    server = StubCKANServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def crawl(root, concurrency):
+    package_list = requests.get("{0}/api/3/action/package_list".format(root)).json()['result']
+    slugs = ["{0}/api/3/action/package_show?id={1}".format(root, p) for p in package_list]
+
+    if concurrency == "pooled":
+        # Sequential, but reusing connections from the shared session.
+        session = get_session()
+        metadatas = [session.get(slug).json() for slug in slugs]
+    elif concurrency:
+        metadatas = fetch_json_all(slugs, concurrency=concurrency, per_host=concurrency)
+    else:
+        metadatas = [requests.get(slug).json() for slug in slugs]
+
+    roi_repr = []
+    for metadata in metadatas:
+        roi_repr += ckan_glossarizer.package_resources(metadata, domain="catalog.data.ug", protocol="http")
+    return roi_repr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--packages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[0, 1, 4, 16, 64])
+    args = parser.parse_args()
+    args.concurrency.insert(1, "pooled")
+
+    server = serve(args.packages, args.latency)
+    root = "http://127.0.0.1:{0}".format(server.server_address[1])
+
+    # The stub server can take whatever we throw at it, so don't throttle requests to it.
+    stub = throttle.host(root)
+    stub.bucket.rate = stub.bucket.burst = stub.max_rate = float(10 ** 6)
+    stub.limit = stub.max_concurrency = 1024
+
+    print("{0:>12} {1:>10} {2:>14}".format("concurrency", "seconds", "packages/sec"))
+    baseline = None
+    for concurrency in args.concurrency:
+        start = time.time()
+        roi_repr = crawl(root, concurrency)
+        elapsed = time.time() - start
+
+        assert len(roi_repr) == args.packages
+        if baseline is None:
+            baseline = roi_repr
+        # Every concurrency setting must produce the same records in the same order.
+        assert roi_repr == baseline
+
+        print("{0:>12} {1:>10.2f} {2:>14.1f}".format(concurrency or "sequential", elapsed,
+                                                     args.packages / elapsed))
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
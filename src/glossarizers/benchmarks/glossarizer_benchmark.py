@@ -0,0 +1,228 @@
+"""
+Benchmarks `write_resource_representation` and `write_glossary` end to end, against synthetic portals served offline.
+
+For each platform and catalog size, a synthetic Socrata-shaped (data.cityofnewyork.us) or CKAN-shaped (catalog.data.ug)
+portal is made up (see `replay.synthesize_socrata` and `replay.synthesize_ckan`) and served by a local stub server,
+which waits `--latency` (plus up to `--jitter`) seconds before answering each request, rejects requests beyond `--rate`
+per second with a 429, and fails a `--failure-rate` fraction of them with a 503. The glossarizers are then run against
+it, unmodified, in a fresh process, with every request they make replayed to the stub server (see `replay.replay`).
+CKAN packages are read `--concurrency` at a time by the asynchronous crawler, as the command line does by default
+(pass `--concurrency 0` to read them one at a time instead). Socrata tables are sized using the SODA API backend, as
+paging them requires a browser; the download links of blobs and links are read off of their view metadata.
+
+For each step, reports the number of resources written out, resources per second, the 50th and 99th percentile round
+trip time of the requests made (in the synthetic portals each resource takes one request to read or to size), and
+the peak resident memory of the benchmark process and of its worker processes so far. Unless `--throttled` is passed,
+the client-side throttle is lifted, so as to measure the glossarizers rather than the throttle. Progress bars are
+turned off. Run from this directory:
+
+    python glossarizer_benchmark.py --platform ckan socrata --sizes 1000 10000 100000 --latency 0.01
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import resource
+import shutil
+import tempfile
+import time
+from functools import partialmethod
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import replay, throttle
+
+
+DOMAINS = {'ckan': "http://catalog.data.ug", 'socrata': "https://data.cityofnewyork.us"}
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def read_latencies(log_filename):
+    if not os.path.isfile(log_filename):
+        return []
+    with open(log_filename, "r") as fp:
+        return [float(line.rstrip("\n").split("\t")[2]) for line in fp]
+
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux. For children, it is that of the largest child.
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+
+
+def measure(step, directory, address, func):
+    """
+    Runs a step, replaying its requests to the stub server. Returns its measurements; `func` returns the number of
+    resources it wrote out.
+    """
+    log_filename = os.path.join(directory, "{0}.log".format(step))
+    start = time.monotonic()
+    with replay.replay(address, log_filename=log_filename):
+        n = func()
+    elapsed = time.monotonic() - start
+
+    latencies = read_latencies(log_filename)
+    rss, children_rss = peak_rss()
+    return {'step': step, 'resources': n, 'seconds': elapsed, 'rate': n / elapsed if elapsed else float('nan'),
+            'p50': percentile(latencies, 50) * 1000, 'p99': percentile(latencies, 99) * 1000, 'rss': rss,
+            'children_rss': children_rss}
+
+
+def run_ckan(directory, address, processes, concurrency):
+    from glossarizers import ckan_glossarizer
+    from glossarizers.generic import load_resource_list, load_glossary
+
+    resource_filename = os.path.join(directory, "resources.json")
+    glossary_filename = os.path.join(directory, "glossary.json")
+
+    def resources():
+        ckan_glossarizer.write_resource_representation(domain="catalog.data.ug", out=resource_filename,
+                                                       protocol="http", concurrency=concurrency or None)
+        return len(load_resource_list(resource_filename))
+
+    def glossary():
+        ckan_glossarizer.write_glossary(domain="catalog.data.ug", resource_filename=resource_filename,
+                                        glossary_filename=glossary_filename, processes=processes)
+        return len(load_glossary(glossary_filename))
+
+    return [measure("resources", directory, address, resources), measure("glossary", directory, address, glossary)]
+
+
+def run_socrata(directory, address, processes, concurrency):
+    from glossarizers import socrata_glossarizer
+    from glossarizers.generic import load_resource_list, load_glossary
+
+    catalog_filename = os.path.join(directory, "catalog.json")
+    filenames = {endpoint_type: (os.path.join(directory, "{0} resources.json".format(endpoint_type)),
+                                 os.path.join(directory, "{0} glossary.json".format(endpoint_type)))
+                 for endpoint_type in ["table", "geospatial dataset", "blob", "link"]}
+
+    def resources():
+        n = 0
+        for endpoint_type, (resource_filename, _) in filenames.items():
+            # The catalog is read from the catalog file, so the credentials are never used.
+            socrata_glossarizer.write_resource_representation(domain="data.cityofnewyork.us", out=resource_filename,
+                                                              endpoint_type=endpoint_type,
+                                                              catalog_filename=catalog_filename, max_age=None)
+            n += len(load_resource_list(resource_filename))
+        return n
+
+    def glossary():
+        n = 0
+        for endpoint_type, (resource_filename, glossary_filename) in filenames.items():
+            socrata_glossarizer.write_glossary(domain="data.cityofnewyork.us", endpoint_type=endpoint_type,
+                                               resource_filename=resource_filename,
+                                               glossary_filename=glossary_filename, backend="soda",
+                                               processes=processes)
+            n += len(load_glossary(glossary_filename))
+        return n
+
+    return [measure("resources", directory, address, resources), measure("glossary", directory, address, glossary)]
+
+
+def run_case(platform, directory, address, processes, concurrency, throttled, results):
+    """
+    Runs the benchmark for one platform, in a fresh process, so that its peak memory use is its own.
+    """
+    # The glossarizers' progress bars would garble the results table.
+    from tqdm import tqdm
+    tqdm.__init__ = partialmethod(tqdm.__init__, disable=True)
+
+    if not throttled:
+        host = throttle.host(DOMAINS[platform])
+        host.bucket.rate = host.bucket.burst = host.max_rate = float(10 ** 6)
+        host.limit = host.max_concurrency = 1024
+
+    run = run_ckan if platform == "ckan" else run_socrata
+    results.put(run(directory, address, processes, concurrency))
+
+
+def serve(platform, size, directory, options, conn):
+    """
+    Makes up a portal and serves it, in a process of its own, until told to stop. Sends back the server's address,
+    and then its request counts.
+    """
+    if platform == "ckan":
+        fixtures = replay.synthesize_ckan(size)
+    else:
+        catalog, fixtures = replay.synthesize_socrata(size)
+        with open(os.path.join(directory, "catalog.json"), "w") as fp:
+            json.dump(catalog, fp)
+
+    with replay.StubServer(fixtures, seed=0, **options) as server:
+        conn.send(server.server_address)
+        conn.recv()
+        conn.send(server.counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--platform", nargs="+", choices=["ckan", "socrata"], default=["ckan", "socrata"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000])
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=None)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--throttled", action="store_true")
+    args = parser.parse_args()
+    options = {'latency': args.latency, 'jitter': args.jitter, 'rate': args.rate, 'failure_rate': args.failure_rate}
+
+    print("{0:>8} {1:>7} {2:>10} {3:>10} {4:>8} {5:>11} {6:>8} {7:>8} {8:>8} {9:>13}".format(
+        "platform", "size", "step", "resources", "seconds", "resources/s", "p50 ms", "p99 ms", "rss MB",
+        "workers rss MB"))
+
+    for platform in args.platform:
+        for size in args.sizes:
+            directory = tempfile.mkdtemp()
+
+            # The stub server holds every fixture in memory, so it is spawned in a process of its own, lest that count
+            # against the benchmark. The benchmark process is forked, as its worker processes must inherit the replay
+            # session (see `session.configure`) and throttle settings.
+            conn, server_conn = mp.Pipe()
+            server = mp.get_context("spawn").Process(target=serve, args=(platform, size, directory, options,
+                                                                          server_conn))
+            server.start()
+            address = conn.recv()
+
+            results = mp.get_context("fork").Queue()
+            process = mp.get_context("fork").Process(target=run_case, args=(platform, directory, address,
+                                                                            args.processes, args.concurrency,
+                                                                            args.throttled, results))
+            process.start()
+            # If the case dies (say, of an exception in a glossarizer), there will never be any results to wait for.
+            measurements = []
+            while process.is_alive() or not results.empty():
+                try:
+                    measurements = results.get(timeout=1)
+                    break
+                except queue.Empty:
+                    continue
+            process.join()
+            if not measurements:
+                print("WARNING: the {0} benchmark at size {1} failed.".format(platform, size))
+
+            conn.send(None)
+            counts = conn.recv()
+            server.join()
+            shutil.rmtree(directory)
+
+            for m in measurements:
+                print("{0:>8} {1:>7} {2:>10} {3:>10} {4:>8.2f} {5:>11.1f} {6:>8.2f} {7:>8.2f} {8:>8.1f} {9:>13.1f}"
+                      .format(platform, size, m['step'], m['resources'], m['seconds'], m['rate'], m['p50'], m['p99'],
+                              m['rss'], m['children_rss']))
+            if counts['missing']:
+                print("WARNING: {0} requests had no recorded response.".format(counts['missing']))
+
+
+if __name__ == "__main__":
+    main()
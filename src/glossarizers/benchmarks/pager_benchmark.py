@@ -0,0 +1,190 @@
+"""
+Benchmarks the pager's browser engines side by side, on page-load latency and memory, against synthetic portal pages
+served offline.
+
+Synthetic Socrata "primer" pages (see `replay.synthesize_socrata_pages`), along with the stylesheets, images and fonts
+they load, are served by a local stub server, which waits `--latency` (plus up to `--jitter`) seconds before answering
+each request. With `--render script` the pages' dataset contents are rendered in by a script, `--delay` seconds after
+loading, as on a live portal; the static engine can't read these. Each engine then pages every page once, through a
+`pool.DriverPool` of `--pool-size` drivers, with resource blocking on (and, with `--unblocked`, again with it off).
+
+For each engine, reports the number of pages read and failed, pages per second, the 50th and 99th percentile time to
+page a page, and the peak resident memory of the drivers and the browsers behind them (sampled every 50 ms, summed
+over every process they are made up of). Engines which can't be started here are skipped. Unless `--throttled` is
+passed, the client-side throttle is lifted. Run from this directory:
+
+    python pager_benchmark.py --engines static chrome firefox phantomjs --pages 200 --latency 0.05
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import threading
+import time
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import replay, throttle
+# noinspection PyUnresolvedReferences
+from glossarizers.pager import engines, pager, pool
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def descendants_rss(pid, exclude=()):
+    """
+    Returns the total resident memory, in megabytes, of the descendants of process `pid` (excluding those in `exclude`
+    and their descendants). Linux only.
+    """
+    children, rss = dict(), dict()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{0}/stat".format(entry), "r") as fp:
+                # The command name may contain spaces, but is in parentheses, and is followed by the state and the ppid.
+                fields = fp.read().rsplit(")", 1)[1].split()
+            with open("/proc/{0}/statm".format(entry), "r") as fp:
+                rss[int(entry)] = int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (IOError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+
+    total, stack = 0, list(children.get(pid, []))
+    while stack:
+        p = stack.pop()
+        if p in exclude:
+            continue
+        total += rss.get(p, 0)
+        stack.extend(children.get(p, []))
+    return total / 2 ** 20
+
+
+class MemorySampler:
+    """
+    Samples the memory use of this process's descendants in a background thread, keeping the peak, over and above
+    whatever they were using to begin with.
+    """
+    def __init__(self, exclude=(), interval=0.05):
+        self.exclude = exclude
+        self.interval = interval
+        self.baseline = 0.0
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, descendants_rss(os.getpid(), self.exclude) - self.baseline)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.baseline = descendants_rss(os.getpid(), self.exclude)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_engine(engine, uris, domain, pool_size, blocked, timeout, server_pid):
+    """
+    Pages every page with `engine`. Returns its measurements, or None if the engine could not be started.
+    """
+    def page(uri, driver):
+        start = time.perf_counter()
+        try:
+            pager.page_socrata_for_endpoint_size(domain, uri, timeout=timeout, driver=driver)
+            return time.perf_counter() - start
+        except Exception:
+            return None
+
+    with MemorySampler(exclude={server_pid}) as sampler:
+        try:
+            drivers = pool.DriverPool(pool_size, driver_factory=lambda: engines.start(
+                engine, blocked=engines.BLOCKED_RESOURCES if blocked else None))
+        except Exception as e:
+            print("WARNING: the {0} engine could not be started ({1}: {2}).".format(
+                engine, e.__class__.__name__, str(e).strip().split("\n")[0]))
+            return None
+
+        with drivers:
+            start = time.monotonic()
+            latencies = list(drivers.map(page, uris))
+            elapsed = time.monotonic() - start
+
+    read = [latency for latency in latencies if latency is not None]
+    return {'pages': len(read), 'failed': len(latencies) - len(read), 'seconds': elapsed,
+            'rate': len(read) / elapsed if elapsed else float('nan'), 'p50': percentile(read, 50) * 1000,
+            'p99': percentile(read, 99) * 1000, 'rss': sampler.peak}
+
+
+def serve(n, render, delay, options, conn):
+    """
+    Makes up the pages and serves them, in a process of its own, until told to stop (sent None). Sends back the
+    server's address and the pages' URLs, and then its request counts whenever asked for them.
+    """
+    server = replay.StubServer(replay.Fixtures(), seed=0, **options)
+    pages, server.fixtures = replay.synthesize_socrata_pages(n, server.root, render=render, delay=delay)
+    with server.start():
+        conn.send((server.server_address, list(pages)))
+        while conn.recv() is not None:
+            conn.send(dict(server.counts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--engines", nargs="+", choices=sorted(engines.ENGINES),
+                        default=["static", "chrome", "firefox", "phantomjs"])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--render", choices=["static", "script"], default="static")
+    parser.add_argument("--delay", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--unblocked", action="store_true")
+    parser.add_argument("--throttled", action="store_true")
+    args = parser.parse_args()
+
+    conn, server_conn = mp.Pipe()
+    server = mp.get_context("spawn").Process(target=serve, args=(args.pages, args.render, args.delay,
+                                                                  {'latency': args.latency, 'jitter': args.jitter},
+                                                                  server_conn))
+    server.start()
+    address, uris = conn.recv()
+    domain = "{0}:{1}".format(*address)
+    if not args.throttled:
+        host = throttle.host("http://" + domain)
+        host.bucket.rate = host.bucket.burst = host.max_rate = float(10 ** 6)
+        host.limit = host.max_concurrency = 1024
+
+    print("{0:>10} {1:>8} {2:>6} {3:>7} {4:>8} {5:>7} {6:>8} {7:>9} {8:>9} {9:>8}".format(
+        "engine", "blocking", "pages", "failed", "seconds", "pages/s", "p50 ms", "p99 ms", "rss MB", "requests"))
+
+    try:
+        for engine in args.engines:
+            for blocked in ([True, False] if args.unblocked else [True]):
+                conn.send("counts")
+                requests_before = conn.recv()['requests']
+                m = run_engine(engine, uris, domain, args.pool_size, blocked, args.timeout, server.pid)
+                conn.send("counts")
+                requests = conn.recv()['requests'] - requests_before
+                if m is None:
+                    continue
+                print("{0:>10} {1:>8} {2:>6} {3:>7} {4:>8.2f} {5:>7.1f} {6:>8.1f} {7:>9.1f} {8:>9.1f} {9:>8}".format(
+                    engine, "on" if blocked else "off", m['pages'], m['failed'], m['seconds'], m['rate'], m['p50'],
+                    m['p99'], m['rss'], requests))
+    finally:
+        conn.send(None)
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,238 +1,510 @@
-import pandas as pd
 from tqdm import tqdm
 import requests
 import warnings
-from .generic import (preexisting_cache, load_glossary_todo,
-                      write_resource_file, write_glossary_file, timeout_process)
+import itertools
+import operator
+from .generic import (preexisting_cache, load_glossary_todo, load_incremental_todo, stream_glossary_todo,
+                      write_resource_file, write_glossary_file, update_resource_file, write_previous_resource_file,
+                      GlossaryJournal)
+from .records import Resource, Flag
+from . import throttle, retry, metrics
+
+
+@metrics.timed("package_resources")
+def package_resources(metadata, domain="data.gov.sg", protocol='https'):
+    """
+    Given the CKAN `package_show` output for a single package (as well as the domain of the portal, e.g.
+    "data.gov.sg"), returns a list of resource-ified entries for the datasets in that package for inclusion in the
+    resource listing. Packages with no data in them are returned as an empty list.
+    """
+    import pandas as pd
+
+    result = metadata['result']
+    roi_repr = []
 
+    # Individual fields vary between providers.
+    if domain == "data.gov.sg":
+        license = result['license']
+        publisher = result['publisher']['name']
+        keywords = result['keywords']
+        description = result['description']
+        topics = result['topics']
+        name = result['title']
+        sources = result['sources']
+        update_frequency = result['frequency']
+
+        created = None
+        last_updated = str(pd.Timestamp(result['last_updated']))
+
+    elif domain == "catalog.data.ug":
+        # Note: Organization sometimes left blank.
+
+        license = result['license_title']
+        publisher = result['organization']['title'] if result['organization'] else None
+        keywords = []
+        description = result['notes']
+        topics = [tag['name'] for tag in result['tags']]
+        name = result['title']
+        sources = result['organization']['title'] if result['organization'] else None
+        update_frequency = None
+
+        created = str(pd.Timestamp(result['metadata_created']))
+        last_updated = str(pd.Timestamp(result['metadata_modified']))
 
-def write_resource_representation(domain="data.gov.sg", out=None, use_cache=True, protocol='https'):
+    try:
+        # It is possible to have a dataset with no data in it.
+        # Example: http://catalog.data.ug/dataset/nema
+        # This is distinct from what would transpire on e.g. Socrata, where you could have a 0-entity
+        # dataset, but it's still a dataset.
+        # No-data nodes can safely be skipped.
+        canonical = result['resources'][0]
+    except:
+        return []
+
+    preferred_format = canonical['format'].lower()
+    slug = canonical['url']
+
+    if domain == "data.gov.sg":
+        # Slug: "https://storage.data.gov.sg/3g-public-cellular-mobile-telephone-services/[...]"
+        # We need: "3g-public-cellular-mobile-telephone-services"
+        # Because landing page is: "https://data.gov.sg/dataset/3g-public-cellular-mobile-telephone-services"
+        landing_page = "{0}/dataset/{1}".format(domain, slug.split("/")[3])
+    elif domain == "catalog.data.ug":
+        # We need the id: "f72b9932-52a1-4014-987e-047a370c3d96".
+        # Because landing page is: "http://catalog.data.ug/dataset/f72b9932-52a1-4014-987e-047a370c3d96"
+        # The "human-readable" landing page is "http://catalog.data.ug/dataset/2014-census"
+        # But there's no way to back that URL out of the metadata, surprisingly, because the "URL" parameter
+        # is often left empty.
+        # landing_page = "{0}/dataset/{1}".format(domain, result['url'].lower().replace(" ", "-"))
+        landing_page = "{0}/dataset/{1}".format(domain, result['id'])
+
+    # CKAN treats resources as resources. A single endpoint may host a few different datasets, differentiated
+    # in the interface by a tab menu, or it may host the same dataset in multiple formats (in which case you
+    # get a menu of options in the interface). The metadata export does not make it immediately obvious which
+    # of the two is the case. Instead, we use the following heuristic to determine.
+
+    # https://data.gov.sg/api/3/action/package_metadata_show?id=abc-waters-sites
+    # A metdata export from the Singapore open data portal of a dataset with two formats available contains a
+    # "resources" key, in which there exists a list of two dicts, a key of which is url. The two URLs are:
+    # "https://geo.data.gov.sg/abcwaterssites/2016/10/28/kml/abcwaterssites.zip"
+    # "https://geo.data.gov.sg/abcwaterssites/2016/10/28/shp/abcwaterssites.zip"
+
+    # A metadata export from the Singapre open data portal of a dataset with two files available:
+    # "https://storage.data.gov.sg/3g-public-cellular-mobile-telephone-services/resources/[long name 1].csv"
+    # "https://storage.data.gov.sg/3g-public-cellular-mobile-telephone-services/resources/[long name 2].csv"
+
+    # In the second case the names (stripping out the extension) are distinct. In the first case, they are not.
+    # This is the heuristic we use to determine whether we have two exports of the same data, or two different
+    # datasets proper.
+    multiple_datasets = len(set([m['url'].split("/")[-1].split(".")[0]\
+                                 for m in result['resources']])) > 1
+
+    if multiple_datasets:
+        for dataset in result['resources']:
+            # Composite names, but the key name depends on the domain.
+            if domain == "data.gov.sg":
+                name = "{0} - {1}".format(name, dataset['title'])
+            elif domain == "catalog.data.ug":
+                name = "{0} - {1}".format(name, dataset['name'])
+
+            roi_repr.append(Resource({
+                'landing_page': landing_page,
+                'resource': dataset['url'],
+                'protocol': protocol,
+                'name': name,
+                'description': description,
+                'publisher': publisher,
+                'sources': sources,
+                'created': created,
+                'last_updated': last_updated,
+                'update_frequency': update_frequency,
+                'tags_provided': keywords,
+                'topics_provided': topics,
+                'available_formats': [dataset['format'].lower()],
+                'preferred_format': dataset['format'].lower(),
+                'license': license,
+                'flags': []
+            }))
+
+    else:
+        available_formats = [m['format'].lower() for m in result['resources']]
+
+        roi_repr.append(Resource({
+            'landing_page': landing_page,
+            'resource': slug,
+            'protocol': protocol,
+            'name': name,
+            'description': description,
+            'publisher': publisher,
+            'sources': sources,
+            'created': created,
+            'last_updated': last_updated,
+            'update_frequency': update_frequency,
+            'tags_provided': keywords,
+            'topics_provided': topics,
+            'available_formats': available_formats,
+            'preferred_format': preferred_format,
+            'license': license,
+            'flags': []
+        }))
+
+    return roi_repr
+
+
+def get_json(uri, get=throttle.get):
+    """
+    Fetches and JSON-decodes a CKAN API endpoint, raising a `requests.HTTPError` if the request failed, so that it
+    can be classified (and retried) as such. `get` is the function to make the request with.
+    """
+    r = get(uri)
+    r.raise_for_status()
+    return r.json()
+
+
+def get_package(slug, get=throttle.get):
+    """
+    Fetches the `package_show` output for a single package, retrying transient failures.
+    """
+    with metrics.span("package_show"):
+        return retry.call(get_json, slug, get=get)
+
+
+def write_resource_representation(domain="data.gov.sg", out=None, use_cache=True, protocol='https',
+                                  concurrency=None, per_host=4, cache=None):
+    """
+    Fetches a resource representation for a CKAN portal.
+
+    Parameters
+    ----------
+    domain: str, default "data.gov.sg"
+        The open data portal domain.
+    out: str
+        The name of the resource file to write the output to.
+    use_cache: bool, default True
+        If a resource file already exists, whether to simply exit out or blow it away and create a new one.
+    protocol: str, default "https"
+        The protocol the portal is served over.
+    concurrency: int, default None
+        The maximum number of `package_show` requests to keep in flight at once. If left unspecified packages are
+        fetched one at a time. Either way the resource list is written out in `package_list` order.
+    per_host: int, default 4
+        The maximum number of requests to keep in flight against any single host, when `concurrency` is specified.
+    cache: http_cache.HTTPCache, default None
+        An HTTP cache to make catalog requests through. Packages which have not changed since they were cached are
+        then served from the cache.
+    """
     # If the file already exists and we specify `use_cache=True`, simply return.
     if preexisting_cache(out, use_cache):
         return
 
     package_list_slug = "{0}://{1}/api/3/action/package_list".format(protocol, domain)
-    package_list = requests.get(package_list_slug).json()
+    get = cache.get if cache else throttle.get
+    package_list = retry.call(get_json, package_list_slug, get=get)
 
     if 'success' not in package_list or package_list['success'] != True:
         raise requests.RequestException("The CKAN catalog page did not resolve successfully.")
 
     resources = package_list['result']
 
-    roi_repr = []
-
-    try:
-        for resource in tqdm(resources):
-            # import pdb; pdb.set_trace()
-            # package_metadata_show vs. package_show?
-            metadata = requests.get("{0}://{1}/api/3/action/package_show?id={2}".format(protocol,
-                                                                                        domain,
-                                                                                        resource)).json()
-
-            # Individual fields vary between providers.
-            if domain == "data.gov.sg":
-                license = metadata['result']['license']
-                publisher = metadata['result']['publisher']['name']
-                keywords = metadata['result']['keywords']
-                description = metadata['result']['description']
-                topics = metadata['result']['topics']
-                name = metadata['result']['title']
-                sources = metadata['result']['sources']
-                update_frequency = metadata['result']['frequency']
-
-                created = None
-                last_updated = str(pd.Timestamp(metadata['result']['last_updated']))
-
-            elif domain == "catalog.data.ug":
-                # Note: Organization sometimes left blank.
-
-                license = metadata['result']['license_title']
-                publisher = metadata['result']['organization']['title'] if metadata['result']['organization'] else None
-                keywords = []
-                description = metadata['result']['notes']
-                topics = [tag['name'] for tag in metadata['result']['tags']]
-                name = metadata['result']['title']
-                sources = metadata['result']['organization']['title'] if metadata['result']['organization'] else None
-                update_frequency = None
-
-                created = str(pd.Timestamp(metadata['result']['metadata_created']))
-                last_updated = str(pd.Timestamp(metadata['result']['metadata_modified']))
-
-            try:
-                # It is possible to have a dataset with no data in it.
-                # Example: http://catalog.data.ug/dataset/nema
-                # This is distinct from what would transpire on e.g. Socrata, where you could have a 0-entity
-                # dataset, but it's still a dataset.
-                # No-data nodes can safely be skipped.
-                canonical = metadata['result']['resources'][0]
-            except:
-                continue
+    # package_metadata_show vs. package_show?
+    package_show_slugs = ["{0}://{1}/api/3/action/package_show?id={2}".format(protocol, domain, resource)
+                          for resource in resources]
 
-            preferred_format = canonical['format'].lower()
-            slug = canonical['url']
+    if concurrency:
+        from .crawler import fetch_json_all
+        metadatas = fetch_json_all(package_show_slugs, concurrency=concurrency, per_host=per_host, cache=cache)
+    else:
+        metadatas = tqdm((get_package(slug, get=get) for slug in package_show_slugs),
+                         total=len(package_show_slugs))
 
-            if domain == "data.gov.sg":
-                # Slug: "https://storage.data.gov.sg/3g-public-cellular-mobile-telephone-services/[...]"
-                # We need: "3g-public-cellular-mobile-telephone-services"
-                # Because landing page is: "https://data.gov.sg/dataset/3g-public-cellular-mobile-telephone-services"
-                landing_page = "{0}/dataset/{1}".format(domain, slug.split("/")[3])
-            elif domain == "catalog.data.ug":
-                # We need the id: "f72b9932-52a1-4014-987e-047a370c3d96".
-                # Because landing page is: "http://catalog.data.ug/dataset/f72b9932-52a1-4014-987e-047a370c3d96"
-                # The "human-readable" landing page is "http://catalog.data.ug/dataset/2014-census"
-                # But there's no way to back that URL out of the metadata, surprisingly, because the "URL" parameter
-                # is often left empty.
-                # landing_page = "{0}/dataset/{1}".format(domain, metadata['result']['url'].lower().replace(" ", "-"))
-                landing_page = "{0}/dataset/{1}".format(domain, metadata['result']['id'])
-
-            # CKAN treats resources as resources. A single endpoint may host a few different datasets, differentiated
-            # in the interface by a tab menu, or it may host the same dataset in multiple formats (in which case you
-            # get a menu of options in the interface). The metadata export does not make it immediately obvious which
-            # of the two is the case. Instead, we use the following heuristic to determine.
-
-            # https://data.gov.sg/api/3/action/package_metadata_show?id=abc-waters-sites
-            # A metdata export from the Singapore open data portal of a dataset with two formats available contains a
-            # "resources" key, in which there exists a list of two dicts, a key of which is url. The two URLs are:
-            # "https://geo.data.gov.sg/abcwaterssites/2016/10/28/kml/abcwaterssites.zip"
-            # "https://geo.data.gov.sg/abcwaterssites/2016/10/28/shp/abcwaterssites.zip"
-
-            # A metadata export from the Singapre open data portal of a dataset with two files available:
-            # "https://storage.data.gov.sg/3g-public-cellular-mobile-telephone-services/resources/[long name 1].csv"
-            # "https://storage.data.gov.sg/3g-public-cellular-mobile-telephone-services/resources/[long name 2].csv"
-
-            # In the second case the names (stripping out the extension) are distinct. In the first case, they are not.
-            # This is the heuristic we use to determine whether we have two exports of the same data, or two different
-            # datasets proper.
-            multiple_datasets = len(set([m['url'].split("/")[-1].split(".")[0]\
-                                         for m in metadata['result']['resources']])) > 1
-
-            if multiple_datasets:
-                for dataset in metadata['result']['resources']:
-                    # Composite names, but the key name depends on the domain.
-                    if domain == "data.gov.sg":
-                        name = "{0} - {1}".format(name, dataset['title'])
-                    elif domain == "catalog.data.ug":
-                        name = "{0} - {1}".format(name, dataset['name'])
-
-                    roi_repr.append({
-                        'landing_page': landing_page,
-                        'resource': dataset['url'],
-                        'protocol': protocol,
-                        'name': name,
-                        'description': description,
-                        'publisher': publisher,
-                        'sources': sources,
-                        'created': created,
-                        'last_updated': last_updated,
-                        'update_frequency': update_frequency,
-                        'tags_provided': keywords,
-                        'topics_provided': topics,
-                        'available_formats': [dataset['format'].lower()],
-                        'preferred_format': dataset['format'].lower(),
-                        'license': license,
-                        'flags': []
-                    })
+    roi_repr = []
 
-            else:
-                available_formats = [m['format'].lower() for m in metadata['result']['resources']]
-
-                roi_repr.append({
-                    'landing_page': landing_page,
-                    'resource': slug,
-                    'protocol': protocol,
-                    'name': name,
-                    'description': description,
-                    'publisher': publisher,
-                    'sources': sources,
-                    'created': created,
-                    'last_updated': last_updated,
-                    'update_frequency': update_frequency,
-                    'tags_provided': keywords,
-                    'topics_provided': topics,
-                    'available_formats': available_formats,
-                    'preferred_format': preferred_format,
-                    'license': license,
-                    'flags': []
-                })
+    try:
+        for slug, metadata in zip(package_show_slugs, metadatas):
+            # The concurrent fetcher hands back failures in place, so that whatever preceded them still gets saved. It
+            # doesn't retry them, so take another (sequential) shot at those which may go away if we try again.
+            if isinstance(metadata, Exception):
+                if not retry.is_transient(metadata):
+                    raise metadata
+                metadata = get_package(slug, get=get)
+
+            roi_repr += package_resources(metadata, domain=domain, protocol=protocol)
     finally:
         # Write to file and exit.
         write_resource_file(roi_repr, out)
 
 
-def write_glossary(domain="data.gov.sg", resource_filename=None, glossary_filename=None,
-                   use_cache=True, timeout=60):
-    # import limited_process
-    # q = limited_process.q()
-
-    resource_list, glossary = load_glossary_todo(resource_filename, glossary_filename, use_cache=use_cache)
-
-    @timeout_process(timeout)
-    def _size_up(uri):
-        import sys
-        import datafy
-
-        # Couldn't determine meaning of the application/CDFV2-unknown content-type associated with the URI
-        # http://maps.data.ug/geoserver/wfs?typename=geonode%3Aaveragepovertygap&outputFormat=excel&version=1.0.0&request=GetFeature&service=WFS
-        # To whit: this is an issue with XLS/Word XML format documents that occassionally crops up in file format
-        # detectors, cf. https://www.google.com/search?q=CDFV2-unknown&oq=CDFV2-unknown&aqs=chrome..69i57&sourceid=chrome&ie=UTF-8
-
-        resource = datafy.get(uri)
-        thing_log = []
-        for thing in resource:
-            thing_log.append({
-                'filesize': sys.getsizeof(thing['data'].content) / 1024,
-                'dataset': thing['filepath'],
-                'mimetype': thing['mimetype'],
-                'extension': thing['extension']
-            })
-        return thing_log
-
-    # Whether we succeed or fail, we'll want to save the data we have at the end with a try-finally block.
-    try:
-        for i, resource in tqdm(list(enumerate(resource_list))):
+@metrics.timed("get_sizing")
+def get_sizing(uri, timeout=60, cache=None):
+    """
+    Given the URI of a CKAN resource, returns its MIME type and size, along with the name of the dataset that the size
+    refers to. Returns None if the server doesn't report a content-type for the URI. Raises a `requests.HTTPError` if
+    the HEAD request itself errors out, so that it can be classified (and retried) as such: a 503 or a 429 usually
+    doesn't come with a content-type, and would otherwise be mistaken for a resource which doesn't have one.
+
+    This function is run in an `executor.WorkerPool` worker process. If an `http_cache.HTTPCache` is passed, the HEAD
+    request is made through it.
+    """
+    # Get the sizing information.
+    # If the resource is its own dataset, this is provided in the content header. Sometimes it is not.
+    head = cache.head if cache else throttle.head
+    r = head(uri, timeout=timeout)
+    r.raise_for_status()
+    headers = r.headers
+
+    if 'content-type' not in headers:
+        return None
+
+    if 'content-length' in headers:
+        return {'preferred_mimetype': headers['content-type'], 'filesize': headers['content-length'], 'dataset': '.'}
+
+    # If we error out, this is a packaged/gzipped file. Do sizing the basic way, with a GET request.
+    # Couldn't determine meaning of the application/CDFV2-unknown content-type associated with the URI
+    # http://maps.data.ug/geoserver/wfs?typename=geonode%3Aaveragepovertygap&outputFormat=excel&version=1.0.0&request=GetFeature&service=WFS
+    # To whit: this is an issue with XLS/Word XML format documents that occassionally crops up in file format
+    # detectors, cf. https://www.google.com/search?q=CDFV2-unknown&oq=CDFV2-unknown&aqs=chrome..69i57&sourceid=chrome&ie=UTF-8
+    from .sizer import size_up
+    dataset_repr = size_up(uri, timeout=timeout)
+    return {'preferred_mimetype': headers['content-type'], 'filesize': dataset_repr[0]['filesize'],
+            'dataset': dataset_repr[0]['dataset']}
+
+
+def get_glossary(resource_list, glossary, timeout=60, processes=1, cache=None, journal=None, retries=None,
+                 failures=None, workers=None):
+    """
+    Sizes the resources in a resource list (which may be a lazy iterator), appending their glossary entries to the
+    glossary and flagging them "processed" as it goes. Resources are sized in a pool of `processes` worker processes,
+    or in `workers`, if a running `executor.WorkerPool` is passed (which is left running at the end). If a
+    `generic.GlossaryJournal` is passed, progress is journaled to it.
+
+    Resources which fail with a transient error (see `retry.classify`) are tried again at the end of the run, per the
+    `retries` policy (a `retry.RetryPolicy`). If a `failures` list is passed, `retry.Failure` records for the
+    resources which could not be sized are appended to it.
+    """
+    from .executor import WorkerPool
+
+    own_workers = workers is None
+    if own_workers:
+        workers = WorkerPool(processes=processes, timeout=timeout)
+    queue = retry.RetryQueue(retries)
+
+    def process(resources):
+        # The resource list may be a lazy iterator, so tee it rather than going over it twice.
+        total = operator.length_hint(resources) or None
+        resources, queued = itertools.tee(resources)
+        outcomes = workers.imap(get_sizing, (resource['resource'] for resource in queued), timeout=timeout,
+                                cache=cache)
+
+        for resource, sizing in tqdm(zip(resources, outcomes), total=total):
 
             glossarized_resource = resource.copy()
 
-            # Get the sizing information.
-            # If the resource is its own dataset, this is provided in the content header. Sometimes it is not.
-            headers = requests.head(resource['resource']).headers
-
-            try:
-                glossarized_resource['preferred_mimetype'] = headers['content-type']
-            except KeyError:
-                import pdb; pdb.set_trace()
-                # HTTP error that occurs when.
+            if sizing is None:
+                # The server answered, but didn't say what the resource is.
+                print("WARNING: the '{0}' endpoint did not report a content-type.".format(resource['resource']))
+                metrics.increment("resources", outcome="failed")
                 continue
 
-            try:
-                glossarized_resource['filesize'] = headers['content-length']
-                glossarized_resource['dataset'] = '.'
+            elif isinstance(sizing, Exception):
+                # Transient failures are deferred to the end of the run, to be tried again then.
+                if queue.defer(resource, sizing):
+                    metrics.increment("resources", outcome="deferred")
+                    continue
+                succeeded = False
+                warnings.warn(
+                    "Couldn't parse the URI {0} due to a network failure."\
+                        .format(resource['resource'])
+                )
+
+            else:
+                glossarized_resource.update(sizing)
                 succeeded = True
 
-            # If we error out, this is a packaged/gzipped file. Do sizing the basic way, with a GET request.
-            except KeyError:
-                dataset_repr = _size_up(resource['resource'])
-                try:
-                    glossarized_resource['filesize'] = dataset_repr[0]['filesize']
-                    glossarized_resource['dataset'] = dataset_repr[0]['dataset']
-                    succeeded = True
-                except TypeError:
-                    # Transient failure.
-                    succeeded = False
-                    warnings.warn(
-                        "Couldn't parse the URI {0} due to a transient network failure."\
-                            .format(resource['resource'])
-                    )
+            metrics.increment("resources", outcome="glossarized" if succeeded else "failed")
 
             # Update the resource list to make note of the fact that this job has been processed.
-            if 'processed' not in resource['flags'] and succeeded:
-                resource["flags"].append("processed")
+            if Flag.PROCESSED not in resource['flags'] and succeeded:
+                resource["flags"].append(Flag.PROCESSED)
 
             glossary.append(glossarized_resource)
+            if journal:
+                journal.record(resource, [glossarized_resource])
+
+    # Whether we succeed or fail, we'll want to save the data we have at the end with a try-finally block.
+    try:
+        process(resource_list)
+
+        # Now that everything else is done, take another pass at whatever failed with a transient error.
+        for batch in queue.rounds():
+            process(batch)
 
     # Whether we succeeded or got caught on a fatal error, in either case clean up.
     finally:
-        # Save output.
+        if own_workers:
+            workers.close()
+        if failures is not None:
+            failures.extend(queue.failures)
+
+    return resource_list, glossary
+
+
+def write_glossary(domain="data.gov.sg", resource_filename=None, glossary_filename=None,
+                   use_cache=True, timeout=60, journal=False, processes=1, cache=None, incremental=False,
+                   stream=False, retries=None):
+    """
+    Writes a dataset representation.
+
+    Parameters
+    ----------
+    domain: str, default "data.gov.sg"
+        The open data portal domain.
+    resource_filename: str
+        The name of the resource file to read the jobs from.
+    glossary_filename: str
+        The name of the glossaries file to write the output to.
+    use_cache: bool, default True
+        Whether to skip resources which have already been processed.
+    timeout: int, default 60
+        The maximum amount of time to spend sizing any one resource before killing the process doing it.
+    journal: bool, default False
+        Whether to journal progress to disk as it is made (see `generic.GlossaryJournal`), so that a run which is
+        killed outright can be resumed.
+    processes: int, default 1
+        The number of worker processes to size resources with in parallel.
+    cache: http_cache.HTTPCache, default None
+        An HTTP cache to make HEAD requests through.
+    incremental: bool, default False
+        Whether to refresh the glossary incrementally against a freshly pulled resource list, only glossarizing
+        resources which are new or have changed (per their `last_updated` time) since the glossary was last written,
+        and dropping resources which have since been deleted. Overrides `use_cache`.
+    stream: bool, default False
+        Whether to read the resource list lazily, queueing up resources one at a time as they are needed rather than
+        loading the whole list up front (see `generic.stream_glossary_todo`). At the end of the run, the resources
+        worked on are merged back into the resource file, and the rest of the file is left as-is. Ignored if
+        `incremental` is True.
+    retries: retry.RetryPolicy, default None
+        How to retry resources which fail with a transient error. Defaults to `retry.RetryPolicy()`. Resources which
+        cannot be sized are logged alongside the glossary (see `retry.write_failures`).
+    """
+    if incremental:
+        resource_list, glossary, full_resource_list = load_incremental_todo(resource_filename, glossary_filename,
+                                                                            journal=journal)
+    elif stream:
+        resource_list, glossary, updated = stream_glossary_todo(resource_filename, glossary_filename,
+                                                                use_cache=use_cache, journal=journal)
+    else:
+        resource_list, glossary = load_glossary_todo(resource_filename, glossary_filename, use_cache=use_cache,
+                                                     journal=journal)
+    glossary_journal = GlossaryJournal(glossary_filename) if journal else None
+    failures = []
+
+    # Generate the glossaries.
+    try:
+        resource_list, glossary = get_glossary(resource_list, glossary, timeout=timeout, processes=processes,
+                                               cache=cache, journal=glossary_journal, retries=retries,
+                                               failures=failures)
+
+    # Save output.
+    finally:
+        retry.write_failures(failures, glossary_filename)
+        if incremental:
+            # noinspection PyUnboundLocalVariable
+            resource_list = full_resource_list
+        elif stream:
+            # noinspection PyUnboundLocalVariable
+            resource_list = updated
+        if glossary_journal:
+            glossary_journal.compact(resource_list, glossary, resource_filename, glossary_filename,
+                                     update=stream and not incremental)
+        elif stream and not incremental:
+            update_resource_file(resource_filename, resource_list)
+            write_glossary_file(glossary, glossary_filename)
+        else:
+            write_resource_file(resource_list, resource_filename)
+            write_glossary_file(glossary, glossary_filename)
+        if incremental:
+            write_previous_resource_file(resource_list, glossary_filename)
+
+
+def write_pipeline(domain="data.gov.sg", resource_filename=None, glossary_filename=None, protocol='https',
+                   concurrency=8, processes=4, timeout=60, maxsize=64, cache=None, retries=None):
+    """
+    Writes a resource representation and a glossary for a CKAN portal in a single pipelined pass: resources are
+    sized as soon as their package has been read from the catalog, instead of after the entire catalog has been read
+    (as with `write_resource_representation` followed by `write_glossary`). Both files are written out at the end,
+    whether or not the run succeeded.
+
+    Parameters
+    ----------
+    domain: str, default "data.gov.sg"
+        The open data portal domain.
+    resource_filename: str
+        The name of the resource file to write the output to.
+    glossary_filename: str
+        The name of the glossary file to write the output to.
+    protocol: str, default "https"
+        The protocol the portal is served over.
+    concurrency: int, default 8
+        The number of threads to read packages from the catalog in.
+    processes: int, default 4
+        The number of worker processes to size resources in.
+    timeout: int, default 60
+        The maximum amount of time to spend sizing any one resource.
+    maxsize: int, default 64
+        The maximum number of packages or resources to queue up between stages.
+    cache: http_cache.HTTPCache, default None
+        An HTTP cache to make requests through.
+    retries: retry.RetryPolicy, default None
+        How to retry resources which fail with a transient error. Defaults to `retry.RetryPolicy()`.
+
+    Returns
+    -------
+    A dict of `pipeline.Pipeline.stats` for the run.
+    """
+    from .executor import WorkerPool
+    from .pipeline import Pipeline, Stage
+
+    get = cache.get if cache else throttle.get
+    package_list = retry.call(get_json, "{0}://{1}/api/3/action/package_list".format(protocol, domain), get=get)
+
+    if 'success' not in package_list or package_list['success'] != True:
+        raise requests.RequestException("The CKAN catalog page did not resolve successfully.")
+
+    package_show_slugs = ["{0}://{1}/api/3/action/package_show?id={2}".format(protocol, domain, resource)
+                          for resource in package_list['result']]
+
+    # Packages are read concurrently, so they finish out of order. Keep track of where each resource came from, so that
+    # the resource list can be written out in `package_list` order all the same.
+    resources = []
+    glossary = []
+    failures = []
+
+    def read_package(package):
+        i, slug = package
+        package_resources_list = package_resources(get_package(slug, get=get), domain=domain, protocol=protocol)
+        resources.extend(((i, j), resource) for j, resource in enumerate(package_resources_list))
+        return package_resources_list
+
+    def size_resources(resource_list):
+        get_glossary(resource_list, glossary, timeout=timeout, cache=cache, retries=retries, failures=failures,
+                     workers=workers)
+        return []
+
+    pipeline = Pipeline(enumerate(package_show_slugs),
+                        [Stage(read_package, workers=concurrency), Stage(size_resources, stream=True)],
+                        maxsize=maxsize)
+
+    # Fork the workers before the stage threads are started, not from inside of one of them, while the others may be
+    # holding locks which the workers would inherit (see `executor`).
+    workers = WorkerPool(processes=processes, timeout=timeout)
+
+    try:
+        pipeline.run()
+    finally:
+        workers.close()
+        resource_list = [resource for _, resource in sorted(resources, key=lambda pair: pair[0])]
         write_resource_file(resource_list, resource_filename)
         write_glossary_file(glossary, glossary_filename)
+        retry.write_failures(failures, glossary_filename)
 
+    return pipeline.stats()
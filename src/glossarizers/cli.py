@@ -0,0 +1,401 @@
+"""
+This module implements the `glossarizers` command-line crawl runner, invoked as `python -m glossarizers`.
+
+Production runs used to be notebook cells, one per portal and endpoint type, with every path hardcoded and every
+interrupted run restarted by hand. Instead, the portals to crawl are now listed in a manifest, a JSON file like so:
+
+    {
+        "concurrency": 2,
+        "portals": [
+            {
+                "name": "nyc",
+                "platform": "socrata",
+                "domain": "data.cityofnewyork.us",
+                "credentials": "../auth/nyc-open-data.json",
+                "endpoint_types": ["table", "blob", "link", "geospatial dataset"],
+                "resource_filename": "../data/nyc/resource lists/{endpoint_type}-new.json",
+                "glossary_filename": "../data/nyc/glossaries/{endpoint_type}-new.json"
+            },
+            {
+                "name": "uganda",
+                "platform": "ckan",
+                "domain": "catalog.data.ug",
+                "protocol": "http",
+                "resource_filename": "../data/uganda/resource lists/resources-new.json",
+                "glossary_filename": "../data/uganda/glossaries/resources-new.json",
+                "processes": 4
+            }
+        ]
+    }
+
+Relative paths are relative to the manifest. Every other key a portal may have (`timeout`, `processes`, `retries`, and
+so on) is documented in `PORTAL_DEFAULTS`.
+
+Each portal is broken up into jobs, one per endpoint type (CKAN portals have just the one), and each job into two
+steps: writing the resource list (`write_resource_representation`) and then the glossary (`write_glossary`). Portals are
+run concurrently, each in its own process (as the Socrata table pager keeps a single browser per process), up to the
+manifest's `concurrency`; the jobs within a portal are run one after the other, sharing the portal's catalog.
+
+As each step finishes, the runner makes note of it in a state file per portal (see `JobState`), kept in the manifest's
+`state` directory. Running the same manifest again resumes where the last run stopped: finished steps are skipped, and
+an unfinished resource list is rebuilt from scratch, as one written out by an interrupted run may be incomplete.
+Glossaries are written incrementally (see `generic.load_incremental_todo`), so an unfinished glossary is picked up where
+it left off, courtesy of the glossary journal (see `generic.GlossaryJournal`), and a glossary left over from an earlier
+crawl is refreshed rather than redone.
+
+Pass `--metrics metrics.jsonl` to record where the time goes (see `metrics.py`), down to the step, portal and job. A
+summary report is printed at the end of the run.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from multiprocessing.connection import wait
+
+from . import metrics
+
+
+# The keys a portal in the manifest may have, and their defaults. Keys which default to None are optional.
+PORTAL_DEFAULTS = {
+    # A name for the portal, used for its state file. Defaults to the domain.
+    'name': None,
+    # "socrata" or "ckan".
+    'platform': None,
+    # The portal's domain, e.g. "data.cityofnewyork.us".
+    'domain': None,
+    # The domain to size Socrata tables against, if it differs from `domain`. Defaults to `domain`.
+    'glossary_domain': None,
+    # The Socrata endpoint types to crawl. Ignored for CKAN portals.
+    'endpoint_types': ["table", "blob", "link", "geospatial dataset"],
+    # Where to write the resource lists and glossaries to. May contain "{endpoint_type}" (and must, if the portal has
+    # more than one endpoint type).
+    'resource_filename': None,
+    'glossary_filename': None,
+    # The Socrata API credentials file.
+    'credentials': None,
+    # The protocol a CKAN portal is served over.
+    'protocol': "https",
+    # The number of `package_show` requests to keep in flight when reading a CKAN catalog, or of view metadata requests
+    # when resolving the download links of Socrata blobs and links.
+    'concurrency': 8,
+    # The maximum number of seconds to spend sizing any one resource.
+    'timeout': 60,
+    # The number of worker processes to size resources with.
+    'processes': 1,
+    # The number of browsers to page Socrata tables with, and whether to page them at all ("pager") or to ask the
+    # SODA API instead ("soda").
+    'pool_size': 1,
+    'backend': "pager",
+    # The browser engine to page Socrata tables with (see `pager.engines`). Defaults to PhantomJS.
+    'engine': None,
+    # The number of times to try a resource which fails with a transient error.
+    'retries': 3
+}
+
+STEPS = ('resources', 'glossary')
+
+
+class JobState:
+    """
+    The progress of the jobs for a single portal, persisted to a JSON file, which maps each job to the status of each
+    of its steps: "running", "done", or "failed". The file is rewritten in full on every update, via a temporary file,
+    so that it is never left half-written.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.jobs = dict()
+        if os.path.isfile(filename):
+            with open(filename, "r") as fp:
+                self.jobs = json.load(fp)
+
+    def status(self, job, step):
+        return self.jobs.get(job, dict()).get(step, dict()).get('status')
+
+    def is_done(self, job, step):
+        return self.status(job, step) == "done"
+
+    def update(self, job, step, status, error=None):
+        entry = {'status': status, 'time': time.time()}
+        if error is not None:
+            entry['error'] = error
+        self.jobs.setdefault(job, dict())[step] = entry
+
+        temporary_filename = self.filename + ".tmp"
+        with open(temporary_filename, "w") as fp:
+            json.dump(self.jobs, fp, indent=4, sort_keys=True)
+        os.replace(temporary_filename, self.filename)
+
+    def reset(self):
+        self.jobs = dict()
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+
+
+def load_manifest(manifest_filename):
+    """
+    Loads a manifest, filling in defaults and resolving its paths relative to the manifest itself.
+
+    Returns
+    -------
+    A dict with the manifest's `portals` (a list of dicts), its `concurrency`, and its `state` directory.
+    """
+    with open(manifest_filename, "r") as fp:
+        manifest = json.load(fp)
+
+    root = os.path.dirname(os.path.abspath(manifest_filename))
+
+    def resolve(path):
+        return None if path is None else os.path.join(root, path)
+
+    portals = []
+    names = set()
+    for portal in manifest['portals']:
+        unknown = set(portal) - set(PORTAL_DEFAULTS)
+        if unknown:
+            raise ValueError("Unknown manifest keys {0} for the portal {1!r}.".format(sorted(unknown),
+                                                                                      portal.get('name')))
+
+        portal = dict(PORTAL_DEFAULTS, **portal)
+        for key in ['platform', 'domain', 'resource_filename', 'glossary_filename']:
+            if portal[key] is None:
+                raise ValueError("The portal {0!r} is missing the required key {1!r}.".format(portal['name'], key))
+        if portal['platform'] not in PLATFORMS:
+            raise ValueError("The portal {0!r} has an unknown platform {1!r}; expected one of {2}.".format(
+                portal['name'], portal['platform'], sorted(PLATFORMS)))
+
+        portal['name'] = portal['name'] or portal['domain']
+        if portal['name'] in names:
+            raise ValueError("The portal name {0!r} is used more than once.".format(portal['name']))
+        names.add(portal['name'])
+
+        for key in ['resource_filename', 'glossary_filename', 'credentials']:
+            portal[key] = resolve(portal[key])
+        portals.append(portal)
+
+    state = resolve(manifest.get('state', os.path.splitext(os.path.basename(manifest_filename))[0] + ".state"))
+    return {'portals': portals, 'concurrency': manifest.get('concurrency', 1), 'state': state}
+
+
+def portal_jobs(portal):
+    """
+    Breaks a portal up into its jobs. Returns a list of dicts, each with the job name, endpoint type (None for platforms
+    without endpoint types, like CKAN), and the resource and glossary filenames to write.
+    """
+    endpoint_types = portal['endpoint_types'] if PLATFORMS[portal['platform']]['endpoint_types'] else [None]
+
+    jobs = []
+    for endpoint_type in endpoint_types:
+        resource_filename = portal['resource_filename'].format(endpoint_type=endpoint_type)
+        glossary_filename = portal['glossary_filename'].format(endpoint_type=endpoint_type)
+        jobs.append({'name': endpoint_type or "resources", 'endpoint_type': endpoint_type,
+                     'resource_filename': resource_filename, 'glossary_filename': glossary_filename})
+
+    if len(set(job['resource_filename'] for job in jobs)) < len(jobs):
+        raise ValueError("The portal {0!r} has more than one endpoint type, so its filenames must contain "
+                         "'{{endpoint_type}}'.".format(portal['name']))
+    return jobs
+
+
+def _retry_policy(portal):
+    from .retry import RetryPolicy
+    return RetryPolicy(attempts=portal['retries'])
+
+
+def socrata_resources(portal, job, catalog_filename):
+    from .socrata_glossarizer import write_resource_representation
+    write_resource_representation(domain=portal['domain'], out=job['resource_filename'], use_cache=False,
+                                  credentials=portal['credentials'], endpoint_type=job['endpoint_type'],
+                                  catalog_filename=catalog_filename, concurrency=portal['concurrency'])
+
+
+def socrata_glossary(portal, job):
+    from .socrata_glossarizer import write_glossary
+    if portal['engine'] and job['endpoint_type'] == "table" and portal['backend'] == "pager":
+        from .pager import engines
+        engines.configure(engine=portal['engine'])
+    write_glossary(domain=portal['glossary_domain'] or portal['domain'], endpoint_type=job['endpoint_type'],
+                   resource_filename=job['resource_filename'], glossary_filename=job['glossary_filename'],
+                   timeout=portal['timeout'], pool_size=portal['pool_size'], backend=portal['backend'],
+                   processes=portal['processes'], journal=True, incremental=True, retries=_retry_policy(portal))
+
+
+def ckan_resources(portal, job, catalog_filename):
+    from .ckan_glossarizer import write_resource_representation
+    write_resource_representation(domain=portal['domain'], out=job['resource_filename'], use_cache=False,
+                                  protocol=portal['protocol'], concurrency=portal['concurrency'])
+
+
+def ckan_glossary(portal, job):
+    from .ckan_glossarizer import write_glossary
+    write_glossary(domain=portal['domain'], resource_filename=job['resource_filename'],
+                   glossary_filename=job['glossary_filename'], timeout=portal['timeout'],
+                   processes=portal['processes'], journal=True, incremental=True, retries=_retry_policy(portal))
+
+
+# The functions which run each step, per platform, and whether the platform has endpoint types. Resource functions are
+# passed the portal, the job, and the name of the file to share the portal catalog through; glossary functions just the
+# portal and the job.
+PLATFORMS = {
+    'socrata': {'resources': socrata_resources, 'glossary': socrata_glossary, 'endpoint_types': True},
+    'ckan': {'resources': ckan_resources, 'glossary': ckan_glossary, 'endpoint_types': False}
+}
+
+
+def run_portal(portal, state_directory):
+    """
+    Runs every outstanding step of every job for a portal, one after the other, recording progress in the portal's
+    state file as it goes. Stops at the first step which fails.
+
+    Returns
+    -------
+    True if every job is done, False otherwise.
+    """
+    state = JobState(os.path.join(state_directory, "{0}.json".format(portal['name'])))
+    catalog_filename = os.path.join(state_directory, "{0}.catalog.json".format(portal['name']))
+    steps = PLATFORMS[portal['platform']]
+
+    for job in portal_jobs(portal):
+        for step in STEPS:
+            if state.is_done(job['name'], step):
+                continue
+
+            print("{0}: running the {1} step of the {2} job.".format(portal['name'], step, job['name']))
+            state.update(job['name'], step, "running")
+            try:
+                with metrics.span("step", portal=portal['name'], job=job['name'], step=step):
+                    if step == "resources":
+                        steps[step](portal, job, catalog_filename)
+                    else:
+                        steps[step](portal, job)
+            except Exception as e:
+                print("WARNING: the {0} step of the {1} job for {2} failed: {3!r}".format(step, job['name'],
+                                                                                        portal['name'], e))
+                state.update(job['name'], step, "failed", error=repr(e))
+                return False
+            state.update(job['name'], step, "done")
+
+    print("{0}: done.".format(portal['name']))
+    return True
+
+
+def _run_portal_process(portal, state_directory):
+    sys.exit(0 if run_portal(portal, state_directory) else 1)
+
+
+def run_manifest(manifest, concurrency=None, only=None, restart=False):
+    """
+    Runs every portal in a manifest (as loaded by `load_manifest`), resuming from where the last run left off.
+
+    Parameters
+    ----------
+    manifest: dict
+        The manifest.
+    concurrency: int, default None
+        The number of portals to run at once. Defaults to the manifest's `concurrency`. If 1, portals are run in this
+        process, instead of each in a process of its own.
+    only: list, default None
+        The names of the portals to run. Defaults to all of them.
+    restart: bool, default False
+        Whether to forget the progress made by previous runs, and start over.
+
+    Returns
+    -------
+    A list of the names of the portals which did not finish.
+    """
+    state_directory = manifest['state']
+    os.makedirs(state_directory, exist_ok=True)
+    concurrency = concurrency or manifest['concurrency']
+
+    portals = [portal for portal in manifest['portals'] if only is None or portal['name'] in only]
+    if restart:
+        for portal in portals:
+            JobState(os.path.join(state_directory, "{0}.json".format(portal['name']))).reset()
+
+    if concurrency == 1:
+        return [portal['name'] for portal in portals if not run_portal(portal, state_directory)]
+
+    # Portal processes are not daemonic, as they may need to start sizing worker processes of their own.
+    pending = list(reversed(portals))
+    running = dict()
+    unfinished = []
+    while pending or running:
+        while pending and len(running) < concurrency:
+            portal = pending.pop()
+            process = mp.Process(target=_run_portal_process, args=(portal, state_directory))
+            process.start()
+            running[process.sentinel] = (portal, process)
+
+        for sentinel in wait(list(running)):
+            portal, process = running.pop(sentinel)
+            process.join()
+            if process.exitcode != 0:
+                unfinished.append(portal['name'])
+
+    return unfinished
+
+
+def status(manifest):
+    """
+    Returns a list of (portal, job, step, status) tuples for every step in a manifest. Steps which have not been
+    started have a status of None.
+    """
+    rows = []
+    for portal in manifest['portals']:
+        state = JobState(os.path.join(manifest['state'], "{0}.json".format(portal['name'])))
+        for job in portal_jobs(portal):
+            for step in STEPS:
+                rows.append((portal['name'], job['name'], step, state.status(job['name'], step)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="glossarizers", description="Crawls open data portals into glossaries.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="Runs (or resumes) the crawls in a manifest.")
+    run_parser.add_argument("manifest", help="The manifest file.")
+    run_parser.add_argument("--concurrency", type=int, default=None,
+                            help="The number of portals to run at once. Overrides the manifest.")
+    run_parser.add_argument("--only", nargs="+", default=None, help="The names of the portals to run.")
+    run_parser.add_argument("--restart", action="store_true", help="Start over, instead of resuming.")
+    run_parser.add_argument("--metrics", default=None,
+                            help="A JSONL file to append timings and counts to (see metrics.py). At the end of the "
+                                 "run, a summary is printed, and written out in the Prometheus text format alongside "
+                                 "it.")
+
+    status_parser = subparsers.add_parser("status", help="Reports the progress of the crawls in a manifest.")
+    status_parser.add_argument("manifest", help="The manifest file.")
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+
+    manifest = load_manifest(args.manifest)
+
+    if args.command == "status":
+        print("{0:<20} {1:<20} {2:<10} {3:<10}".format("portal", "job", "step", "status"))
+        for row in status(manifest):
+            print("{0:<20} {1:<20} {2:<10} {3:<10}".format(*(value or "-" for value in row)))
+        return 0
+
+    if args.metrics:
+        metrics.configure(jsonl=args.metrics)
+    try:
+        unfinished = run_manifest(manifest, concurrency=args.concurrency, only=args.only, restart=args.restart)
+    finally:
+        if args.metrics:
+            metrics.configure(jsonl=None)
+            if os.path.isfile(args.metrics):
+                registry = metrics.load(args.metrics)
+                registry.write_prometheus(os.path.splitext(args.metrics)[0] + ".prom")
+                print(registry.report())
+
+    if unfinished:
+        print("WARNING: the following portals did not finish: {0}. Run the manifest again to resume.".format(
+            ", ".join(unfinished)))
+        return 1
+    return 0
@@ -0,0 +1,135 @@
+"""
+This module implements a concurrent fetcher for portal API endpoints which are hit once per resource, like the CKAN
+`package_show` action.
+
+A full crawl of a CKAN portal costs one round trip per package. Done one at a time these round trips dominate the run
+time of the crawl, as nearly all of it is spent waiting on the network. Here we instead keep a bounded number of
+requests in flight at once using asyncio and aiohttp. Two limits apply: an overall limit on the number of requests in
+flight, and a (lower) per-host limit which keeps us polite to any one portal. On top of these, requests go through
+the per-host `throttle`, which backs off further if a portal starts to complain.
+
+Results are handed back in the same order as the URIs that were passed in, regardless of the order in which they
+actually completed.
+
+If an `http_cache.HTTPCache` is used, its lookups and stores (SQLite queries, and reads and writes of response bodies)
+are blocking disk I/O, which would hold up every other request in flight if it were done on the event loop. So it is
+done on a thread of its own instead.
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from tqdm import tqdm
+
+from . import throttle
+
+
+# Where to send requests instead of to the hosts they are addressed to, if anywhere. See `configure`.
+_redirect = None
+
+
+def configure(redirect=None):
+    """
+    Sends every request the crawler makes by way of `redirect`, or goes back to sending them where they are addressed
+    if `redirect` is None. `redirect.rewrite(uri)` returns the URI to request instead, along with a dict of headers
+    to add to the request, and `redirect.log(method, uri, seconds)` is called once the request has been answered.
+
+    The crawler's requests don't go through the shared session, so the `replay` module uses this (with a
+    `replay.Redirect`) to send them to its stub server along with everything else.
+    """
+    global _redirect
+    _redirect = redirect
+
+
+def fetch_json_all(uris, concurrency=16, per_host=4, timeout=60, cache=None):
+    """
+    Fetches and JSON-decodes every one of a list of URIs concurrently.
+
+    Parameters
+    ----------
+    uris: list of str
+        The URIs to fetch.
+    concurrency: int, default 16
+        The maximum number of requests in flight at any one time.
+    per_host: int, default 4
+        The maximum number of requests in flight against any one host at any one time.
+    timeout: int, default 60
+        The maximum amount of time, in seconds, to spend on any one request.
+    cache: http_cache.HTTPCache, default None
+        An HTTP cache to make requests through. Requests for URIs in the cache are made conditional, and those which
+        come back 304 Not Modified are served from the cache.
+
+    Returns
+    -------
+    A list of decoded JSON payloads, in the same order as `uris`. Requests which failed are represented in the list by
+    the exception that they raised, so that the caller may decide what to do with them.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_fetch_json_all(uris, concurrency, per_host, timeout, cache))
+    finally:
+        loop.close()
+
+
+async def _fetch_json_all(uris, concurrency, per_host, timeout, cache):
+    import aiohttp
+
+    redirect = _redirect
+    loop = asyncio.get_event_loop()
+    in_flight = asyncio.Semaphore(concurrency)
+    host_limits = dict()
+    results = [None] * len(uris)
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        with ThreadPoolExecutor(max_workers=1) as cache_thread, tqdm(total=len(uris)) as progress:
+
+            async def fetch(i, uri):
+                host = urlparse(uri).netloc
+                if host not in host_limits:
+                    host_limits[host] = asyncio.Semaphore(per_host)
+
+                async with host_limits[host], in_flight:
+                    throttled = throttle.host(uri)
+                    entered = released = False
+                    try:
+                        # The throttle may hold us back further still, if the host has been complaining.
+                        await throttled.wait()
+                        entered = True
+                        start = time.monotonic()
+                        headers = dict()
+                        if cache:
+                            headers = await loop.run_in_executor(cache_thread, cache.request_headers, uri)
+                        url = uri
+                        if redirect:
+                            url, redirect_headers = redirect.rewrite(uri)
+                            headers.update(redirect_headers)
+                        async with session.get(url, headers=headers) as response:
+                            elapsed = time.monotonic() - start
+                            throttled.release(response.status, elapsed, throttle.retry_after(response))
+                            released = True
+                            if redirect:
+                                redirect.log("GET", uri, elapsed)
+                            response.raise_for_status()
+                            body = await response.read()
+                            if cache:
+                                _, body, _ = await loop.run_in_executor(cache_thread, cache.update, uri,
+                                                                        response.status, response.headers, body)
+                            # Some portals serve JSON with a text/plain content-type, so don't check it.
+                            results[i] = json.loads(body.decode('utf-8'))
+                    except Exception as e:
+                        results[i] = e
+                    finally:
+                        # Including if the task is cancelled mid-request.
+                        if entered and not released:
+                            throttled.release(None)
+
+                progress.update(1)
+
+            await asyncio.gather(*[fetch(i, uri) for i, uri in enumerate(uris)])
+
+    return results
@@ -0,0 +1,214 @@
+"""
+This module implements a pool of worker processes with hard per-task timeouts, used for sizing many resources at once.
+
+Sizing a resource means downloading (some or all of) it, and some resources are large enough or served slowly enough
+that this takes forever. Historically we've dealt with this in two ways, neither of them good. `generic.timeout_process`
+uses SIGALRM, which only works in the main thread, only accepts whole seconds, and tends to surface as some other
+error raised from deep inside `requests`. `limited_requests` started a brand new process for every URI, which is slow,
+and didn't allow running more than one download at a time.
+
+A `WorkerPool` keeps a fixed number of worker processes around and reuses them from task to task. Each task gets a
+wall-clock deadline. A worker which overruns its deadline is killed outright and replaced with a fresh one, and the
+task is reported as having timed out. Each worker talks to the parent over its own pipe, so that killing one cannot
+corrupt the others' communications.
+
+Workers are forked, so that they inherit the parent's configuration (e.g. a `replay` session). Forking a process with
+other threads running in it is hazardous: the child gets a copy of every lock as it was at the time of the fork, and a
+lock which some other thread happened to be holding is never released in the child. So, where possible, start the pool
+before starting any threads, and pass it in (as the pipelined glossarizers do). Workers which replace a killed worker
+have to be forked mid-run all the same, so every worker replaces the locks (and the throttle's in-flight request counts)
+shared by the fetch paths in this package before it takes on any tasks.
+"""
+
+import multiprocessing as mp
+import pickle
+import time
+from multiprocessing.connection import wait
+
+
+class TaskTimeoutError(Exception):
+    """
+    This exception is reported for a task which did not complete within the pool's timeout.
+    """
+    pass
+
+
+class WorkerDiedError(Exception):
+    """
+    This exception is reported for a task whose worker process died without reporting a result, e.g. by segfaulting.
+    """
+    pass
+
+
+def _work(conn):
+    """
+    The worker process main loop: receive a task, run it, send back the outcome, repeat until told to stop.
+    """
+    from . import metrics, session, throttle
+    session.after_fork()
+    throttle.after_fork()
+    metrics.registry.after_fork()
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        func, args, kwargs = task
+        try:
+            outcome = (True, func(*args, **kwargs))
+        except Exception as e:
+            outcome = (False, e)
+
+        try:
+            conn.send(outcome)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            # Some exceptions (and results) can't be pickled. Send back something which can be.
+            conn.send((False, RuntimeError(repr(outcome[1]))))
+
+
+class _Worker:
+    def __init__(self):
+        self.conn, child_conn = mp.Pipe()
+        self.process = mp.Process(target=_work, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+        self.task = None
+        self.deadline = None
+
+    def submit(self, i, func, args, kwargs, timeout):
+        self.conn.send((func, args, kwargs))
+        self.task = i
+        self.deadline = time.time() + timeout
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    A pool of reusable worker processes, each task in which is subject to a hard wall-clock timeout.
+
+    Parameters
+    ----------
+    processes: int, default 4
+        The number of worker processes to run.
+    timeout: float, default 60
+        The maximum amount of time, in seconds, that a single task may take.
+    """
+    def __init__(self, processes=4, timeout=60):
+        self.processes = max(1, processes)
+        self.timeout = timeout
+        self.workers = [_Worker() for _ in range(self.processes)]
+        self.kills = 0
+
+    def _replace(self, worker):
+        worker.kill()
+        replacement = _Worker()
+        self.workers[self.workers.index(worker)] = replacement
+        self.kills += 1
+        return replacement
+
+    def imap(self, func, iterable, **kwargs):
+        """
+        Runs `func(item, **kwargs)` over every item in `iterable`, in parallel across the pool. `func` must be
+        picklable, e.g. a module-level function.
+
+        Yields outcomes in the same order as `iterable`, as soon as they (and every outcome before them) are
+        available. The outcome of a task is its return value if it succeeded, or else the exception it raised, or a
+        `TaskTimeoutError` if it overran its timeout. It is up to the caller to check which.
+        """
+        tasks = iter(iterable)
+        exhausted = False
+        outcomes = dict()
+        next_task = 0
+        next_outcome = 0
+
+        while True:
+            # Hand out tasks to any idle workers.
+            for worker in list(self.workers):
+                if worker.task is None and not exhausted:
+                    if not worker.process.is_alive():
+                        worker = self._replace(worker)
+                    try:
+                        item = next(tasks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    worker.submit(next_task, func, (item,), kwargs, self.timeout)
+                    next_task += 1
+
+            # Hand back whatever outcomes are ready, in order.
+            while next_outcome in outcomes:
+                yield outcomes.pop(next_outcome)
+                next_outcome += 1
+
+            busy = [worker for worker in self.workers if worker.task is not None]
+            if not busy:
+                if exhausted:
+                    return
+                continue
+
+            # Wait for a worker to report back, or for the nearest deadline to pass, whichever comes first.
+            wait_for = max(0, min(worker.deadline for worker in busy) - time.time())
+            ready = wait([worker.conn for worker in busy] + [worker.process.sentinel for worker in busy], wait_for)
+
+            for worker in busy:
+                if worker.conn in ready:
+                    try:
+                        _, outcomes[worker.task] = worker.conn.recv()
+                        worker.task = None
+                        continue
+                    except EOFError:
+                        pass
+
+                if worker.conn in ready or worker.process.sentinel in ready:
+                    # The process exited without reporting back.
+                    outcomes[worker.task] = WorkerDiedError("The worker process died while running the task.")
+                    worker.task = None
+                    self._replace(worker)
+
+                elif time.time() >= worker.deadline:
+                    outcomes[worker.task] = TaskTimeoutError(
+                        "The task did not complete within the {0} second timeout.".format(self.timeout)
+                    )
+                    worker.task = None
+                    self._replace(worker)
+
+    def run(self, func, item, **kwargs):
+        """
+        Runs a single task, blocking until it completes. Returns its outcome, as in `imap`.
+        """
+        return next(self.imap(func, [item], **kwargs))
+
+    def close(self):
+        """
+        Stops every worker in the pool, killing any which are mid-task.
+        """
+        for worker in self.workers:
+            if worker.task is not None:
+                worker.kill()
+            else:
+                worker.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
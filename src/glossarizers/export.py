@@ -0,0 +1,202 @@
+"""
+This module exports glossaries to a partitioned Parquet dataset, for analysis.
+
+Glossaries are written as JSON, in one of two layouts: the flat layout that the glossarizers write now, and the older
+grouped layout (with `id`, `sizing`, `usage` and so on sub-dicts) that some of the files in the data folder use. JSON
+is convenient to write incrementally, but slow and memory-hungry to read back in bulk, and every analysis has had to
+re-parse and re-flatten it from scratch.
+
+`write_parquet` flattens glossaries from any number of portals into a single table with typed columns: row, column and
+page view counts are int64, filesizes are float64, dates are UTC timestamps, list fields (sources, tags, column names
+and so on) are lists of strings, and the repetitive string fields (formats, mimetypes, licenses...) are dictionary
+encoded. The dataset is partitioned by portal and endpoint type, one Parquet file apiece, in the Hive directory layout:
+
+    glossary.parquet/portal=nyc/endpoint_type=table/part-0.parquet
+
+`read_parquet` reads all of it back (or just the columns and partitions asked for) as a `pandas.DataFrame`, e.g.:
+
+    write_parquet([("nyc", "table", "data/nyc/glossaries/table.json"),
+                   ("nyc", "blob", "data/nyc/glossaries/blob.json"),
+                   ("singapore", "resources", "data/singapore/glossaries/resources.json")],
+                  "data/glossary.parquet")
+    read_parquet("data/glossary.parquet", columns=['name', 'rows'], filters=[('portal', '=', 'nyc')])
+
+Fields outside of the schema below are left out of the export. Messy values are normalized rather than rejected: a
+numeric field that isn't a number (e.g. a ">60s" filesize, recorded for resources which timed out) is null.
+
+Requires `pyarrow`.
+"""
+
+import os
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .generic import read_file
+
+
+STRING_COLUMNS = ('landing_page', 'resource', 'name', 'description')
+
+CATEGORICAL_COLUMNS = ('dataset', 'protocol', 'preferred_format', 'preferred_mimetype', 'license', 'publisher',
+                       'update_frequency')
+
+LIST_COLUMNS = ('sources', 'topics_provided', 'keywords_provided', 'tags_provided', 'available_formats',
+                'column_names', 'flags')
+
+INTEGER_COLUMNS = ('rows', 'columns', 'page_views')
+
+FLOAT_COLUMNS = ('filesize',)
+
+TIMESTAMP_COLUMNS = ('created', 'last_updated')
+
+PARTITION_COLUMNS = ('portal', 'endpoint_type')
+
+TIMESTAMP_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S")
+
+SCHEMA = pa.schema(
+    [pa.field(name, pa.string()) for name in STRING_COLUMNS] +
+    [pa.field(name, pa.dictionary(pa.int32(), pa.string())) for name in CATEGORICAL_COLUMNS] +
+    [pa.field(name, pa.list_(pa.string())) for name in LIST_COLUMNS] +
+    [pa.field(name, pa.int64()) for name in INTEGER_COLUMNS] +
+    [pa.field(name, pa.float64()) for name in FLOAT_COLUMNS] +
+    [pa.field(name, pa.timestamp('us', tz='UTC')) for name in TIMESTAMP_COLUMNS]
+)
+
+
+def flatten(entry):
+    """
+    Flattens a glossary entry in the older grouped layout into the flat layout. Entries already in the flat layout are
+    returned as-is.
+    """
+    flat = dict()
+    for key, value in entry.items():
+        if isinstance(value, dict):
+            flat.update(value)
+        else:
+            flat[key] = value
+    return flat
+
+
+def _string(value):
+    if isinstance(value, list):
+        value = "\n".join(str(v) for v in value if v is not None)
+    return value if isinstance(value, str) else None
+
+
+def _strings(value):
+    if value is None:
+        return None
+    if not isinstance(value, list):
+        value = [value]
+    return [str(v) for v in value if v is not None]
+
+
+def _integer(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _timestamp(value):
+    """
+    Parses a timestamp as written by the glossarizers. Socrata timestamps carry a "+00:00" UTC offset, CKAN ones don't,
+    but are UTC as well.
+    """
+    if not isinstance(value, str):
+        return None
+    if value.endswith("+00:00"):
+        value = value[:-len("+00:00")]
+    for timestamp_format in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(value, timestamp_format).replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return None
+
+
+CONVERTERS = dict(
+    [(name, _string) for name in STRING_COLUMNS + CATEGORICAL_COLUMNS] +
+    [(name, _strings) for name in LIST_COLUMNS] +
+    [(name, _integer) for name in INTEGER_COLUMNS] +
+    [(name, _float) for name in FLOAT_COLUMNS] +
+    [(name, _timestamp) for name in TIMESTAMP_COLUMNS]
+)
+
+
+def to_table(glossary):
+    """
+    Converts a glossary (a list of entries, in either layout) into a `pyarrow.Table` with the export schema.
+    """
+    columns = {name: [] for name in SCHEMA.names}
+    for entry in glossary:
+        entry = flatten(entry)
+        for name in SCHEMA.names:
+            columns[name].append(CONVERTERS[name](entry.get(name)))
+
+    return pa.Table.from_arrays([pa.array(columns[field.name], type=field.type) for field in SCHEMA], schema=SCHEMA)
+
+
+def partition_directory(root_path, portal, endpoint_type):
+    return os.path.join(root_path,
+                        "{0}={1}".format(PARTITION_COLUMNS[0], quote(portal, safe='')),
+                        "{0}={1}".format(PARTITION_COLUMNS[1], quote(endpoint_type, safe='')))
+
+
+def write_parquet(glossaries, root_path, compression='snappy'):
+    """
+    Exports glossaries to a partitioned Parquet dataset. Partitions being written are overwritten, others are left
+    alone, so portals may be exported one at a time.
+
+    Parameters
+    ----------
+    glossaries: list of (str, str, str) tuples
+        The glossaries to export, as (portal, endpoint type, glossary filename) tuples. The glossary may be a JSON
+        file or a `store.GlossaryStore`.
+    root_path: str
+        The root directory of the dataset.
+    compression: str, default "snappy"
+        The Parquet compression codec to use.
+
+    Returns
+    -------
+    The total number of entries written.
+    """
+    count = 0
+    for portal, endpoint_type, glossary_filename in glossaries:
+        table = to_table(read_file(glossary_filename, 'glossary'))
+
+        directory = partition_directory(root_path, portal, endpoint_type)
+        os.makedirs(directory, exist_ok=True)
+        pq.write_table(table, os.path.join(directory, "part-0.parquet"), compression=compression)
+        count += table.num_rows
+
+    return count
+
+
+def read_parquet(root_path, columns=None, filters=None):
+    """
+    Reads a dataset written by `write_parquet` back into a `pandas.DataFrame`. The `portal` and `endpoint_type`
+    partition columns come back as categoricals. Note that pandas represents integer columns with missing values
+    (e.g. `rows`, which only tables have) as floats.
+
+    Parameters
+    ----------
+    root_path: str
+        The root directory of the dataset.
+    columns: list of str, default None
+        The columns to read. Defaults to all of them.
+    filters: list of tuples, default None
+        Filters to apply, in the `pyarrow.parquet` format, e.g. `[('portal', '=', 'nyc')]`. Filters on the partition
+        columns skip reading the other partitions entirely.
+    """
+    return pq.read_table(root_path, columns=columns, filters=filters).to_pandas()
@@ -1,10 +1,19 @@
 """
 Generic IO methods which are common across all glossarizers, but not important enough to need their own package.
+
+Resource lists and glossaries are read from and written to JSON files, to JSON Lines files (one record per line) when
+the filename ends in ".jsonl", or to a SQLite store (see `store.py`) when the filename ends in ".sqlite" or ".db".
+
+Any of these may also be read lazily, one record at a time, with `iter_file`. `stream_glossary_todo` uses this to queue
+up resources for glossarization without ever holding the whole resource list in memory.
 """
 
 import os
 import json
 import errno
+from .store import GlossaryStore, is_store
+from .records import Resource, GlossaryEntry, Flag
+from . import metrics
 
 
 def preexisting_cache(folder_filepath, use_cache):
@@ -14,20 +23,184 @@ def preexisting_cache(folder_filepath, use_cache):
         return
 
 
+CHUNK_SIZE = 64 * 1024
+
+
+def is_jsonl(filename):
+    return filename.lower().endswith(".jsonl")
+
+
+def iter_json_array(fp, chunk_size=CHUNK_SIZE):
+    """
+    Parses a JSON array incrementally out of a file, yielding its elements one at a time. Only a chunk of the file
+    (plus whatever element is currently being parsed) is ever held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    started = False
+
+    while True:
+        # Skip past whitespace and separators, reading in more of the file if we run out.
+        while position < len(buffer) and buffer[position] in (" \t\r\n," if started else " \t\r\n"):
+            position += 1
+        if position == len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of JSON array.")
+            buffer = fp.read(chunk_size)
+            position = 0
+            eof = not buffer
+            continue
+
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array.")
+            started = True
+            position += 1
+            continue
+
+        if buffer[position] == "]":
+            return
+
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            end = None
+
+        # An element which runs up against the end of the buffer may have been cut short, so read on to make sure.
+        if end is None or (end == len(buffer) and not eof):
+            if eof:
+                raise ValueError("Invalid JSON array element at position {0}.".format(position))
+            chunk = fp.read(chunk_size)
+            buffer = buffer[position:] + chunk
+            position = 0
+            eof = not chunk
+            continue
+
+        yield element
+        position = end
+
+
+def iter_file(filename, table):
+    """
+    Iterates over a resource list (`table="resources"`) or glossary (`table="glossary"`) one record at a time, from a
+    JSON file, a JSON Lines file, or a `store.GlossaryStore`.
+    """
+    if is_store(filename):
+        with GlossaryStore(filename) as store:
+            yield from store.iterate(table)
+        return
+
+    with open(filename, "r") as fp:
+        if is_jsonl(filename):
+            for line in fp:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(fp)
+
+
+def read_file(filename, table):
+    """
+    Reads a resource list (`table="resources"`) or glossary (`table="glossary"`) from a JSON file, a JSON Lines file
+    or, if the filename ends in ".sqlite" or ".db", from a `store.GlossaryStore`.
+    """
+    if is_store(filename):
+        with GlossaryStore(filename) as store:
+            return store.read(table)
+
+    if is_jsonl(filename):
+        return list(iter_file(filename, table))
+
+    with open(filename, "r") as fp:
+        return json.load(fp)
+
+
+def dump_records(records, fp, jsonl=False):
+    """
+    Writes records out to a file one at a time, so that `records` may be a lazy iterable. The output is the same as
+    that of `json.dump(list(records), fp, indent=4)`, or else one record per line if `jsonl` is True.
+    """
+    if jsonl:
+        for record in records:
+            fp.write(json.dumps(record) + "\n")
+        return
+
+    fp.write("[")
+    empty = True
+    for record in records:
+        fp.write("\n    " if empty else ",\n    ")
+        fp.write(json.dumps(record, indent=4).replace("\n", "\n    "))
+        empty = False
+    fp.write("]" if empty else "\n]")
+
+
+def load_resource_list(resource_filename):
+    """
+    Loads a resource list, as `records.Resource` records.
+    """
+    return [Resource.wrap(resource) for resource in iter_file(resource_filename, 'resources')]
+
+
+def load_glossary(glossary_filename):
+    """
+    Loads a glossary, as `records.GlossaryEntry` records. A glossary which doesn't exist yet is loaded as empty.
+    """
+    if not os.path.isfile(glossary_filename):
+        return []
+    return [GlossaryEntry.wrap(entry) for entry in iter_file(glossary_filename, 'glossary')]
+
+
+def _write_file(records, filename, table):
+    with metrics.span("write_file", table=table):
+        if is_store(filename):
+            with GlossaryStore(filename) as store:
+                store.write(table, records)
+            return
+
+        with open(filename, "w") as fp:
+            dump_records(records, fp, jsonl=is_jsonl(filename))
+
+
 def write_resource_file(roi_repr, resource_filename):
-    with open(resource_filename, 'w') as fp:
-        json.dump(roi_repr, fp, indent=4)
+    _write_file(roi_repr, resource_filename, 'resources')
 
 
 def write_glossary_file(glossary_repr, glossary_filename):
-    with open(glossary_filename, "w") as fp:
-        json.dump(glossary_repr, fp, indent=4)
+    _write_file(glossary_repr, glossary_filename, 'glossary')
 
 
-def load_glossary_todo(resource_filename, glossary_filename, use_cache=True):
-    # Begin by loading in the data that we have.
-    with open(resource_filename, "r") as fp:
-        resource_list = json.load(fp)
+def update_resource_file(resource_filename, updated):
+    """
+    Merges resources whose flags have been updated back into an existing resource file, leaving its other resources
+    untouched. The file is streamed through rather than loaded, and the result swapped in for the original.
+
+    This is how the resources queued up by `stream_glossary_todo` are saved, as unlike `write_resource_file` it does
+    not require the full resource list to be held in memory.
+    """
+    updated = {resource_key(r): r for r in updated}
+
+    if is_store(resource_filename):
+        with GlossaryStore(resource_filename) as store:
+            store.upsert('resources', updated.values())
+        return
+
+    temporary_filename = resource_filename + ".tmp"
+    with open(temporary_filename, "w") as fp:
+        dump_records((updated.get(resource_key(r), r) for r in iter_file(resource_filename, 'resources')), fp,
+                     jsonl=is_jsonl(resource_filename))
+    os.replace(temporary_filename, resource_filename)
+
+
+def load_glossary_todo(resource_filename, glossary_filename, use_cache=True, journal=False):
+    # Begin by loading in the data that we have. If the glossary doesn't exist yet, this loads an empty list.
+    resource_list = load_resource_list(resource_filename)
+    glossary = load_glossary(glossary_filename)
+
+    # If a previous journaled run was killed before it could compact its journal, pick up where it left off.
+    if journal:
+        replay_journal(resource_list, glossary, glossary_filename)
 
     # If use_cache is True, remove resources which have already been processed. Otherwise, only exclude "ignore" flags.
     # Note: "removed" flags are not ignored. It's not too expensive to check whether or not this was a fluke or if the
@@ -37,17 +210,233 @@ def load_glossary_todo(resource_filename, glossary_filename, use_cache=True):
     else:
         resource_list = [r for r in resource_list if "ignore" not in r['flags']]
 
-    # Check whether or not the glossaries file exists.
-    preexisting = os.path.isfile(glossary_filename)
+    return resource_list, glossary
+
+
+def stream_glossary_todo(resource_filename, glossary_filename, use_cache=True, journal=False):
+    """
+    Like `load_glossary_todo`, but returns the resources to be glossarized as a lazy iterator, which reads them off
+    of disk (and filters out the ones that don't need doing) one at a time, as they are needed. The glossary is still
+    loaded in full.
+
+    Returns the iterator, the glossary, and a list of updated resources. The latter fills up as the iterator is
+    consumed, with every resource yielded so far (along with any resources whose flags were updated by replaying the
+    journal). Once they have been glossarized, save them with `update_resource_file`.
+    """
+    glossary = load_glossary(glossary_filename)
+
+    journaled_flags = dict()
+    if journal:
+        entries, journaled_flags = read_journal(glossary_filename)
+        glossary += [GlossaryEntry.wrap(entry) for entry in entries]
+
+    updated = []
+
+    def todo():
+        for resource in iter_file(resource_filename, 'resources'):
+            resource = Resource.wrap(resource)
+            journaled = resource_key(resource) in journaled_flags
+            if journaled:
+                resource['flags'] = journaled_flags[resource_key(resource)]
 
-    # If it does, load it. Otherwise, load an empty list.
-    if preexisting:
-        with open(glossary_filename, "r") as fp:
-            glossary = json.load(fp)
+            queued = "ignore" not in resource['flags'] and not (use_cache and "processed" in resource['flags'])
+            if journaled or queued:
+                updated.append(resource)
+            if queued:
+                yield resource
+
+    return todo(), glossary, updated
+
+
+def diff_glossary(resource_list, glossary, previous=None):
+    """
+    Diffs a freshly pulled resource list against the resource list that the glossary was last written alongside
+    (`previous`, see `write_previous_resource_file`), by resource (see `resource_key`) and `last_updated` time.
+
+    Resources which are unchanged since then carry their flags over from the previous resource list, so that resources
+    which were processed without generating any glossary entries (because they had been removed, say, or errored out)
+    are not redone either. Resources which are new, or which have been modified since, are left unflagged. If there is
+    no previous resource list, resources are instead compared against the glossary entries generated from them, and
+    those which have any are flagged "processed".
+
+    Returns the glossary less the entries for resources which have since been modified or deleted, which are the ones
+    that need to be redone (or dropped).
+    """
+    if previous is None:
+        previous = {resource_key(entry): (entry.get('last_updated'), [Flag.PROCESSED]) for entry in glossary}
     else:
-        glossary = []
+        previous = {resource_key(resource): (resource.get('last_updated'), resource['flags']) for resource in previous}
+    current = {resource_key(resource): resource.get('last_updated') for resource in resource_list}
 
-    return resource_list, glossary
+    for resource in resource_list:
+        key = resource_key(resource)
+        unchanged = key in previous and previous[key][0] == resource.get('last_updated')
+        carried = previous[key][1] if unchanged else []
+        flags = [flag for flag in resource['flags'] if flag not in CARRIED_FLAGS or flag == Flag.IGNORE]
+        resource['flags'] = flags + [flag for flag in carried if flag in CARRIED_FLAGS and flag not in flags]
+
+    kept = [entry for entry in glossary if resource_key(entry) in current and
+            current[resource_key(entry)] == entry.get('last_updated')]
+
+    new = len(set(current) - set(previous))
+    deleted = len(set(previous) - set(current))
+    modified = len([key for key in current if key in previous and previous[key][0] != current[key]])
+    print("{0} new, {1} modified, and {2} deleted resources since the glossary was last written.".format(
+        new, modified, deleted))
+
+    return kept
+
+
+def load_incremental_todo(resource_filename, glossary_filename, journal=False):
+    """
+    Like `load_glossary_todo`, but for incrementally refreshing an existing glossary against a freshly pulled resource
+    list: only resources which are new or have been modified since the glossary was last written are queued, and
+    glossary entries for resources which have since been modified or deleted are dropped. See `diff_glossary`.
+
+    Returns the queue, the glossary, and the full resource list. Unlike the queue, the full resource list includes
+    the resources which are unchanged, and is what should be written back out at the end of the run (and passed to
+    `write_previous_resource_file`).
+    """
+    resource_list = load_resource_list(resource_filename)
+    previous_filename = previous_resource_filename(glossary_filename)
+    previous = iter_file(previous_filename, 'resources') if os.path.isfile(previous_filename) else None
+    glossary = diff_glossary(resource_list, load_glossary(glossary_filename), previous=previous)
+
+    if journal:
+        replay_journal(resource_list, glossary, glossary_filename)
+
+    todo = [r for r in resource_list if "processed" not in r['flags'] and "ignore" not in r['flags']]
+    return todo, glossary, resource_list
+
+
+def previous_resource_filename(glossary_filename):
+    return glossary_filename + ".resources.jsonl"
+
+
+def write_previous_resource_file(resource_list, glossary_filename):
+    """
+    Keeps a copy of the resource list that a glossary was written alongside, flags and all, for the next incremental
+    refresh to diff against (see `diff_glossary`). The resource file itself can't be relied on for this, as it is
+    overwritten whenever the resource list is pulled afresh.
+    """
+    write_resource_file(resource_list, previous_resource_filename(glossary_filename))
+
+
+def journal_filename(glossary_filename):
+    return glossary_filename + ".journal"
+
+
+# The flags which record what became of a resource, and which an unchanged resource keeps from one incremental refresh
+# to the next (see `diff_glossary`).
+CARRIED_FLAGS = (Flag.PROCESSED, Flag.REMOVED, Flag.ERROR, Flag.IGNORE)
+
+
+def resource_key(resource):
+    # Landing pages are not unique on their own: a single CKAN package may contain several resources.
+    return resource['landing_page'], resource['resource']
+
+
+class GlossaryJournal:
+    """
+    An append-only journal of glossarization progress.
+
+    Ordinarily the glossary and resource list are only written out at the end of a run, by rewriting each file in
+    full. A run which is killed outright (by the OOM killer, say, or by a hung webdriver requiring a SIGKILL) never
+    gets that far and loses all of its progress. A journal instead records each resource as it is glossarized, as one
+    JSON line for each glossary entry generated from it followed by one JSON line recording its updated flags. Lines
+    are fsynced to disk in batches.
+
+    When the run finishes (successfully or otherwise) the journal is compacted into the usual glossary and resource
+    list files and then deleted. If it is killed before then, the journal is left behind, and the next journaled run
+    replays it on load (see `replay_journal`).
+
+    Parameters
+    ----------
+    glossary_filename: str
+        The name of the glossary file being written to. The journal is kept alongside it.
+    batch_size: int, default 50
+        The number of resources to record between fsyncs.
+    """
+    def __init__(self, glossary_filename, batch_size=50):
+        self.filename = journal_filename(glossary_filename)
+        self.batch_size = batch_size
+        self.unsynced = 0
+        self.fp = open(self.filename, "a")
+
+    def record(self, resource, glossarized_resources):
+        """
+        Records a resource (after it has been glossarized, and its flags updated) and the glossary entries generated
+        from it.
+        """
+        for entry in glossarized_resources:
+            self.fp.write(json.dumps({'glossary': entry}) + "\n")
+        self.fp.write(json.dumps({'resource': resource_key(resource), 'flags': resource['flags']}) + "\n")
+
+        self.unsynced += 1
+        if self.unsynced >= self.batch_size:
+            self.sync()
+
+    def sync(self):
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+        self.unsynced = 0
+
+    def compact(self, resource_list, glossary, resource_filename, glossary_filename, update=False):
+        """
+        Writes the resource list and glossary out in full, then discards the journal. If `update` is True,
+        `resource_list` is instead a list of updated resources to merge into the resource file, as with
+        `update_resource_file`.
+        """
+        self.sync()
+        if update:
+            update_resource_file(resource_filename, resource_list)
+        else:
+            write_resource_file(resource_list, resource_filename)
+        write_glossary_file(glossary, glossary_filename)
+        self.fp.close()
+        os.remove(self.filename)
+
+
+def read_journal(glossary_filename):
+    """
+    Reads a journal left behind by a killed run, if there is one. Returns the glossary entries it records, and a map
+    from resource keys (see `resource_key`) to the updated flags it records for them.
+    """
+    entries = []
+    flags = dict()
+
+    filename = journal_filename(glossary_filename)
+    if not os.path.isfile(filename):
+        return entries, flags
+
+    with open(filename, "r") as fp:
+        for line in fp:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # The last line may have been only partially written when the run was killed.
+                continue
+
+            if 'glossary' in event:
+                entries.append(event['glossary'])
+            else:
+                flags[tuple(event['resource'])] = event['flags']
+
+    return entries, flags
+
+
+def replay_journal(resource_list, glossary, glossary_filename):
+    """
+    Replays a journal left behind by a killed run (if there is one) into a freshly loaded resource list and glossary,
+    in place. The cost is proportional to the length of the journal, not to the size of the glossary.
+    """
+    entries, flags = read_journal(glossary_filename)
+    glossary += [GlossaryEntry.wrap(entry) for entry in entries]
+
+    for resource in resource_list:
+        key = resource_key(resource)
+        if key in flags:
+            resource['flags'] = flags[key]
 
 
 def timeout_process(seconds=10, error_message=os.strerror(errno.ETIME)):
@@ -0,0 +1,176 @@
+"""
+This module implements an on-disk HTTP cache for portal fetches, using conditional requests.
+
+Most of the datasets on a portal do not change from one crawl to the next, but every crawl nevertheless refetches all
+of their metadata from scratch. Most servers attach a validator to their responses, either an `ETag` or a
+`Last-Modified` date. If we hold on to the response and its validator, the next time we need the same URL we can send
+the validator back (as `If-None-Match` or `If-Modified-Since`), and if nothing has changed the server answers with an
+empty `304 Not Modified` instead of the full response.
+
+Response bodies are kept as individual files in the cache directory, and an index of them (URL, validators, headers,
+size, and last access time) is kept in a SQLite database alongside them. SQLite takes care of locking, so a single
+cache may be shared by several processes (e.g. the workers in an `executor.WorkerPool`) and threads. When the bodies
+in the cache grow larger than the size limit, the least recently used ones are evicted.
+
+Hits (304s), misses, and stores are counted in the index as well, see `HTTPCache.stats`.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from requests.structures import CaseInsensitiveDict
+
+from . import throttle
+
+
+class HTTPCache:
+    """
+    An on-disk HTTP cache.
+
+    Parameters
+    ----------
+    directory: str
+        The directory to keep the cache in. Created if it does not already exist.
+    max_size: int, default 1 GB
+        The maximum total size, in bytes, of the response bodies kept in the cache.
+    """
+    def __init__(self, directory, max_size=1024 ** 3):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, method TEXT, url TEXT, "
+                              "etag TEXT, last_modified TEXT, headers TEXT, size INTEGER, accessed REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, count INTEGER)")
+            self.conn.executemany("INSERT OR IGNORE INTO stats VALUES (?, 0)",
+                                  [('hits',), ('misses',), ('stores',), ('evictions',)])
+
+    @property
+    def conn(self):
+        # SQLite connections must not be shared across a fork, nor (by default) across threads, so each process, and
+        # each thread, opens its own.
+        local = self._local
+        if getattr(local, 'conn', None) is None or local.pid != os.getpid():
+            local.conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), timeout=60)
+            local.pid = os.getpid()
+        return local.conn
+
+    def __getstate__(self):
+        return {'directory': self.directory, 'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @staticmethod
+    def key(method, url):
+        return hashlib.sha1("{0} {1}".format(method, url).encode('utf-8')).hexdigest()
+
+    def _body_filename(self, key):
+        return os.path.join(self.directory, key + ".body")
+
+    def _count(self, name):
+        self.conn.execute("UPDATE stats SET count = count + 1 WHERE name = ?", (name,))
+
+    def request_headers(self, url, method='GET'):
+        """
+        Returns the conditional request headers to send for a URL, if we have a cached response for it.
+        """
+        row = self.conn.execute("SELECT etag, last_modified FROM entries WHERE key = ?",
+                                (self.key(method, url),)).fetchone()
+        if row is None:
+            return dict()
+
+        etag, last_modified = row
+        headers = dict()
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def update(self, url, status_code, headers, body, method='GET'):
+        """
+        Reconciles a response with the cache. If the response is a 304, returns the cached headers and body.
+        Otherwise stores the response (if it is a 200 carrying a validator) and returns its own headers and body.
+        The third element of the returned tuple is whether or not the response was served from the cache.
+        """
+        key = self.key(method, url)
+
+        with self.conn:
+            if status_code == 304:
+                row = self.conn.execute("SELECT headers FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None and os.path.isfile(self._body_filename(key)):
+                    self.conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+                    self._count('hits')
+                    with open(self._body_filename(key), "rb") as fp:
+                        return json.loads(row[0]), fp.read(), True
+
+            self._count('misses')
+
+            headers = CaseInsensitiveDict(headers)
+            if status_code != 200 or not ('etag' in headers or 'last-modified' in headers):
+                return dict(headers), body, False
+
+            with open(self._body_filename(key), "wb") as fp:
+                fp.write(body)
+            self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (key, method, url, headers.get('etag'), headers.get('last-modified'),
+                               json.dumps(dict(headers)), len(body), time.time()))
+            self._count('stores')
+            self._evict()
+
+        return dict(headers), body, False
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            try:
+                os.remove(self._body_filename(key))
+            except FileNotFoundError:
+                pass
+            self._count('evictions')
+
+            total -= size
+            if total <= self.max_size:
+                return
+
+    def request(self, method, url, session=None, **kwargs):
+        """
+        Makes a conditional request through the cache. Returns a `requests.Response`, which is synthesized from the
+        cache on a 304. Responses served from the cache have their `from_cache` attribute set to True. Requests which do
+        go out are throttled (see `throttle`).
+        """
+        headers = dict(kwargs.pop('headers', None) or dict())
+        headers.update(self.request_headers(url, method=method))
+
+        r = throttle.request(method, url, session=session, headers=headers, **kwargs)
+        response_headers, body, r.from_cache = self.update(url, r.status_code, r.headers, r.content, method=method)
+        if r.from_cache:
+            r.status_code = 200
+            r.headers = CaseInsensitiveDict(response_headers)
+            r._content = body
+        return r
+
+    def get(self, url, session=None, **kwargs):
+        return self.request('GET', url, session=session, **kwargs)
+
+    def head(self, url, session=None, **kwargs):
+        return self.request('HEAD', url, session=session, **kwargs)
+
+    def stats(self):
+        """
+        Returns the number of cache hits, misses, stores and evictions recorded over the life of the cache.
+        """
+        return dict(self.conn.execute("SELECT name, count FROM stats").fetchall())
@@ -3,17 +3,16 @@ This is a small module which defines an API for downloading resources from the w
 other words, while `requests.get` allows you to download something off the web, `limited_requests.limited_get` allows
 you to download it off the web, but only if it does so successfully within <timeout> seconds (and, if the file provides
 content-length information in its header, the file itself is of <sizeout> size).
+
+This module is now a thin wrapper over `executor.WorkerPool`, which should be preferred for fetching more than one
+resource at a time.
 """
 
-import requests
 import multiprocessing as mp
-import sys
-
 
-import pdb; pdb.set_trace()
-# TODO: UN-HARDCODE THIS!!!!!!!!
-sys.path.append("../src/glossarizers/datafy")
-import datafy
+from .executor import WorkerPool
+from . import throttle
+from .sizer import size_up
 
 
 class FileTooLargeException(Exception):
@@ -24,37 +23,22 @@ class FileTooLargeException(Exception):
     pass
 
 
-def _fetch(uri, q, reducer, sizeout=None):
+def _fetch(uri, reducer=size_up, sizeout=None):
 
     if sizeout:
-        r = requests.head(uri)
+        r = throttle.head(uri)
         if 'content-length' in r.headers:
-            if 'content-length' > sizeout:
+            if int(r.headers['content-length']) > sizeout:
                 raise FileTooLargeException
 
-    dataset_tuples = datafy.get(uri)
-    # print(dataset_tuples)  # for debugging
-    q.put(reducer(dataset_tuples))
-
-
-def _size_up(dataset_reprs):
-    dataset_representations = []
-    for repr in dataset_reprs:
-        dataset_representations.append({
-            'filesize': sys.getsizeof(repr['data'].content),
-            'dataset': repr['fp'],
-            'mimetype': repr['mime'],
-            'extension': repr['ext']
-        })
-
-    return dataset_representations
+    return reducer(uri)
 
 
 def q():
     return mp.Queue()
 
 
-def limited_get(uri, q, reducer=_size_up, timeout=60, sizeout=None):
+def limited_get(uri, q=None, reducer=size_up, timeout=60, sizeout=None):
     """
     Implemented a timed request. Note: this function blocks.
 
@@ -63,17 +47,15 @@ def limited_get(uri, q, reducer=_size_up, timeout=60, sizeout=None):
     uri: str
         The resource URI.
     q: mp.Queue
-        An `mp.Queue` object for message passing. For ease of use initialzie using `q = limited_requests.q()`.
+        Unused, kept for backwards compatibility. Workers now report back over a pipe.
     reducer: func
-        A function to be run after a resource is successfully downloaded. When this occurs, the resource is returned in
-        the format generated by the `datafy.get` function call: [(<data>, <type string>), ...], a list of tuples. The
-        reducer should input this representation and return what you want to get out of the data (probably a list of
-        "other stuff"). The default reducer is `_size_up`, which returns filesize information.
+        A function which inputs the resource URI and returns what you want to get out of the data (probably a list of
+        "other stuff"). The default reducer is `sizer.size_up`, which returns filesize information. The reducer is run
+        in a worker process, and so must be picklable.
     timeout: int
-        The maximum amount of time that this entire process will get. If the process takes longer than this, a SIGINT
-        will be raised to interrupt and kill the process and move on. This, the crux of the whole problem addressed
-        by this module, is done in order to avoid getting stuck on inordinately large files (for which sizeout can't
-        be specified).
+        The maximum amount of time that this entire process will get. If the process takes longer than this, it is
+        killed, and we move on. This, the crux of the whole problem addressed by this module, is done in order to
+        avoid getting stuck on inordinately large files (for which sizeout can't be specified).
     sizeout: int, default None
         The maximum size. Note that this parameter will only work for resources which define a `content-length` header.
 
@@ -81,13 +63,12 @@ def limited_get(uri, q, reducer=_size_up, timeout=60, sizeout=None):
     -------
     Whatever you get by reducing the URI, assuming the job completes. None, if the job doesn't complete.
     """
-    p = mp.Process(target=_fetch, args=(uri, q), kwargs={'reducer': reducer, 'sizeout': sizeout})
-    p.start()
-    p.join(timeout)
-    p.terminate()
-    # If the process succeeded the exitcode is 0.
-    if p.exitcode == 0:
-        repr = q.get()
-        for dataset in repr:
-            dataset['resource'] = uri
-        return repr
+    with WorkerPool(processes=1, timeout=timeout) as workers:
+        repr = workers.run(_fetch, uri, reducer=reducer, sizeout=sizeout)
+
+    if isinstance(repr, Exception):
+        return None
+
+    for dataset in repr:
+        dataset['resource'] = uri
+    return repr
@@ -0,0 +1,301 @@
+"""
+This module implements the timing and metrics instrumentation threaded through the glossarizers.
+
+Progress bars and warnings say how far along a crawl is, but not where its time goes: connecting to hosts, waiting on
+pages to render in the pager, downloading and sniffing files, or writing the output out. The glossarizers therefore
+report what they are doing to a `Registry`, as three kinds of metrics:
+
+* Counters, which count things: requests made, connections opened, resources glossarized or failed.
+* Histograms, which record a distribution of values (durations, mostly) in fixed buckets, Prometheus style.
+* Spans, which time a block of code (`with metrics.span("resourcify", endpoint_type="blob"): ...`), and record its
+  duration in the `span_seconds` histogram under a `span` label. Spans may nest.
+
+Each metric is identified by its name and its labels (keyword arguments, e.g. `host="data.cityofnewyork.us"`).
+
+The registry is per-process: the workers in an `executor.WorkerPool` each keep their own. To see every process's
+metrics in one place, call `configure(jsonl=filename)` before starting the run. Every counter increment and every
+observation is then also appended to that file as a JSON line, by whichever process made it; `load` reads the file back
+into a single registry afterwards. A registry can be written out in the Prometheus text format with
+`write_prometheus`, and summarized, slowest spans first, with `report`.
+
+Metrics are reported to the shared, module-level `registry`, through the module-level `increment`, `observe`, `span`
+and `timed` functions.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+
+# Histogram bucket upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, float('inf'))
+
+# The prefix of every metric name, when written out in the Prometheus format.
+PREFIX = "glossarizers_"
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """
+    A distribution of observed values, counted into buckets. Quantiles are estimated from the buckets, by
+    interpolating linearly within the bucket that the quantile falls in.
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = -float('inf')
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return float('nan')
+
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0
+                upper = self.buckets[i]
+                # The observed extremes bound the estimate, which also takes care of the unbounded last bucket.
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+
+class Registry:
+    """
+    A set of counters and histograms. Thread-safe. See the module docstring.
+    """
+    def __init__(self):
+        self.counters = OrderedDict()
+        self.histograms = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.jsonl = None
+        self._fd = None
+        self._pid = None
+
+    def configure(self, jsonl=None):
+        """
+        Sets the file to append every metric to as it is reported, or stops doing so if `jsonl` is None.
+        """
+        with self.lock:
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self.jsonl = jsonl
+            self._fd = None
+
+    def after_fork(self):
+        """
+        Replaces the registry's lock in a newly forked process, in case some other thread of the parent process held it
+        at the time of the fork.
+        """
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def _emit(self, record):
+        if self.jsonl is None:
+            return
+        # Each process appends to the file through a descriptor of its own, opened after any fork. A single `write` to
+        # a file opened for appending is never interleaved with another's, so lines from different processes don't mix.
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.jsonl, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        record['pid'] = self._pid
+        os.write(self._fd, (json.dumps(record) + "\n").encode('utf-8'))
+
+    def increment(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self._emit({'type': "counter", 'name': name, 'labels': labels, 'value': value})
+
+    def observe(self, name, value, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+            self._emit({'type': "histogram", 'name': name, 'labels': labels, 'value': value, 'time': time.time()})
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Times the block of code within, recording its duration (in seconds) in the `span_seconds` histogram with a
+        `span` label of `name`, whether or not it raises. Spans opened within other spans record their parent's name in
+        a `parent` label, so that time spent in, say, the pager can be told apart by what it was paging for.
+        """
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        parent = stack[-1] if stack else None
+
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            if parent is not None:
+                labels['parent'] = parent
+            self.observe("span_seconds", elapsed, span=name, **labels)
+
+    def timed(self, name, **labels):
+        """
+        A decorator which wraps every call to a function in a span.
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def counter(self, name, **labels):
+        return self.counters.get(_key(name, labels), 0)
+
+    def histogram(self, name, **labels):
+        return self.histograms.get(_key(name, labels))
+
+    def load(self, jsonl):
+        """
+        Adds the metrics recorded in a JSONL file (see `configure`) to this registry. Returns the registry.
+        """
+        with open(jsonl, "r") as fp:
+            for line in fp:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                key = _key(record['name'], record['labels'])
+                if record['type'] == "counter":
+                    self.counters[key] = self.counters.get(key, 0) + record['value']
+                else:
+                    if key not in self.histograms:
+                        self.histograms[key] = Histogram()
+                    self.histograms[key].observe(record['value'])
+        return self
+
+    def to_prometheus(self):
+        """
+        Returns the registry in the Prometheus text exposition format.
+        """
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join('{0}="{1}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')
+                                                     .replace("\n", "\\n")) for k, v in pairs) + "}"
+
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append("# TYPE {0}{1} counter".format(PREFIX, name))
+                    typed.add(name)
+                lines.append("{0}{1}{2} {3}".format(PREFIX, name, format_labels(labels), value))
+
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if name not in typed:
+                    lines.append("# TYPE {0}{1} histogram".format(PREFIX, name))
+                    typed.add(name)
+                cumulative = 0
+                for bound, n in zip(histogram.buckets, histogram.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float('inf') else repr(float(bound))
+                    lines.append("{0}{1}_bucket{2} {3}".format(PREFIX, name, format_labels(labels, [('le', le)]),
+                                                              cumulative))
+                lines.append("{0}{1}_sum{2} {3!r}".format(PREFIX, name, format_labels(labels), histogram.sum))
+                lines.append("{0}{1}_count{2} {3}".format(PREFIX, name, format_labels(labels), histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, filename):
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, "w") as fp:
+            fp.write(self.to_prometheus())
+        os.replace(temporary_filename, filename)
+
+    def report(self):
+        """
+        Returns a plain-text summary of the registry: the spans, by total time spent in them, and then the counters.
+        """
+        rows = []
+        with self.lock:
+            for (name, labels), h in self.histograms.items():
+                labels = dict(labels)
+                title = labels.pop('span', name) if name == "span_seconds" else name
+                if labels:
+                    title += " " + " ".join("{0}={1}".format(k, v) for k, v in sorted(labels.items()))
+                rows.append((h.sum, title, h))
+            counters = [(name, dict(labels), value) for (name, labels), value in self.counters.items()]
+
+        lines = ["{0:<60} {1:>8} {2:>10} {3:>9} {4:>9} {5:>9} {6:>9}".format(
+            "span", "count", "total s", "mean ms", "p50 ms", "p99 ms", "max ms")]
+        for total, title, h in sorted(rows, key=lambda row: -row[0]):
+            lines.append("{0:<60} {1:>8} {2:>10.2f} {3:>9.1f} {4:>9.1f} {5:>9.1f} {6:>9.1f}".format(
+                title[:60], h.count, total, total / h.count * 1000, h.quantile(0.5) * 1000, h.quantile(0.99) * 1000,
+                h.max * 1000))
+
+        if counters:
+            lines.append("")
+            lines.append("{0:<60} {1:>8}".format("counter", "value"))
+            for name, labels, value in sorted(counters, key=lambda row: (row[0], sorted(row[1].items()))):
+                title = name + "".join(" {0}={1}".format(k, v) for k, v in sorted(labels.items()))
+                lines.append("{0:<60} {1:>8}".format(title[:60], value))
+        return "\n".join(lines)
+
+
+registry = Registry()
+
+
+def configure(jsonl=None):
+    registry.configure(jsonl=jsonl)
+
+
+def increment(name, value=1, **labels):
+    registry.increment(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+def span(name, **labels):
+    return registry.span(name, **labels)
+
+
+def timed(name, **labels):
+    return registry.timed(name, **labels)
+
+
+def load(jsonl):
+    """
+    Reads the metrics recorded in a JSONL file (see `configure`) into a new registry.
+    """
+    return Registry().load(jsonl)
@@ -0,0 +1,121 @@
+"""
+This module defines the readiness conditions that the pagers wait on.
+
+Socrata portal pages are assembled client-side, over a series of AJAX requests which may land in any order, so a page
+which has "loaded" (as far as the browser is concerned) may not yet have the elements that we want to read off of it;
+and an element which is present may not yet have been filled in. Waiting on the presence of some parent element and
+then polling for its children with `time.sleep` is both slow (every page pays for the worst case) and unreliable (the
+elements found before the wait are never looked up again, so the poll cannot see them arrive).
+
+Instead, each pager waits on a condition which describes exactly what it needs: for example, "a single dataset-contents
+block, holding row and column metadata pairs whose keys and values have both been filled in". A condition, in the
+Selenium sense, is a function which takes the driver and returns something falsy if the page is not ready yet, and
+the value of interest (e.g. the metadata pairs) once it is. `WebDriverWait(driver, timeout).until(condition)` calls it
+every `poll_frequency` seconds until it returns something truthy, and returns that, so that the pager never has to look
+the elements up again afterwards.
+
+Conditions look elements up using `find_elements`, which returns an empty list (and does not raise) when there are no
+matches. Elements may still be swapped out of the page between being found and being read, raising a
+`StaleElementReferenceException`; pass `IGNORED_EXCEPTIONS` to the wait to just try again on the next poll.
+"""
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException
+
+
+# How often, in seconds, to check whether a page is ready.
+POLL_FREQUENCY = 0.05
+
+# The exceptions a condition may raise while the page is still changing under it.
+IGNORED_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+
+
+def any_of(*conditions):
+    """
+    A condition which is met once any of `conditions` is. Returns the value of the first one which is met.
+    """
+    def condition(driver):
+        for c in conditions:
+            value = c(driver)
+            if value:
+                return value
+        return False
+    return condition
+
+
+def all_of(*conditions):
+    """
+    A condition which is met once every one of `conditions` is, at once. Returns a list of their values.
+    """
+    def condition(driver):
+        values = []
+        for c in conditions:
+            value = c(driver)
+            if not value:
+                return False
+            values.append(value)
+        return values
+    return condition
+
+
+def url_is(url):
+    """
+    A condition which is met once the driver is on `url` (e.g. after having been redirected).
+    """
+    def condition(driver):
+        return driver.current_url == url
+    return condition
+
+
+def texts(locator, minimum=1):
+    """
+    A condition which is met once at least `minimum` elements matching `locator` have non-empty text. Returns that
+    text, for every matching element.
+    """
+    def condition(driver):
+        values = [element.text.strip() for element in driver.find_elements(*locator)]
+        values = [value for value in values if value]
+        return values if len(values) >= minimum else False
+    return condition
+
+
+def socrata_metadata(keys=('rows', 'columns')):
+    """
+    A condition which is met once a Socrata "primer" page's "What's in this Dataset?" block has been filled in, with
+    (at least) metadata pairs for each of `keys`. Returns the metadata pairs, as a dict of lowercased keys to values.
+
+    Some datasets have more than the usual row and column pairs in this block. That's ok; the extras are included.
+    """
+    def condition(driver):
+        contents = driver.find_elements(By.CLASS_NAME, "dataset-contents")
+        if len(contents) != 1:
+            return False
+
+        pairs = dict()
+        for pair in contents[0].find_elements(By.CLASS_NAME, "metadata-pair"):
+            key = pair.find_elements(By.CLASS_NAME, "metadata-pair-key")
+            value = pair.find_elements(By.CLASS_NAME, "metadata-pair-value")
+            if not key or not value:
+                return False
+            key, value = key[0].text.strip(), value[0].text.strip()
+            if not key or not value:
+                return False
+            pairs[key.lower()] = value
+
+        return pairs if all(key in pairs for key in keys) else False
+    return condition
+
+
+def socrata_download_link():
+    """
+    A condition which is met once a Socrata blob or link page's download button has been given somewhere to point to.
+    Returns the link. If there are several buttons, the first one is used.
+    """
+    def condition(driver):
+        for placard in driver.find_elements(By.CLASS_NAME, "download-buttons"):
+            for button in placard.find_elements(By.CLASS_NAME, "download"):
+                href = button.get_attribute("href")
+                if href:
+                    return href
+        return False
+    return condition
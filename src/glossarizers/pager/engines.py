@@ -0,0 +1,315 @@
+"""
+This module defines the browser engines that the pagers can page portals with.
+
+The pagers were written against PhantomJS, which has since been abandoned (and dropped from newer versions of
+Selenium). Headless Chromium and Firefox now fill the same role, and are faster and more faithful renderers besides.
+And some pages don't need a browser at all: when the elements a pager is after are rendered server-side, fetching the
+page over plain HTTP and parsing it is an order of magnitude faster than rendering it.
+
+Each engine is a driver factory, registered in `ENGINES` under its name:
+
+* "phantomjs": PhantomJS, the default. See the SETUP section of pager.py.
+* "chrome": headless Chromium (or Chrome), through chromedriver, which must be on your PATH.
+* "firefox": headless Firefox, through geckodriver, which must be on your PATH.
+* "static": no browser at all (see `StaticDriver`). Pages are fetched over HTTP and parsed as-is; scripts are not run.
+
+`start(engine)` starts a driver, with the settings given to `configure`, which also sets the engine that the pagers use
+by default: the module-level driver (`pager.default_driver`) and the drivers in a `pool.DriverPool` are started with
+`start()`. Drivers are reused from page to page; pass `max_uses` to a `pool.DriverPool` to recycle them every so often.
+
+Browser engines don't load resources which have no bearing on the page elements that the pagers read: images,
+stylesheets, fonts, and the analytics and tracking scripts that portal pages pull in from third parties (see
+`BLOCKED_RESOURCES`). This makes each page load smaller and faster. How resources are blocked differs from engine to
+engine. PhantomJS aborts matching requests from within PhantomJS itself. Chromium is given the matching URL patterns
+over the DevTools protocol. Firefox can only be told not to load images, stylesheets or fonts at all; it still loads
+third-party scripts.
+"""
+
+import re
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+from ..session import get_session
+
+
+# The resources which browser engines don't load: files with these extensions, and anything served from hosts whose
+# names start with these (e.g. "www.google-analytics.com").
+BLOCKED_RESOURCES = {
+    'extensions': ["css", "png", "jpg", "jpeg", "gif", "svg", "ico", "webp", "woff", "woff2", "ttf", "otf", "eot"],
+    'hosts': ["google-analytics", "googletagmanager", "doubleclick", "newrelic", "nr-data", "mixpanel", "fullstory",
+              "qualtrics", "zendesk", "zopim", "facebook", "twitter", "addthis", "hotjar"]
+}
+
+# Settings for new drivers, see `configure`.
+_settings = {'engine': "phantomjs", 'page_load_timeout': 30, 'blocked': BLOCKED_RESOURCES}
+
+
+def configure(engine=None, page_load_timeout=None, blocked=False):
+    """
+    Sets the engine that drivers are started with by default, and the settings that they are started with.
+
+    Parameters
+    ----------
+    engine: str, default None
+        The name of the engine to use by default, one of `ENGINES`. Defaults to leaving it as-is ("phantomjs", unless
+        set otherwise).
+    page_load_timeout: int, default None
+        The number of seconds a page load may take before the driver gives up on it. Without one, a driver stuck on a
+        page load would hang forever. Defaults to leaving it as-is (30, unless set otherwise).
+    blocked: dict, default False
+        The resources not to load, in the format of `BLOCKED_RESOURCES`. Pass None to load everything. Defaults to
+        leaving it as-is.
+    """
+    if engine is not None:
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine {0!r}; the engines are {1}.".format(engine, ", ".join(sorted(ENGINES))))
+        _settings['engine'] = engine
+    if page_load_timeout is not None:
+        _settings['page_load_timeout'] = page_load_timeout
+    if blocked is not False:
+        _settings['blocked'] = blocked
+
+
+def start(engine=None, **kwargs):
+    """
+    Starts and returns a driver for `engine` (defaults to the configured engine). Keyword arguments override the
+    configured settings.
+    """
+    settings = dict(_settings, **kwargs)
+    default = settings.pop('engine')
+    engine = engine or default
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine {0!r}; the engines are {1}.".format(engine, ", ".join(sorted(ENGINES))))
+    return ENGINES[engine](**settings)
+
+
+def _extension_pattern(blocked):
+    return r"\.({0})(\?|#|$)".format("|".join(map(re.escape, blocked.get('extensions', []))))
+
+
+def _host_pattern(blocked):
+    return r"^https?://([^/]*\.)?({0})\.".format("|".join(map(re.escape, blocked.get('hosts', []))))
+
+
+# Run within PhantomJS itself (not within the page), with the page as `this`.
+_PHANTOMJS_BLOCKING_SCRIPT = """
+var patterns = arguments[0].map(function (pattern) { return new RegExp(pattern, "i"); });
+this.onResourceRequested = function (requestData, networkRequest) {
+    for (var i = 0; i < patterns.length; i++) {
+        if (patterns[i].test(requestData.url)) {
+            networkRequest.abort();
+            return;
+        }
+    }
+};
+"""
+
+
+def phantomjs(page_load_timeout=30, blocked=BLOCKED_RESOURCES):
+    if not hasattr(webdriver, 'PhantomJS'):
+        raise WebDriverException("This version of Selenium no longer supports PhantomJS. Use another engine, e.g. "
+                                 "engines.configure(engine=\"chrome\").")
+    capabilities = dict(DesiredCapabilities.PHANTOMJS)
+    if blocked:
+        capabilities['phantomjs.page.settings.loadImages'] = False
+
+    driver = webdriver.PhantomJS(desired_capabilities=capabilities)
+    driver.set_page_load_timeout(page_load_timeout)
+
+    if blocked:
+        # The Python bindings do not know of PhantomJS's own "execute a script in PhantomJS" command, so teach them.
+        patterns = [p for p in (blocked.get('extensions') and _extension_pattern(blocked),
+                                blocked.get('hosts') and _host_pattern(blocked)) if p]
+        driver.command_executor._commands['executePhantomScript'] = ('POST', '/session/$sessionId/phantom/execute')
+        driver.execute('executePhantomScript', {'script': _PHANTOMJS_BLOCKING_SCRIPT, 'args': [patterns]})
+    return driver
+
+
+def chrome(page_load_timeout=30, blocked=BLOCKED_RESOURCES):
+    options = webdriver.ChromeOptions()
+    for argument in ["--headless=new", "--disable-gpu", "--no-sandbox", "--disable-dev-shm-usage",
+                     "--disable-extensions", "--mute-audio"]:
+        options.add_argument(argument)
+    if blocked:
+        options.add_argument("--blink-settings=imagesEnabled=false")
+    # Return from `get` once the document is parsed, rather than once every last resource is in: the pagers wait for
+    # the elements that they need themselves.
+    options.page_load_strategy = "eager"
+
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+
+    if blocked:
+        patterns = ["*.{0}".format(extension) for extension in blocked.get('extensions', [])]
+        patterns += ["*.{0}?*".format(extension) for extension in blocked.get('extensions', [])]
+        patterns += ["*://{0}.*".format(host) for host in blocked.get('hosts', [])]
+        patterns += ["*://*.{0}.*".format(host) for host in blocked.get('hosts', [])]
+        driver.execute_cdp_cmd("Network.enable", dict())
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {'urls': patterns})
+    return driver
+
+
+def firefox(page_load_timeout=30, blocked=BLOCKED_RESOURCES):
+    options = webdriver.FirefoxOptions()
+    options.add_argument("-headless")
+    options.page_load_strategy = "eager"
+    if blocked:
+        # 2 is "block".
+        options.set_preference("permissions.default.image", 2)
+        options.set_preference("permissions.default.stylesheet", 2)
+        options.set_preference("browser.display.use_document_fonts", 0)
+
+    driver = webdriver.Firefox(options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+def static(page_load_timeout=30, blocked=None):
+    # There is nothing to block: nothing but the page itself is ever loaded.
+    return StaticDriver(page_load_timeout=page_load_timeout)
+
+
+ENGINES = {'phantomjs': phantomjs, 'chrome': chrome, 'firefox': firefox, 'static': static}
+
+
+# Elements which never have any content, and so never have end tags.
+_VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+                            'source', 'track', 'wbr'])
+
+# Elements whose text is never displayed.
+_HIDDEN_ELEMENTS = frozenset(['script', 'style', 'head', 'template', 'noscript'])
+
+
+class StaticElement:
+    """
+    An element of a page read by a `StaticDriver`. Implements the subset of the `WebElement` API used by the pagers.
+    """
+    def __init__(self, tag, attributes, parent=None, url=None):
+        self.tag_name = tag
+        self.attributes = attributes
+        self.parent = parent
+        self.children = []
+        self.url = url
+
+    def _descendants(self):
+        for child in self.children:
+            if isinstance(child, StaticElement):
+                yield child
+                yield from child._descendants()
+
+    def _text(self):
+        if self.tag_name in _HIDDEN_ELEMENTS:
+            return ""
+        return "".join(child if isinstance(child, str) else child._text() for child in self.children)
+
+    @property
+    def text(self):
+        return " ".join(self._text().split())
+
+    def get_attribute(self, name):
+        value = self.attributes.get(name)
+        # Like a browser, resolve links against the page they are on.
+        if value is not None and name in ('href', 'src') and self.url:
+            value = urljoin(self.url, value)
+        return value
+
+    def find_elements(self, by, value):
+        elements = self._descendants()
+        if by == By.CLASS_NAME:
+            return [e for e in elements if value in (e.attributes.get('class') or "").split()]
+        elif by == By.TAG_NAME:
+            return [e for e in elements if e.tag_name == value.lower()]
+        elif by in (By.ID, By.NAME):
+            return [e for e in elements if e.attributes.get(by) == value]
+        else:
+            raise ValueError("The static engine does not support finding elements by {0}.".format(by))
+
+    def find_element(self, by, value):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException("No element found by {0} {1!r}.".format(by, value))
+        return elements[0]
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self, url):
+        super(_TreeBuilder, self).__init__(convert_charrefs=True)
+        self.url = url
+        self.root = StaticElement("#document", dict(), url=url)
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        element = StaticElement(tag, {k: v if v is not None else "" for k, v in attrs}, parent=self.stack[-1],
+                                url=self.url)
+        self.stack[-1].children.append(element)
+        if tag not in _VOID_ELEMENTS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_ELEMENTS:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        # Close the nearest open element of this kind (and any left unclosed within it). Stray end tags are ignored.
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag_name == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+class StaticDriver:
+    """
+    A stand-in for a webdriver which fetches pages over plain HTTP, through the shared session, and parses them as-is.
+    Implements the subset of the `WebDriver` API used by the pagers.
+
+    Scripts are not run, so only elements which are rendered server-side can be found. Since a static page never
+    changes after it has been loaded, the pagers check their readiness condition once rather than waiting on it.
+    """
+    static = True
+
+    def __init__(self, page_load_timeout=30):
+        self.page_load_timeout = page_load_timeout
+        self.current_url = None
+        self.page_source = ""
+        self.document = StaticElement("#document", dict())
+
+    def set_page_load_timeout(self, page_load_timeout):
+        self.page_load_timeout = page_load_timeout
+
+    def get(self, uri):
+        # Like a browser, load whatever comes back, errors included; the readiness condition decides what to make of it.
+        response = get_session().get(uri, timeout=self.page_load_timeout)
+        self.current_url = response.url
+        self.page_source = response.text
+
+        builder = _TreeBuilder(self.current_url)
+        builder.feed(self.page_source)
+        builder.close()
+        self.document = builder.root
+
+    @property
+    def title(self):
+        titles = self.document.find_elements(By.TAG_NAME, "title")
+        return titles[0].text if titles else ""
+
+    def find_elements(self, by, value):
+        return self.document.find_elements(by, value)
+
+    def find_element(self, by, value):
+        return self.document.find_element(by, value)
+
+    def execute(self, command, params=None):
+        # Static drivers have no browser to lose touch with, so are always alive (see `pool.is_alive`).
+        return {'value': None}
+
+    def quit(self):
+        pass
@@ -15,7 +15,7 @@ requests.get or wget is just going to be a page frame and a big JavaScript glob,
 actually want.
 
 Hence we need to open a browser, wait until the page is loaded (using some kind of sentinel for this), and only THEN
-run our op. Selenium allows this.
+run our op. Selenium allows this. What "loaded" means is spelled out exactly for each pager; see conditions.py.
 
 SETUP
 
@@ -27,6 +27,10 @@ To verify that you have added phantomjs to the path correctly, run "echo $HOME"
 install phantomjs via apt-get, see further:
 http://stackoverflow.com/questions/36770303/phantomjs-with-selenium-unable-to-load-atom-find-element
 
+PhantomJS is no longer maintained, and newer versions of Selenium no longer support it. To page with headless Chromium
+or Firefox instead, put chromedriver or geckodriver on your PATH, and call `engines.configure(engine="chrome")` (or
+"firefox") before paging. Pages which don't need a browser at all can use the "static" engine. See engines.py.
+
 Further explanations of why this was necessary for certain portals follows:
 
 SOCRATA
@@ -40,14 +44,19 @@ However, their new front page view, which they are calling "Primer", provides bo
 for a Selenium workup for fetching that information.
 """
 
-from selenium import webdriver
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException  # WebDriverException
 
+from .conditions import POLL_FREQUENCY, IGNORED_EXCEPTIONS, any_of, url_is, socrata_metadata, socrata_download_link
+from . import engines
+from ..throttle import limit as throttled
+from ..metrics import span
+
 
-driver = webdriver.PhantomJS()
+# The module-level driver, started on first use. See `default_driver`.
+_driver = None
 
 
 # Errors for throwing.
@@ -55,136 +64,124 @@ class DeletedEndpointException(Exception):
     pass
 
 
+def default_driver():
+    """
+    Returns the module-level driver, which is used whenever a pager function is not passed a driver explicitly. The
+    driver is started the first time it is asked for (starting a browser takes a while, and we don't want to pay for
+    it just for importing the pager), and again the first time it is asked for after `quit_default_driver`.
+    """
+    global _driver
+    if _driver is None:
+        _driver = engines.start()
+    return _driver
+
+
+def quit_default_driver():
+    """
+    Quits the module-level driver, if it has been started.
+    """
+    global _driver
+    if _driver is not None:
+        _driver.quit()
+        _driver = None
+
+
+def load(domain, uri, condition, timeout=10, driver=None, poll_frequency=POLL_FREQUENCY):
+    """
+    Loads a portal page in a Selenium webdriver, and waits until the specified condition is met. Returns the driver,
+    and the value of the condition (see `conditions.py`).
+
+    If no driver is passed the module-level driver is used. Drivers which die mid-run are not restarted here; to get
+    that behavior, check drivers out of a `pool.DriverPool` instead.
+    """
+    if driver is None:
+        driver = default_driver()
+
+    with throttled(uri), span("page_load"):
+        driver.get(uri)
+
+    # Socrata redirects pages for deleted endpoints to the portal's front page. This usually happens before the page
+    # load completes, but may also happen client-side, so we watch out for it while waiting as well.
+    deleted = url_is("https://" + domain + "/")
+    if deleted(driver):
+        raise DeletedEndpointException
+
+    try:
+        with span("page_wait"):
+            if getattr(driver, 'static', False):
+                # Static pages don't change after loading, so there is no point in waiting (see `engines.StaticDriver`).
+                value = condition(driver)
+                if not value:
+                    raise TimeoutException
+            else:
+                value = WebDriverWait(driver, timeout, poll_frequency=poll_frequency,
+                                      ignored_exceptions=IGNORED_EXCEPTIONS).until(any_of(condition, deleted))
+    except TimeoutException:
+        raise TimeoutException("{0} could not be processed within {1} seconds. Either the server was too slow to "
+                               "respond or the portal UI has changed.".format(uri, timeout))
+
+    if deleted(driver):
+        raise DeletedEndpointException
+    return driver, value
+
+
 def page_socrata(domain, uri, condition=EC.presence_of_element_located((By.CLASS_NAME, "dataset-contents")),
-                 timeout=10):
+                 timeout=10, driver=None):
     """
     Returns the portal page HTML contents in a Selenium webdriver. Waits until the specified condition is True.
+
+    If no driver is passed the module-level driver is used. Drivers which die mid-run are not restarted here; to get
+    that behavior, check drivers out of a `pool.DriverPool` instead.
     """
     # Choose a condition as close to the target elements of interest as possible. Failures may occur when a partial page
     # load occurs if that page load includes the conditioned element but not the targeted element. See further the
     # note in socrata_glossarizer.py.
+    driver, _ = load(domain, uri, condition, timeout=timeout, driver=driver)
+    return driver
 
-    # TODO: Implement this?
-    # def is_alive(driver):
-    #     from selenium.webdriver.remote.command import Command
-    #     import socket
-    #     import http.client
-    #     """
-    #     Helper function to check whether or not the driver is still open.
-    #     From: https://stackoverflow.com/questions/28934533/python-selenium-how-to-check-whether-the-webdriver-did-quit
-    #     """
-    #     try:
-    #         driver.execute(Command.STATUS)
-    #         return True
-    #     except (socket.error, http.client.CannotSendRequest):
-    #         return False
-    #
-    # try:
-    #     driver.get(uri)
-    # except WebDriverException:
-    #     driver = webdriver.PhantomJS()
-    #     driver.get(uri)
-    driver.get(uri)
 
-    try:
-        # Make sure that the endpoint hasn't been deleted.
-        if driver.current_url == "https://" + domain + "/":
-            raise DeletedEndpointException
-        WebDriverWait(driver, timeout).until(
-            condition
-        )
-        return driver
-    except TimeoutException:
-        raise TimeoutException("{0} could not be processed within {1} seconds. The server was likely too slow to "
-                               "respond".format(uri, timeout))
-
-
-def page_socrata_for_endpoint_size(domain, uri, timeout=10):
+def page_socrata_for_endpoint_size(domain, uri, timeout=10, driver=None):
     """
     Given the domain and URI of a table on a Socrata portal, returns information on the number of rows and columns
     thereof, if that information can be had within the allotted timeout.
     """
-    driver = page_socrata(domain, uri, timeout=timeout)
-
-    # Now pull out the DOM element containing the desired sizing information.
-    dataset_contents_list = driver.find_elements_by_class_name('dataset-contents')
-
-    if len(dataset_contents_list) != 1:
-        raise ValueError("{0} could not be processed because the portal UI has probably changed.".format(uri))
-
-    metadata_pairs = dataset_contents_list[0].find_elements_by_class_name('metadata-pair')
-
-    # Again we assert that we have the information that we need. However, it's important to note that in some cases,
-    # there are *more* than two elements in the "What's in this Dataset?" content block. I'm not at all sure what
-    # the rules for this are, but compare one without extras:
+    # The number of rows and columns are given in the "What's in this Dataset?" content block. In some cases there are
+    # *more* than these two metadata pairs in that block. I'm not at all sure what the rules for this are, but compare
+    # one without extras:
     # https://data.cityofnewyork.us/Public-Safety/NYPD-Motor-Vehicle-Collisions/h9gi-nx95
     # With one that has them:
     # https://data.cityofnewyork.us/Housing-Development/Housing-New-York-Units-by-Building/hg8x-zxpr
     # That's ok. We'll include that data but ignore it in the read script itself.
 
-    # It's difficult to design a wait condition that will guarantee that the metadata-pair element that we
-    # need is loaded onto the page (and not still moving over the pipe). Socrata uses AJAX, and makes no
-    # guarantees that one part of the screen will load before or after another. Checking that the metadata-pair
-    # parent element is present is sufficient in 95% of cases, but for the remaining cases I've not yet found
-    # a better way than just polling whether or not the deal is done using time.sleep.
-
-    # Socrata portals appear to heavily throttle page requests, even 10-second intervals are insufficient at times.
-    import time
-    for i in range(0, 100):
-        if len(metadata_pairs) < 2:
-            time.sleep(0.1)
-        else:
-            break
-
-    if len(metadata_pairs) < 2:
-        raise TimeoutException("{0} could not be processed to get file size within the {1} seconds allotted. Either "
-                               "the server was too slow or the portal UI has changed.".format(uri, timeout))
-
-    rowcol = dict()
-    for m in metadata_pairs:
-        key = m.find_element_by_class_name('metadata-pair-key').text
-        value = m.find_element_by_class_name('metadata-pair-value').text
-        rowcol.update({key.lower(): value})
+    # Socrata uses AJAX, and makes no guarantees that one part of the screen will load before or after another: the
+    # block may be present before any of its pairs are, and a pair before its value is. So we wait for exactly what we
+    # need, the rows and columns pairs with both their keys and values filled in, and read them off of the condition.
+    _, rowcol = load(domain, uri, socrata_metadata(), timeout=timeout, driver=driver)
 
     # Convert to a machine format. 342K -> 342000, 1M -> 1000000
-    rowcol['columns'] = int(rowcol['columns'])
-    r = rowcol['rows']
-    r = r.replace(",", "")
-    if "M" in r:
-        r = int(float(r[:-1]) * 1000000)
-    elif "K" in r:
-        r = int(float(r[:-1]) * 1000)
-    else:
-        r = int(r)
-    rowcol['rows'] = r
+    try:
+        rowcol['columns'] = int(rowcol['columns'].replace(",", ""))
+        r = rowcol['rows']
+        r = r.replace(",", "")
+        if "M" in r:
+            r = int(float(r[:-1]) * 1000000)
+        elif "K" in r:
+            r = int(float(r[:-1]) * 1000)
+        else:
+            r = int(r)
+        rowcol['rows'] = r
+    except ValueError:
+        raise ValueError("{0} could not be processed because the portal UI has probably changed.".format(uri))
 
     return rowcol
 
 
-def page_socrata_for_resource_link(domain, uri, timeout=10):
+def page_socrata_for_resource_link(domain, uri, timeout=10, driver=None):
     """
     Given the domain and URI of a link or blob on a Socrata portal, returns a download link for that resource,
     assuming that it can be had within the timeout allotted.
     """
-    # Unlike dataset size the download button is isolated to a unique element that can always be waited on.
-    condition = EC.presence_of_element_located((By.CLASS_NAME, "download-buttons"))
-    driver = page_socrata(domain, uri, condition=condition, timeout=timeout)
-
-    # Now pull out the DOM element containing the link.
-    download_placard = driver.find_elements_by_class_name('download-buttons')
-
-    # Check that the UI is what we expect it to be.
-    if len(download_placard) < 1:
-        raise ValueError("{0} could not be processed because the portal UI has probably changed.".format(uri))
-
-    # Select the download button DOM element (there may (?) be multiple buttons, take the first one).
-    download_buttons = download_placard[0].find_elements_by_class_name('download')
-    assert len(download_buttons) >= 1
-
-    # Check that the UI is what we expect it to be.
-    if len(download_buttons) < 1:
-        raise ValueError("{0} could not be processed because the portal UI has probably changed.".format(uri))
-
-    # Get the link and return it.
-    href = download_buttons[0].get_attribute("href")
-    return href
\ No newline at end of file
+    # Unlike dataset size the download button is isolated to a unique element that can always be waited on. We wait
+    # for the button itself to have a link, as it may be filled in after the element is.
+    _, href = load(domain, uri, socrata_download_link(), timeout=timeout, driver=driver)
+    return href
@@ -0,0 +1,148 @@
+"""
+This module defines a pool of webdrivers, for paging many portal pages in parallel.
+
+A single webdriver can only load one page at a time, and page loads on Socrata portals routinely take several seconds.
+Paging a thousand-odd tables through one driver is therefore slow, but since nearly all of that time is spent waiting
+on the portal the work parallelizes well: N drivers, each worked by its own thread, page roughly N times as fast (up
+to the point at which the portal starts throttling us, hence the cap on the pool size).
+
+Drivers are also fragile: PhantomJS processes occassionally die or wedge mid-run. The pool checks that a driver is
+still alive before handing it out, and after any error raised while it was checked out, and transparently replaces
+drivers which are not.
+
+Drivers are started by `engines.start` (see engines.py), unless the pool is given a factory of its own. Browsers also
+tend to grow over a long run; pass `max_uses` to have the pool replace each driver after that many pages.
+"""
+
+import socket
+import http.client
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.command import Command
+from urllib3.exceptions import HTTPError
+
+from .engines import start
+
+
+# The largest pool we are willing to run against a single portal.
+MAX_POOL_SIZE = 8
+
+
+def is_alive(driver):
+    """
+    Helper function to check whether or not the driver is still open.
+    From: https://stackoverflow.com/questions/28934533/python-selenium-how-to-check-whether-the-webdriver-did-quit
+    """
+    # Newer versions of Selenium have no STATUS command; asking for the current URL is just as cheap.
+    try:
+        driver.execute(getattr(Command, 'STATUS', Command.GET_CURRENT_URL))
+        return True
+    except (socket.error, http.client.CannotSendRequest, http.client.RemoteDisconnected, HTTPError,
+            WebDriverException):
+        return False
+
+
+class DriverPool:
+    """
+    A pool of webdrivers.
+
+    Parameters
+    ----------
+    size: int, default 4
+        The number of drivers to keep open. Capped at `max_size`.
+    driver_factory: func, default `engines.start`
+        A zero-argument function which returns a new driver.
+    max_size: int, default MAX_POOL_SIZE
+        The largest number of drivers the pool will open.
+    max_uses: int, default None
+        The number of times to check a driver out before replacing it with a fresh one. Defaults to reusing drivers for
+        as long as they stay alive.
+    """
+    def __init__(self, size=4, driver_factory=start, max_size=MAX_POOL_SIZE, max_uses=None):
+        self.size = max(1, min(size, max_size))
+        self.driver_factory = driver_factory
+        self.max_uses = max_uses
+        self.restarts = 0
+        self._uses = dict()
+
+        self._idle = queue.Queue()
+        self._drivers = []
+        for _ in range(self.size):
+            driver = driver_factory()
+            self._drivers.append(driver)
+            self._idle.put(driver)
+
+    def _restart(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+        replacement = self.driver_factory()
+        self._drivers[self._drivers.index(driver)] = replacement
+        self._uses.pop(id(driver), None)
+        self.restarts += 1
+        return replacement
+
+    @contextmanager
+    def driver(self):
+        """
+        Checks a driver out of the pool for the duration of a `with` block, blocking until one is free.
+        """
+        driver = self._idle.get()
+        try:
+            if not is_alive(driver) or (self.max_uses and self._uses.get(id(driver), 0) >= self.max_uses):
+                driver = self._restart(driver)
+            self._uses[id(driver)] = self._uses.get(id(driver), 0) + 1
+            yield driver
+        except Exception:
+            if not is_alive(driver):
+                driver = self._restart(driver)
+            raise
+        finally:
+            self._idle.put(driver)
+
+    def _run(self, func, item):
+        with self.driver() as driver:
+            return func(item, driver)
+
+    def map(self, func, items):
+        """
+        Runs `func(item, driver)` over every item in `items`, in parallel across the drivers in the pool. Yields the
+        results in the same order as `items`.
+
+        At most two jobs per driver are queued up at any one time, so that a failure does not leave a large backlog
+        of doomed jobs to be worked through, and so that `items` may be a lazy iterable.
+        """
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            pending = deque()
+            try:
+                for item in items:
+                    pending.append(executor.submit(self._run, func, item))
+                    if len(pending) >= 2 * self.size:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def quit(self):
+        """
+        Closes every driver in the pool.
+        """
+        for driver in self._drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.quit()
@@ -1,8 +1,9 @@
 import unittest
 import pytest
 
-import sys; sys.path.insert(0, '../')
-import pager
+import sys; sys.path.insert(0, '../../../')
+# noinspection PyUnresolvedReferences
+from glossarizers.pager import pager, pool, conditions, engines
 
 
 class TestPageSocrata(unittest.TestCase):
@@ -38,4 +39,160 @@ class TestPageSocrata(unittest.TestCase):
         # a different table endpoint that does exist
         uri = "https://data.cityofnewyork.us/d/97zg-4p9t"
         sizing = pager.page_socrata_for_endpoint_size(self.domain, uri)
-        assert set(sizing.keys()) == {'columns', 'rows'}
\ No newline at end of file
+        assert set(sizing.keys()) == {'columns', 'rows'}
+
+
+class FakeElement:
+    """
+    A stand-in for a page element, with children looked up by class name.
+    """
+    def __init__(self, text="", href=None, **children):
+        self.text = text
+        self.href = href
+        self.children = children
+
+    def find_elements(self, by, value):
+        return self.children.get(value, [])
+
+    def get_attribute(self, name):
+        return self.href if name == "href" else None
+
+
+class FakePage:
+    """
+    A stand-in for a webdriver on a page which fills itself in over a few polls, as an AJAX-heavy one does.
+    """
+    def __init__(self, stages, url="https://data.cityofnewyork.us/d/2rd2-9uwy"):
+        self.stages = stages
+        self.polls = 0
+        self.current_url = url
+
+    def get(self, uri):
+        pass
+
+    def find_elements(self, by, value):
+        page = self.stages[min(self.polls, len(self.stages) - 1)]
+        self.polls += 1
+        return page.find_elements(by, value)
+
+
+def metadata_pair(key, value):
+    return FakeElement(**{'metadata-pair-key': [FakeElement(key)], 'metadata-pair-value': [FakeElement(value)]})
+
+
+class TestConditions(unittest.TestCase):
+    def setUp(self):
+        self.domain = 'data.cityofnewyork.us'
+        self.uri = 'https://data.cityofnewyork.us/d/2rd2-9uwy'
+
+    def test_endpoint_size(self):
+        # The block arrives, then the rows pair (but not yet its value), then both pairs.
+        def contents(*pairs):
+            return FakeElement(**{'dataset-contents': [FakeElement(**{'metadata-pair': list(pairs)})]})
+
+        page = FakePage([FakeElement(), contents(), contents(metadata_pair("Rows", "")),
+                         contents(metadata_pair("Rows", "1.2M"), metadata_pair("Columns", "14"))])
+        sizing = pager.page_socrata_for_endpoint_size(self.domain, self.uri, timeout=1, driver=page)
+        assert sizing == {'rows': 1200000, 'columns': 14}
+        assert page.polls == 4
+
+    def test_resource_link(self):
+        placard = FakeElement(**{'download-buttons': [FakeElement(download=[FakeElement(href="http://x.org/a.zip")])]})
+        page = FakePage([FakeElement(**{'download-buttons': [FakeElement()]}), placard])
+        assert pager.page_socrata_for_resource_link(self.domain, self.uri, timeout=1, driver=page) == \
+            "http://x.org/a.zip"
+
+    def test_timeout(self):
+        page = FakePage([FakeElement()])
+        with pytest.raises(pager.TimeoutException):
+            pager.page_socrata_for_endpoint_size(self.domain, self.uri, timeout=0.2, driver=page)
+
+    def test_deleted(self):
+        page = FakePage([FakeElement()], url="https://data.cityofnewyork.us/")
+        with pytest.raises(pager.DeletedEndpointException):
+            pager.page_socrata_for_endpoint_size(self.domain, self.uri, timeout=1, driver=page)
+
+    def test_combinators(self):
+        yes, no = (lambda driver: "yes"), (lambda driver: False)
+        assert conditions.any_of(no, yes)(None) == "yes"
+        assert conditions.all_of(yes, yes)(None) == ["yes", "yes"]
+        assert not conditions.all_of(yes, no)(None)
+
+
+class FakeDriver:
+    """
+    A stand-in for a webdriver, which dies when told to.
+    """
+    def __init__(self):
+        self.alive = True
+
+    def execute(self, command):
+        if not self.alive:
+            raise ConnectionRefusedError
+
+    def quit(self):
+        self.alive = False
+
+
+class TestDriverPool(unittest.TestCase):
+    def test_map_preserves_order(self):
+        import time
+        import random
+
+        def job(item, driver):
+            time.sleep(random.random() / 100)
+            return item
+
+        with pool.DriverPool(4, driver_factory=FakeDriver) as drivers:
+            assert list(drivers.map(job, range(50))) == list(range(50))
+
+    def test_dead_drivers_are_restarted(self):
+        from selenium.common.exceptions import WebDriverException
+        from glossarizers import socrata_glossarizer, retry
+
+        class DyingPage(FakePage):
+            """
+            A driver on a sized table page, the first of which dies on its first page load.
+            """
+            deaths = 0
+
+            def __init__(self, **kwargs):
+                contents = FakeElement(**{'dataset-contents': [FakeElement(**{'metadata-pair': [
+                    metadata_pair("Rows", "10"), metadata_pair("Columns", "2")]})]})
+                super(DyingPage, self).__init__([contents])
+                self.alive = True
+
+            def get(self, uri):
+                if not DyingPage.deaths:
+                    DyingPage.deaths += 1
+                    self.alive = False
+                    raise WebDriverException("The browser has gone away.")
+
+            def execute(self, command):
+                if not self.alive:
+                    raise ConnectionRefusedError
+
+            def quit(self):
+                self.alive = False
+
+        resources = [{'landing_page': "https://data.cityofnewyork.us/d/{0:04d}-0000".format(i),
+                      'resource': "https://data.cityofnewyork.us/api/views/{0:04d}-0000/rows.csv".format(i),
+                      'flags': []} for i in range(4)]
+        engines.ENGINES['dying'] = lambda **kwargs: DyingPage()
+        engines.configure(engine="dying")
+        try:
+            glossary = []
+            socrata_glossarizer.get_glossary(resources, glossary, domain="data.cityofnewyork.us", timeout=1,
+                                             pool_size=2, retries=retry.RetryPolicy(base=0))
+        finally:
+            engines.configure(engine="phantomjs")
+            del engines.ENGINES['dying']
+
+        # The run finishes, and the resource whose driver died is retried on its replacement.
+        assert DyingPage.deaths == 1 and len(glossary) == 4
+        assert all(entry['rows'] == 10 for entry in glossary)
+        assert all('processed' in resource['flags'] for resource in resources)
+
+    def test_size_is_capped(self):
+        drivers = pool.DriverPool(100, driver_factory=FakeDriver, max_size=3)
+        assert drivers.size == 3
@@ -0,0 +1,226 @@
+"""
+This module implements a simple pipeline of concurrent stages joined by bounded queues.
+
+Building a glossary for a portal ordinarily happens in two batch phases joined by a file on disk: first the resource
+list is written out in full (`write_resource_representation`), and then it is read back in and glossarized
+(`write_glossary`). Both phases spend almost all of their time waiting on the network, and the second can't start
+until the very last of the first's requests has come back, so end-to-end the run takes the sum of the two.
+
+A `Pipeline` instead runs every stage at once, each in its own thread (or threads), handing items from one stage on to
+the next through a queue as soon as they are ready. The first resources are being sized while the catalog is still
+being read. Queues are bounded, so a stage which gets ahead of a slower stage downstream of it blocks until that stage
+catches up (backpressure), rather than piling up work in memory. End-to-end, a pipelined run takes about as long as
+its slowest stage.
+
+A stage either maps over items (`Stage(func, workers=n)`, where `func(item)` returns an iterable of zero or more
+outputs for the next stage, and runs in `n` threads), or else consumes the entire stream of items at once
+(`Stage(func, stream=True)`, where `func(items)` is passed an iterator over its input and returns an iterable of
+outputs, and runs in a single thread). The latter is useful for stages built on top of something which already handles
+its own concurrency, like an `executor.WorkerPool`. Note that a stage with more than one worker may put its outputs
+out of order.
+
+If any stage raises an exception, the pipeline is stopped and the exception is re-raised to the consumer.
+
+See `ckan_glossarizer.write_pipeline` and `socrata_glossarizer.write_pipeline`.
+"""
+
+import queue
+import threading
+import time
+
+
+# Marks the end of the stream of items passing between two stages.
+_DONE = object()
+
+
+class Stage:
+    """
+    A stage in a `Pipeline`.
+
+    Parameters
+    ----------
+    func: func
+        The function to run. If `stream` is False, this is passed one item at a time and returns an iterable of
+        outputs for each. If `stream` is True, it is passed an iterator over every item and returns an iterable of
+        outputs.
+    workers: int, default 1
+        The number of threads to run the stage in. Must be 1 if `stream` is True.
+    stream: bool, default False
+        Whether `func` consumes the entire stream of items at once, as opposed to one item at a time.
+    name: str, default None
+        A name for the stage, used in `Pipeline.stats`. Defaults to the name of `func`.
+    """
+    def __init__(self, func, workers=1, stream=False, name=None):
+        if stream and workers != 1:
+            raise ValueError("A stream stage runs in a single thread.")
+
+        self.func = func
+        self.workers = max(1, workers)
+        self.stream = stream
+        self.name = name or getattr(func, '__name__', 'stage')
+
+
+class _Stopped(Exception):
+    pass
+
+
+class Pipeline:
+    """
+    A pipeline of `Stage` objects, fed by an iterable `source`, with a queue of at most `maxsize` items between each
+    stage and the next. Iterate over the pipeline to run it and consume the outputs of the final stage.
+
+    Parameters
+    ----------
+    source: iterable
+        The items to feed into the first stage. Iterated over in a thread of its own.
+    stages: list of Stage
+        The stages to run, in order.
+    maxsize: int, default 64
+        The maximum number of items to queue up between any two stages.
+    """
+    def __init__(self, source, stages, maxsize=64):
+        self.source = source
+        self.stages = stages
+        self.maxsize = maxsize
+
+        self.queues = [queue.Queue(maxsize) for _ in range(len(stages) + 1)]
+        self.stopped = threading.Event()
+        self.error = None
+        self.threads = []
+
+        # Per-stage counts of items taken in and put out, and of the time spent working on them (summed over workers).
+        self.counts = {stage.name: {'in': 0, 'out': 0, 'busy': 0.0} for stage in stages}
+        self._lock = threading.Lock()
+        self._finished = [0] * len(stages)
+
+    def _put(self, q, item):
+        while True:
+            if self.stopped.is_set():
+                raise _Stopped()
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        while True:
+            if self.stopped.is_set():
+                raise _Stopped()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _fail(self, e):
+        with self._lock:
+            if self.error is None:
+                self.error = e
+        self.stopped.set()
+
+    def _feed(self):
+        try:
+            for item in self.source:
+                self._put(self.queues[0], item)
+            self._put(self.queues[0], _DONE)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self._fail(e)
+
+    def _drain(self, i, stage):
+        # Iterate over the items coming into a stage, until the end of the stream.
+        while True:
+            item = self._get(self.queues[i])
+            if item is _DONE:
+                return
+            with self._lock:
+                self.counts[stage.name]['in'] += 1
+            yield item
+
+    def _emit(self, i, stage, outputs):
+        for output in outputs:
+            self._put(self.queues[i + 1], output)
+            with self._lock:
+                self.counts[stage.name]['out'] += 1
+
+    def _run_stream(self, i, stage):
+        try:
+            start = time.time()
+            self._emit(i, stage, stage.func(self._drain(i, stage)))
+            self.counts[stage.name]['busy'] += time.time() - start
+            self._put(self.queues[i + 1], _DONE)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self._fail(e)
+
+    def _run_map(self, i, stage):
+        try:
+            for item in self._drain(i, stage):
+                start = time.time()
+                self._emit(i, stage, stage.func(item))
+                with self._lock:
+                    self.counts[stage.name]['busy'] += time.time() - start
+
+            # Let this stage's other workers know that the stream is over too. The last one out closes the stream for
+            # the next stage.
+            self._put(self.queues[i], _DONE)
+            with self._lock:
+                self._finished[i] += 1
+                last = self._finished[i] == stage.workers
+            if last:
+                self._put(self.queues[i + 1], _DONE)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self._fail(e)
+
+    def _start(self):
+        self.threads.append(threading.Thread(target=self._feed, daemon=True))
+        for i, stage in enumerate(self.stages):
+            target = self._run_stream if stage.stream else self._run_map
+            for _ in range(stage.workers):
+                self.threads.append(threading.Thread(target=target, args=(i, stage), daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stops every stage, and waits for them to finish whatever they're in the middle of.
+        """
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+    def __iter__(self):
+        self._start()
+        try:
+            while True:
+                try:
+                    item = self._get(self.queues[-1])
+                except _Stopped:
+                    break
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self.stop()
+
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        """
+        Runs the pipeline to completion, discarding the outputs of the final stage (if there are any).
+        """
+        for _ in self:
+            pass
+
+    def stats(self):
+        """
+        Returns the number of items each stage has taken in and put out so far, and the total time its workers have
+        spent busy.
+        """
+        with self._lock:
+            return {name: dict(counts) for name, counts in self.counts.items()}
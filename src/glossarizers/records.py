@@ -0,0 +1,122 @@
+"""
+This module implements compact record types for resources and glossary entries.
+
+Resources and glossary entries are dicts with fifteen-odd keys, and most of their values are duplicated many times
+over: the same protocols, formats, mimetypes, licenses, publishers, sources and keywords recur across thousands of
+records, as do the descriptions, column names and so on of the entries generated from the same dataset. But they are
+parsed out of the JSON into a fresh string every single time.
+
+A `Record` is a dict which interns its string values, and the strings in its list values, as they are set, so that all
+the records with the same publisher (say) share a single copy of it. List values are kept as lists, allocated at their
+exact size. Flags are `Flag` members, which compare (and hash) equal to the plain strings they stand for.
+
+Since records are dicts, they may be used anywhere a resource or glossary entry dict is expected, and serialize to the
+same JSON as the equivalent dict. Note that `Record.copy` returns a record, but `dict.copy` and `copy.copy` of a record
+return a plain dict.
+"""
+
+import sys
+from enum import Enum
+
+
+class Flag(str, Enum):
+    """
+    The flags which may be set on a resource.
+    """
+    PROCESSED = 'processed'
+    IGNORE = 'ignore'
+    REMOVED = 'removed'
+    ERROR = 'error'
+
+    # Hash (and so match in sets and dicts) the same as the equivalent plain string.
+    def __hash__(self):
+        return str.__hash__(self)
+
+
+def _flag(value):
+    try:
+        return Flag(value)
+    except ValueError:
+        return value
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _compact(key, value):
+    if key == 'flags' and isinstance(value, (list, tuple)):
+        # Lists built from a tuple are allocated at their exact size, rather than with room to grow.
+        return list(tuple(_flag(flag) for flag in value))
+    elif isinstance(value, (list, tuple)):
+        return list(tuple(_intern(v) for v in value))
+    else:
+        return _intern(value)
+
+
+class Record(dict):
+    """
+    A resource or glossary entry. Accepts the same arguments as `dict`.
+    """
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        if len(args) == 1 and isinstance(args[0], Record) and not kwargs:
+            # Fast path: the other record's values are interned already, and are shared as with `dict.copy`.
+            super(Record, self).__init__(args[0])
+        else:
+            super(Record, self).__init__({key: _compact(key, value) for key, value in dict(*args, **kwargs).items()})
+
+    def __setitem__(self, key, value):
+        super(Record, self).__setitem__(key, _compact(key, value))
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__, super(Record, self).__repr__())
+
+    @classmethod
+    def wrap(cls, record):
+        """
+        Converts a record loaded from a file into an instance of this class. Records in the older grouped layout,
+        which would gain nothing from it, are returned as-is.
+        """
+        if any(isinstance(value, dict) for value in record.values()):
+            return record
+        return cls(record)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def copy(self):
+        """
+        Returns a shallow copy of the record, as with `dict.copy`.
+        """
+        return type(self)(self)
+
+
+class Resource(Record):
+    """
+    An entry in a resource list.
+    """
+    __slots__ = ()
+
+
+class GlossaryEntry(Record):
+    """
+    An entry in a glossary.
+    """
+    __slots__ = ()
+
+
+def glossary_entry(resource):
+    """
+    Starts a glossary entry for a resource: a shallow copy of it, less any "processed" flag.
+    """
+    entry = GlossaryEntry(resource)
+    entry['flags'] = [flag for flag in entry['flags'] if flag != Flag.PROCESSED]
+    return entry
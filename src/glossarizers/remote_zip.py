@@ -0,0 +1,147 @@
+"""
+This module inspects ZIP archives hosted on remote servers without downloading them.
+
+The member listing of a ZIP archive lives in the archive's central directory, which sits at the very end of the file
+and is followed by a small "end of central directory" record pointing back at it. Reading a ZIP file's table of
+contents therefore only requires reading those two structures, which together are usually a few kilobytes, however
+large the archive itself is.
+
+Most static file servers (though not Socrata) support HTTP Range requests, which allow fetching an arbitrary byte
+range of a file. We wrap a remote file in a seekable file-like object whose reads are served by Range requests, and
+hand that to `zipfile`, which only ever reads the end of central directory record and the central directory when
+opening an archive.
+
+When the server does not support Range requests, `sizer.size_up` falls back to streaming the archive instead.
+"""
+
+import io
+import os
+from urllib.parse import urlparse
+
+import requests
+
+from . import throttle, metrics
+
+
+class RangeNotSupportedException(Exception):
+    """
+    This exception is thrown when a server answers a Range request with the entire file.
+    """
+    pass
+
+
+class RangeFile(io.RawIOBase):
+    """
+    A read-only, seekable file-like object over a remote file, served using HTTP Range requests.
+
+    Parameters
+    ----------
+    uri: str
+        The file URI.
+    size: int
+        The size of the file, in bytes.
+    timeout: int, default 60
+        The timeout to use for each individual request.
+    """
+    def __init__(self, uri, size, timeout=60):
+        self.uri = uri
+        self.size = size
+        self.timeout = timeout
+        self.position = 0
+        self.bytes_fetched = 0
+        self.requests_made = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        self.position = max(0, min(self.position, self.size))
+        return self.position
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self.size - self.position
+        n = min(n, self.size - self.position)
+        if n <= 0:
+            return b""
+
+        headers = {'Range': "bytes={0}-{1}".format(self.position, self.position + n - 1)}
+        r = throttle.get(self.uri, headers=headers, stream=True, timeout=self.timeout)
+        try:
+            r.raise_for_status()
+            # A server which ignores the Range header answers with a 200 and the whole file. Bail before reading it.
+            if r.status_code != 206:
+                raise RangeNotSupportedException("{0} does not support Range requests.".format(self.uri))
+            data = r.content
+        finally:
+            r.close()
+
+        self.requests_made += 1
+        self.bytes_fetched += len(data)
+        self.position += len(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def is_zip(uri, headers):
+    """
+    Returns whether or not a HEAD response suggests that a URI points to a ZIP archive.
+    """
+    content_type = headers.get('content-type', '').split(";")[0].strip().lower()
+    if content_type in ('application/zip', 'application/x-zip-compressed'):
+        return True
+    return os.path.splitext(urlparse(uri).path)[1].lower() == ".zip"
+
+
+def probe(uri, timeout=60):
+    """
+    HEADs a URI. If it looks like a ZIP archive, and the server advertises support for Range requests, returns a
+    `RangeFile` for it. Otherwise returns None.
+    """
+    try:
+        r = throttle.head(uri, allow_redirects=True, timeout=timeout)
+    except requests.RequestException:
+        return None
+
+    if r.status_code != 200:
+        return None
+    if r.headers.get('accept-ranges', '').lower() != 'bytes' or 'content-length' not in r.headers:
+        return None
+    if not is_zip(uri, r.headers):
+        return None
+    return RangeFile(r.url, int(r.headers['content-length']), timeout=timeout)
+
+
+@metrics.timed("remote_zip")
+def inspect(uri, timeout=60):
+    """
+    Returns sizing information for each file in a remote ZIP archive, in the format returned by `sizer.size_up`,
+    fetching only the archive's central directory. Returns None if the URI does not look like a ZIP archive or if
+    the server does not support Range requests, in which case the caller should fall back to streaming.
+    """
+    from .sizer import size_zip_members
+
+    fp = probe(uri, timeout=timeout)
+    if fp is None:
+        return None
+
+    try:
+        return size_zip_members(fp)
+    except RangeNotSupportedException:
+        return None
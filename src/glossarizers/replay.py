@@ -0,0 +1,599 @@
+"""
+This module implements an offline record/replay harness for the glossarizers, for testing and benchmarking them
+without going anywhere near a live portal.
+
+The glossarizers' own tests run against live NYC endpoints, which change, rate limit us, and go down; that makes them
+useless for measuring performance reproducibly. Instead, the responses to a run's requests can be recorded to a
+fixtures file, and later served back to it from a local stub server, which can be told to respond slowly, to throttle,
+or to fail some fraction of the time.
+
+Both ends hook into the shared session (see `session.configure`), which every request the glossarizers make over HTTP
+goes through, so the glossarizers themselves run unmodified, with their real domains:
+
+* `record(filename)` makes the shared session save every response (API responses and downloads alike) to a fixtures
+  file as it comes in.
+* `replay(server)` makes the shared session send every request to a `StubServer` instead of to the host it is addressed
+  to. The stub server looks up the recorded response for the request, and serves it. The asynchronous crawler
+  (`crawler.py`), which pools its own connections, is pointed at the stub server as well.
+
+Fixtures files are JSON Lines files, one response per line (see `Fixtures`). Since recording a portal with tens of
+thousands of resources is impractical, `synthesize_ckan` and `synthesize_socrata` instead make up fixtures for portals
+of any size, shaped like those of catalog.data.ug and data.cityofnewyork.us respectively. `synthesize_socrata_pages`
+makes up Socrata portal pages, for the pager's browsers to load from a stub server directly.
+
+Other requests which don't go through the shared session are not recorded or replayed. These are the requests made by
+the asynchronous crawler (which are replayed, but not recorded), by pysocrata (use a Socrata `catalog_filename`
+instead, see `socrata_glossarizer.get_portal_catalog`), and by the pager's browser.
+"""
+
+import base64
+import contextlib
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qsl
+
+from . import session
+from .session import PooledAdapter
+from .throttle import TokenBucket
+
+
+# The header a replayed request carries its original URL in.
+REPLAY_HEADER = "X-Replay-URL"
+
+# Headers which describe the body as it went over the wire, rather than the body itself. Recorded bodies have already
+# been decoded, so these are dropped from recorded responses.
+HOP_HEADERS = frozenset(['content-encoding', 'transfer-encoding', 'connection', 'keep-alive'])
+
+
+def fixture_key(method, url):
+    """
+    Returns the key a response to a request is recorded under. Query parameters are compared decoded and in any order,
+    as `requests` may encode them differently than whatever made up the URL did.
+    """
+    parts = urlsplit(url)
+    query = "&".join("{0}={1}".format(k, v) for k, v in sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return "{0} {1}://{2}{3}?{4}".format(method.upper(), parts.scheme, parts.netloc.lower(), parts.path or "/", query)
+
+
+class Fixtures:
+    """
+    A set of recorded responses, keyed by request (see `fixture_key`). Each response is a dict with `method`, `url`,
+    `status`, `headers` and `body` (bytes) keys.
+
+    On disk, fixtures are stored one per line, as JSON, with the body in a `body` string: as-is if it is UTF-8 text,
+    and base64-encoded otherwise (in which case the line has `"encoding": "base64"`). A later response to the same
+    request replaces an earlier one.
+    """
+    def __init__(self, responses=()):
+        self.responses = dict()
+        for response in responses:
+            self.add(**response)
+
+    def __len__(self):
+        return len(self.responses)
+
+    def add(self, method, url, status=200, headers=None, body=b""):
+        self.responses[fixture_key(method, url)] = {'method': method.upper(), 'url': url, 'status': status,
+                                                    'headers': dict(headers or dict()), 'body': body}
+
+    def lookup(self, method, url):
+        """
+        Returns the response recorded for a request, or None if there isn't one. A HEAD request for which no HEAD
+        response was recorded is answered with the headers of the GET response, if there is one.
+        """
+        response = self.responses.get(fixture_key(method, url))
+        if response is None and method.upper() == "HEAD":
+            response = self.responses.get(fixture_key("GET", url))
+            if response is not None:
+                headers = dict(response['headers'], **{'Content-Length': str(len(response['body']))})
+                response = dict(response, method="HEAD", headers=headers, body=b"")
+        return response
+
+    @staticmethod
+    def dumps(response):
+        record = dict(response)
+        try:
+            record['body'] = response['body'].decode('utf-8')
+        except UnicodeDecodeError:
+            record['body'] = base64.b64encode(response['body']).decode('ascii')
+            record['encoding'] = "base64"
+        return json.dumps(record) + "\n"
+
+    @staticmethod
+    def loads(line):
+        record = json.loads(line)
+        if record.pop('encoding', None) == "base64":
+            record['body'] = base64.b64decode(record['body'])
+        else:
+            record['body'] = record['body'].encode('utf-8')
+        return record
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "r") as fp:
+            return cls(cls.loads(line) for line in fp if line.strip())
+
+    def save(self, filename):
+        with open(filename, "w") as fp:
+            for response in self.responses.values():
+                fp.write(self.dumps(response))
+
+
+class RecordingAdapter(PooledAdapter):
+    """
+    A transport adapter which appends every response it receives to a fixtures file. Responses are read in full as
+    they come in, so that they can be recorded, even if they were requested with `stream=True`.
+
+    Each response is written out with a single `write` to a file opened for appending, so that worker processes
+    recording to the same file (e.g. those of an `executor.WorkerPool`) don't garble each other's lines.
+    """
+    def __init__(self, filename, **kwargs):
+        self.filename = filename
+        super(RecordingAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        response = super(RecordingAdapter, self).send(request, **kwargs)
+        body = response.content
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in HOP_HEADERS}
+        if request.method != "HEAD":
+            headers['Content-Length'] = str(len(body))
+
+        line = Fixtures.dumps({'method': request.method, 'url': request.url, 'status': response.status_code,
+                               'headers': headers, 'body': body})
+        with open(self.filename, "a") as fp:
+            fp.write(line)
+        return response
+
+
+class Redirect:
+    """
+    Redirects requests to a stub server at `address`, instead of to the hosts they are addressed to. The original URL
+    goes along in the `X-Replay-URL` header.
+
+    If a `log_filename` is given, the method, URL and round-trip time of every request are appended to it, one
+    tab-separated line per request.
+    """
+    def __init__(self, address, log_filename=None):
+        self.address = address
+        self.log_filename = log_filename
+
+    def rewrite(self, url):
+        """
+        Returns the URL to request `url` from the stub server with, and the headers to add to the request.
+        """
+        parts = urlsplit(url)
+        return ("http://{0}:{1}{2}{3}".format(self.address[0], self.address[1], parts.path or "/",
+                                              "?" + parts.query if parts.query else ""),
+                {REPLAY_HEADER: url})
+
+    def log(self, method, url, seconds):
+        if self.log_filename:
+            with open(self.log_filename, "a") as fp:
+                fp.write("{0}\t{1}\t{2:.6f}\n".format(method, url, seconds))
+
+
+class RedirectAdapter(PooledAdapter):
+    """
+    A transport adapter which sends every request to a stub server, instead of to the host it is addressed to. See
+    `Redirect`.
+    """
+    def __init__(self, address, log_filename=None, **kwargs):
+        self.redirect = Redirect(address, log_filename=log_filename)
+        super(RedirectAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        url = request.url
+        request.url, headers = self.redirect.rewrite(url)
+        request.headers.update(headers)
+
+        start = time.monotonic()
+        try:
+            return super(RedirectAdapter, self).send(request, **kwargs)
+        finally:
+            request.url = url
+            self.redirect.log(request.method, url, time.monotonic() - start)
+
+
+def _mount(adapter, **kwargs):
+    s = session.make_session(**kwargs)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+@contextlib.contextmanager
+def record(filename):
+    """
+    Within this context manager, every response to a request made through the shared session is appended to the
+    fixtures file `filename`. Load it back with `Fixtures.load`.
+    """
+    def factory(pool_connections=16, pool_maxsize=32, **kwargs):
+        adapter = RecordingAdapter(filename, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        return _mount(adapter, pool_connections=pool_connections, pool_maxsize=pool_maxsize, **kwargs)
+
+    session.configure(factory=factory)
+    try:
+        yield
+    finally:
+        session.configure(factory=None)
+
+
+@contextlib.contextmanager
+def replay(server, log_filename=None):
+    """
+    Within this context manager, every request made through the shared session is sent to the `StubServer` `server`
+    instead, as is every request made by the asynchronous crawler. `server` may also be the (host, port) address of a
+    stub server running in another process. See `Redirect` for `log_filename`.
+    """
+    from . import crawler
+    address = getattr(server, 'server_address', server)
+
+    def factory(pool_connections=16, pool_maxsize=32, **kwargs):
+        adapter = RedirectAdapter(address, log_filename=log_filename,
+                                  pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        return _mount(adapter, pool_connections=pool_connections, pool_maxsize=pool_maxsize, **kwargs)
+
+    session.configure(factory=factory)
+    crawler.configure(redirect=Redirect(address, log_filename=log_filename))
+    try:
+        yield
+    finally:
+        session.configure(factory=None)
+        crawler.configure(redirect=None)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.respond(self)
+
+    def do_HEAD(self):
+        self.server.respond(self)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """
+    A local HTTP server which serves recorded responses back to requests replayed to it (see `replay`).
+
+    Parameters
+    ----------
+    fixtures: Fixtures
+        The responses to serve. Requests for which no response was recorded get a 404. Requests made to the server
+        directly, rather than replayed to it, are served the responses recorded for its own URLs (see `root`).
+    latency: float, default 0
+        The number of seconds to wait before answering each request.
+    jitter: float, default 0
+        The maximum number of seconds (picked uniformly at random) to wait on top of `latency`.
+    rate: float, default None
+        The number of requests per second to allow, in the long run. Requests in excess of it are answered with a 429
+        and a `Retry-After` header, like a portal's rate limiter would. Defaults to no limit.
+    burst: int, default None
+        The number of requests to allow at once, when `rate` is set. Defaults to `rate`.
+    failure_rate: float, default 0
+        The fraction of requests to answer with a 503, at random.
+    seed: int, default None
+        The seed for the random numbers behind `jitter` and `failure_rate`.
+    port: int, default 0
+        The port to listen on. Defaults to any free port.
+
+    The server keeps `counts` of the requests it has answered (and how), and a count of the `connections` they came in
+    over.
+    """
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, fixtures, latency=0, jitter=0, rate=None, burst=None, failure_rate=0, seed=None, port=0):
+        super(StubServer, self).__init__(('127.0.0.1', port), StubHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.bucket = TokenBucket(rate, burst or max(1, rate)) if rate else None
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'throttled': 0, 'failed': 0, 'missing': 0}
+        self.connections = 0
+        self.thread = None
+
+    @property
+    def root(self):
+        return "http://{0}:{1}".format(*self.server_address)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super(StubServer, self).process_request(request, client_address)
+
+    def respond(self, handler):
+        with self.lock:
+            self.counts['requests'] += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            fail = self.failure_rate and self.random.random() < self.failure_rate
+            wait = self.bucket.reserve() if self.bucket else 0
+            if wait:
+                # Turned away requests don't count against the rate.
+                self.bucket.tokens += 1
+
+        if delay:
+            time.sleep(delay)
+
+        # Requests made to the server directly (by a browser, say) rather than replayed to it are looked up by the
+        # server's own URL.
+        url = handler.headers.get(REPLAY_HEADER) or self.root + handler.path
+        response = self.fixtures.lookup(handler.command, url)
+
+        if wait:
+            self._count('throttled')
+            self._send(handler, 429, {'Retry-After': "{0:.3f}".format(wait)}, b"")
+        elif fail:
+            self._count('failed')
+            self._send(handler, 503, dict(), b"")
+        elif response is None:
+            self._count('missing')
+            self._send(handler, 404, dict(), b"")
+        else:
+            self._send(handler, response['status'], response['headers'], response['body'], method=handler.command,
+                       range_header=handler.headers.get('Range'))
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    @staticmethod
+    def _send(handler, status, headers, body, method="GET", range_header=None):
+        headers = {k: v for k, v in headers.items() if k.lower() not in HOP_HEADERS}
+
+        # Serve simple byte ranges ("bytes=a-b", "bytes=a-" or "bytes=-n"), as `remote_zip` requests them.
+        if range_header and range_header.startswith("bytes=") and status == 200 and method == "GET":
+            first, _, last = range_header[len("bytes="):].partition("-")
+            size = len(body)
+            start, end = (size - int(last), size - 1) if not first else (int(first), int(last) if last else size - 1)
+            start, end = max(0, start), min(size - 1, end)
+            headers['Content-Range'] = "bytes {0}-{1}/{2}".format(start, end, size)
+            status, body = 206, body[start:end + 1]
+
+        handler.send_response(status)
+        for k, v in headers.items():
+            if k.lower() != 'content-length' or method == "HEAD":
+                handler.send_header(k, v)
+        if method != "HEAD":
+            handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        if method != "HEAD":
+            handler.wfile.write(body)
+
+
+def _csv(rng, rows):
+    lines = ["id,name,value"] + ["{0},{1},{2}".format(i, "row-{0}".format(i), rng.randint(0, 10 ** 6))
+                                 for i in range(rows)]
+    return ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def _endpoint_id(i):
+    # Socrata endpoint ids are two groups of four alphanumeric characters, e.g. "9cw8-7heb".
+    digest = hashlib.md5(str(i).encode('utf-8')).hexdigest()
+    return "{0}-{1}".format(digest[:4], digest[4:8])
+
+
+def synthesize_ckan(n, domain="catalog.data.ug", protocol="http", rows=20, seed=0):
+    """
+    Makes up fixtures for a CKAN portal with `n` packages, shaped like those of catalog.data.ug: a `package_list`, a
+    `package_show` for each package, and a small CSV file with `rows` rows for each of the packages' resources. Most
+    packages have a single resource; some have several, and a few have none at all.
+    """
+    rng = random.Random(seed)
+    fixtures = Fixtures()
+    root = "{0}://{1}".format(protocol, domain)
+    names = ["package-{0}".format(i) for i in range(n)]
+
+    def json_response(url, payload):
+        fixtures.add("GET", url, headers={'Content-Type': "application/json"},
+                     body=json.dumps(payload).encode('utf-8'))
+
+    json_response(root + "/api/3/action/package_list", {'success': True, 'result': names})
+
+    for i, name in enumerate(names):
+        n_resources = rng.choice([0] + [1] * 16 + [2, 3])
+        resources = []
+        for j in range(n_resources):
+            url = "{0}/dataset/{1}/resource/{2}/download/{1}-{2}.csv".format(root, name, j)
+            resources.append({'format': "CSV", 'url': url, 'name': "{0} ({1})".format(name, j)})
+            fixtures.add("GET", url, headers={'Content-Type': "text/csv"}, body=_csv(rng, rows))
+
+        json_response("{0}/api/3/action/package_show?id={1}".format(root, name), {'success': True, 'result': {
+            'id': "{0:08x}-0000-0000-0000-{1:012x}".format(i, i),
+            'title': "Package {0}".format(i),
+            'notes': "A made-up package.",
+            'license_title': "Creative Commons Attribution",
+            'organization': {'title': "Organization {0}".format(i % 10)} if i % 7 else None,
+            'tags': [{'name': "tag-{0}".format(i % 5)}],
+            'metadata_created': "2016-01-01T00:00:00.000000",
+            'metadata_modified': "2017-01-{0:02d}T00:00:00.000000".format(i % 28 + 1),
+            'resources': resources
+        }})
+
+    return fixtures
+
+
+def synthesize_socrata(n, domain="data.cityofnewyork.us", rows=20, seed=0):
+    """
+    Makes up the catalog and fixtures for a Socrata portal with `n` resources, shaped like data.cityofnewyork.us.
+    Three quarters of the resources are tables, which have a SODA API row count (see `soda.count_rows`); an eighth are
+    geospatial datasets, which have a small GeoJSON export; and the rest are blobs and links, which have view metadata
+    (see `soda.get_download_links`) and a small CSV file to download.
+
+    Returns
+    -------
+    The catalog, in the format `socrata_glossarizer.get_portal_catalog` caches catalogs on disk in, and the fixtures.
+    """
+    from .socrata_glossarizer import partition_portal_metadata
+
+    rng = random.Random(seed)
+    fixtures = Fixtures()
+    metadatas = []
+
+    def json_response(url, payload):
+        fixtures.add("GET", url, headers={'Content-Type': "application/json"},
+                     body=json.dumps(payload).encode('utf-8'))
+
+    for i in range(n):
+        endpoint = _endpoint_id(i)
+        if i % 8 < 6:
+            resource_type = "dataset"
+        elif i % 8 == 6:
+            resource_type = "map"
+        else:
+            resource_type = "file" if i // 8 % 2 == 0 else "href"
+        columns = ["column_{0}".format(c) for c in range(rng.randint(2, 20))] if resource_type == "dataset" else []
+        metadatas.append({
+            'resource': {
+                'id': endpoint, 'name': "Resource {0}".format(i), 'description': "A made-up resource.",
+                'attribution': "Department {0}".format(i % 10), 'type': resource_type,
+                'createdAt': "2016-01-01T00:00:00.000Z",
+                'updatedAt': "2017-01-{0:02d}T00:00:00.000Z".format(i % 28 + 1),
+                'page_views': {'page_views_total': rng.randint(0, 10 ** 5)}, 'columns_name': columns
+            },
+            'classification': {'domain_category': "Category {0}".format(i % 8), 'domain_tags': ["tag"]}
+        })
+
+        if resource_type == "dataset":
+            json_response("https://{0}/resource/{1}.json?$select=count(*)".format(domain, endpoint),
+                          [{'count': str(rng.randint(0, 10 ** 6))}])
+        elif resource_type == "map":
+            features = [{'type': "Feature", 'properties': {'id': r},
+                         'geometry': {'type': "Point", 'coordinates': [-74 + rng.random(), 40 + rng.random()]}}
+                        for r in range(rows)]
+            json_response("https://{0}/api/geospatial/{1}?method=export&format=GeoJSON".format(domain, endpoint),
+                          {'type': "FeatureCollection", 'features': features})
+        else:
+            view = {'id': endpoint, 'name': "Resource {0}".format(i)}
+            if resource_type == "file":
+                view.update({'blobId': endpoint, 'blobFilename': "{0}.csv".format(endpoint),
+                             'blobMimeType': "text/csv"})
+                url = "https://{0}/download/{1}/text%2Fcsv".format(domain, endpoint)
+            else:
+                url = "https://files.example.org/{0}.csv".format(endpoint)
+                view['metadata'] = {'additionalAccessPoints': [{'title': "Data", 'urls': {'csv': url}}]}
+            json_response("https://{0}/api/views/{1}.json".format(domain, endpoint), view)
+            fixtures.add("GET", url, headers={'Content-Type': "text/csv"}, body=_csv(rng, rows))
+
+    return {'domain': domain, 'endpoints': partition_portal_metadata(metadatas)}, fixtures
+
+
+# The asset fixtures served alongside synthetic portal pages, by path. Browser engines are expected to block these.
+_PAGE_ASSETS = {
+    "/assets/primer.css": ("text/css", (".metadata-pair { display: inline-block; margin: 4px; }\n" * 2000)),
+    "/assets/logo.png": ("image/png", b"\x89PNG\r\n\x1a\n" + bytes(64 * 1024)),
+    "/assets/font.woff2": ("font/woff2", bytes(96 * 1024))
+}
+
+_PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<title>{title}</title>
+<link rel="stylesheet" href="/assets/primer.css">
+<style>@font-face {{ font-family: "Primer"; src: url("/assets/font.woff2"); }}</style>
+</head>
+<body>
+<img src="/assets/logo.png" alt="Logo">
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+_CONTENTS_TEMPLATE = """<section class="dataset-contents">
+<h2>What's in this Dataset?</h2>
+<div class="metadata-pair">
+<h3 class="metadata-pair-key">Rows</h3><div class="metadata-pair-value">{rows}</div>
+</div>
+<div class="metadata-pair">
+<h3 class="metadata-pair-key">Columns</h3><div class="metadata-pair-value">{columns}</div>
+</div>
+<div class="metadata-pair">
+<h3 class="metadata-pair-key">Each row is a</h3><div class="metadata-pair-value">record</div>
+</div>
+</section>
+<div class="download-buttons">
+<a class="btn download" href="/api/views/{endpoint}/rows.csv?accessType=DOWNLOAD">Download</a>
+</div>"""
+
+# Renders the contents in after a delay, like a page which loads them over AJAX.
+_SCRIPT_TEMPLATE = """<div id="app"></div>
+<script>
+setTimeout(function () {{ document.getElementById("app").innerHTML = {contents}; }}, {delay});
+</script>"""
+
+
+def synthesize_socrata_pages(n, root, render="static", delay=0.1, seed=0):
+    """
+    Makes up `n` Socrata "primer" pages (see `pager.page_socrata_for_endpoint_size`), at `root` (e.g. the `root` of the
+    `StubServer` which is to serve them), along with the stylesheets, images and fonts that they load.
+
+    If `render` is "static", the dataset contents are in the page as served. If it is "script", they are rendered into
+    the page by a script, `delay` seconds after it loads, as on a live portal; only browser engines can read these.
+
+    Returns
+    -------
+    A dict mapping each page's URL to the sizing that paging it should come up with, and the fixtures.
+    """
+    if render not in ("static", "script"):
+        raise ValueError("render must be 'static' or 'script'.")
+
+    rng = random.Random(seed)
+    fixtures = Fixtures()
+    pages = dict()
+
+    for path, (content_type, body) in _PAGE_ASSETS.items():
+        fixtures.add("GET", root + path, headers={'Content-Type': content_type},
+                     body=body.encode('utf-8') if isinstance(body, str) else body)
+
+    for i in range(n):
+        endpoint = _endpoint_id(i)
+        columns = rng.randint(2, 40)
+        magnitude = rng.choice(["", "K", "M"])
+        if magnitude == "M":
+            shown = "{0:.1f}M".format(rng.randint(10, 99) / 10)
+            rows = int(float(shown[:-1]) * 1000000)
+        elif magnitude == "K":
+            rows = rng.randint(10, 999) * 1000
+            shown = "{0}K".format(rows // 1000)
+        else:
+            rows = rng.randint(0, 9999)
+            shown = "{0:,}".format(rows)
+
+        contents = _CONTENTS_TEMPLATE.format(rows=shown, columns=columns, endpoint=endpoint)
+        if render == "script":
+            contents = _SCRIPT_TEMPLATE.format(contents=json.dumps(contents), delay=int(delay * 1000))
+
+        url = "{0}/d/{1}".format(root, endpoint)
+        page = _PAGE_TEMPLATE.format(title="Resource {0}".format(i), body=contents)
+        fixtures.add("GET", url, headers={'Content-Type': "text/html; charset=utf-8"}, body=page.encode('utf-8'))
+        pages[url] = {'rows': rows, 'columns': columns}
+
+    return pages, fixtures
@@ -0,0 +1,244 @@
+"""
+This module implements retries for failed fetches, with jittered exponential backoff.
+
+Not every failure is worth retrying. A resource whose endpoint has been deleted, or which turns out to be a corrupt
+archive, will fail the same way every time. But a timeout, a 5xx, or a connection reset is more often than not a
+passing blip, and historically a resource which hit one was simply marked as failed, and had to wait for a second full
+run to be tried again. So failures are first classified (see `classify`), and only transient ones are retried.
+
+There are two ways of retrying. `RetryPolicy.call` retries a single call in place, sleeping between attempts, and is
+meant for one-off requests which everything else depends on, like catalog fetches. A `RetryQueue` instead defers the
+resources that failed to the end of the run, and hands them back in rounds once everything else is done, by which time
+whatever was wrong has had a chance to clear up (and the other resources haven't had to wait on them in the meantime).
+
+Delays follow the "full jitter" scheme: the delay before retry number `n` is chosen uniformly at random between zero
+and `base * 2 ** n` seconds (capped at `cap`), which keeps retries from arriving at a struggling server in lockstep.
+
+Failures which are given up on are kept as `Failure` records, which may be written out alongside the glossary with
+`write_failures`.
+"""
+
+import http.client
+import json
+import random
+import socket
+import time
+import zipfile
+
+import requests
+import urllib3
+
+
+# Failure categories.
+TIMEOUT = "timeout"
+SERVER_ERROR = "server error"
+CONNECTION = "connection"
+BAD_ARCHIVE = "bad archive"
+DELETED = "deleted"
+CLIENT_ERROR = "client error"
+UNKNOWN = "unknown"
+
+TRANSIENT = frozenset([TIMEOUT, SERVER_ERROR, CONNECTION])
+
+
+def classify_status(status_code):
+    """
+    Returns the failure category of an HTTP status code.
+    """
+    if status_code in (404, 410):
+        return DELETED
+    if status_code == 429 or status_code >= 500:
+        return SERVER_ERROR
+    return CLIENT_ERROR
+
+
+def classify(error):
+    """
+    Returns the failure category of an exception.
+    """
+    # Some of these exceptions come from optional dependencies (selenium, aiohttp) or from modules which are expensive
+    # to import (the pager), so match them by name.
+    names = {cls.__name__ for cls in type(error).__mro__}
+
+    if 'DeletedEndpointException' in names:
+        return DELETED
+    if isinstance(error, zipfile.BadZipfile):
+        return BAD_ARCHIVE
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return classify_status(error.response.status_code)
+    if 'ClientResponseError' in names:
+        return classify_status(error.status)
+    if (isinstance(error, (requests.Timeout, socket.timeout, TimeoutError)) or
+            names & {'TimeoutException', 'TaskTimeoutError', 'TimeoutError'}):
+        return TIMEOUT
+    if (isinstance(error, (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, ConnectionError)) or
+            names & {'ClientConnectionError', 'ClientPayloadError'}):
+        return CONNECTION
+    # A webdriver which has died or wedged mid-page. Trying again on a fresh driver usually works (see `pager.pool`).
+    if (isinstance(error, (urllib3.exceptions.HTTPError, http.client.HTTPException)) or
+            'WebDriverException' in names):
+        return CONNECTION
+    return UNKNOWN
+
+
+def is_transient(error):
+    """
+    Returns whether or not an exception is likely to go away if we try again.
+    """
+    return classify(error) in TRANSIENT
+
+
+def backoff(attempt, base=1, cap=60):
+    """
+    Returns the number of seconds to wait before retry number `attempt` (counting from zero), with full jitter.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RetryPolicy:
+    """
+    How, and how many times, to retry.
+
+    Parameters
+    ----------
+    attempts: int, default 3
+        The maximum number of attempts to make, including the first.
+    base: float, default 1
+        The base delay, in seconds.
+    cap: float, default 60
+        The maximum delay, in seconds.
+    retry_on: set of str, default TRANSIENT
+        The failure categories to retry.
+    """
+    def __init__(self, attempts=3, base=1, cap=60, retry_on=TRANSIENT):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.retry_on = retry_on
+
+    def should_retry(self, error, attempts):
+        """
+        Returns whether or not to retry after `attempts` attempts, the last of which failed with `error`.
+        """
+        return attempts < self.attempts and classify(error) in self.retry_on
+
+    def delay(self, attempt):
+        return backoff(attempt, base=self.base, cap=self.cap)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls `func(*args, **kwargs)`, retrying it in place for as long as it fails and the policy allows. Raises the
+        last exception if it never succeeds.
+        """
+        attempts = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                attempts += 1
+                if not self.should_retry(e, attempts):
+                    raise
+                time.sleep(self.delay(attempts - 1))
+
+
+def call(func, *args, **kwargs):
+    """
+    Calls `func(*args, **kwargs)` with the default `RetryPolicy`.
+    """
+    return RetryPolicy().call(func, *args, **kwargs)
+
+
+class Failure:
+    """
+    A record of a resource which could not be processed.
+    """
+    __slots__ = ('landing_page', 'resource', 'category', 'transient', 'error', 'attempts', 'time')
+
+    def __init__(self, resource, error, attempts):
+        self.landing_page = resource['landing_page']
+        self.resource = resource['resource']
+        self.category = classify(error)
+        self.transient = self.category in TRANSIENT
+        self.error = "{0}: {1}".format(type(error).__name__, error)
+        self.attempts = attempts
+        self.time = time.time()
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _key(resource):
+    return resource['landing_page'], resource['resource']
+
+
+class RetryQueue:
+    """
+    A queue of resources to retry at the end of a run.
+
+    Report every failure to `defer`, which either queues the resource up for another try (if the failure is transient
+    and the resource has attempts left) or else records it as a `Failure`. Once every other resource has been processed,
+    iterate over `rounds` to get the deferred resources back, in batches, to try again.
+
+    Parameters
+    ----------
+    policy: RetryPolicy, default None
+        The retry policy to follow. Defaults to `RetryPolicy()`.
+    """
+    def __init__(self, policy=None):
+        self.policy = policy or RetryPolicy()
+        self.deferred = []
+        self.failures = []
+        self.attempts = dict()
+        self._pending = set()
+        self.retried = 0
+
+    def defer(self, resource, error):
+        """
+        Records a failure to process a resource. Returns True if the resource was deferred for another try, in which
+        case the caller should leave it be for now, or False if it was given up on.
+        """
+        key = _key(resource)
+        self.attempts[key] = self.attempts.get(key, 0) + 1
+
+        if self.policy.should_retry(error, self.attempts[key]):
+            self.deferred.append(resource)
+            self._pending.add(key)
+            return True
+
+        self.failures.append(Failure(resource, error, self.attempts[key]))
+        return False
+
+    def __contains__(self, resource):
+        """
+        Whether or not a resource is awaiting a retry.
+        """
+        return _key(resource) in self._pending
+
+    def rounds(self):
+        """
+        Yields lists of deferred resources to try again, until there are none left. Waits (per the policy) before each.
+        """
+        attempt = 0
+        while self.deferred:
+            batch, self.deferred = self.deferred, []
+            self._pending.clear()
+            time.sleep(self.policy.delay(attempt))
+            attempt += 1
+            self.retried += len(batch)
+            print("Retrying {0} resources which failed with transient errors.".format(len(batch)))
+            yield batch
+
+
+def failures_filename(glossary_filename):
+    return glossary_filename + ".failures"
+
+
+def write_failures(failures, glossary_filename):
+    """
+    Appends failure records to the failure log kept alongside a glossary, as JSON lines.
+    """
+    if not failures:
+        return
+    with open(failures_filename(glossary_filename), "a") as fp:
+        for failure in failures:
+            fp.write(json.dumps(failure.to_dict()) + "\n")
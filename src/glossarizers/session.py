@@ -0,0 +1,240 @@
+"""
+This module implements the shared HTTP session which every fetch path in this package makes its requests with.
+
+Module-level `requests.get` and `requests.head` open a brand new connection for every request, and throw it away
+afterwards. Against a portal served over HTTPS that means a TCP handshake and a TLS handshake, several round trips in
+all, before the request itself is even sent; on a crawl consisting of thousands of small API requests against the same
+host, like the CKAN `package_show` crawl, the handshakes take longer than the requests do. A `requests.Session` instead
+keeps a pool of open (keep-alive) connections per host, and reuses them from request to request.
+
+`get_session` returns the session for the current process, creating it on first use (and again after a fork, as
+connections must not be shared across processes, so each worker in an `executor.WorkerPool` gets its own). Its
+connection pools are sized by `configure`, which may also switch the session over to HTTP/2, if the optional `httpx`
+and `h2` packages are installed. HTTP/2 multiplexes every request to a host over a single connection. The HTTP/2
+session is a thin wrapper which accepts and returns the subset of the `requests` API that this package uses, and
+raises `requests` exceptions, so that nothing else needs to know which session is in use.
+
+Every request made through the `throttle` module (which is every request this package makes, save those made by the
+asynchronous crawler, which pools its own connections) goes through the shared session by default.
+"""
+
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from . import metrics
+
+
+# Settings for new sessions, see `configure`.
+_defaults = {'pool_connections': 16, 'pool_maxsize': 32, 'http2': False, 'headers': None, 'factory': None}
+_settings = dict(_defaults)
+
+_session = None
+_pid = None
+_lock = threading.Lock()
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        with metrics.span("connect", host=self.host):
+            super(TimedHTTPConnection, self).connect()
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        with metrics.span("connect", host=self.host):
+            super(TimedHTTPSConnection, self).connect()
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    A transport adapter which times every new connection that it opens (DNS lookup, TCP connect and TLS handshake, all
+    together) as a `connect` span (see `metrics.py`). Comparing the number of these to the number of requests made shows
+    how well connections are being reused.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super(PooledAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+
+def accept_encoding():
+    """
+    Returns the content codings to advertise, including Brotli if a decoder for it is installed.
+    """
+    try:
+        import brotli  # noqa: F401
+        return "gzip, deflate, br"
+    except ImportError:
+        return "gzip, deflate"
+
+
+def make_session(pool_connections=16, pool_maxsize=32, http2=False, headers=None):
+    """
+    Creates a new pooled session.
+
+    Parameters
+    ----------
+    pool_connections: int, default 16
+        The number of hosts to keep connection pools for.
+    pool_maxsize: int, default 32
+        The maximum number of connections to keep open to any one host. This should be at least the number of threads
+        making requests to a single host at once.
+    http2: bool, default False
+        Whether to speak HTTP/2 where the server supports it. Requires the `httpx` and `h2` packages; if they are not
+        installed, a warning is printed and an HTTP/1.1 session is returned instead.
+    headers: dict, default None
+        Headers to send with every request.
+
+    Returns
+    -------
+    A `requests.Session`, or else an `HTTP2Session` if `http2` is True.
+    """
+    if http2:
+        try:
+            import httpx
+            import h2  # noqa: F401
+        except ImportError:
+            print("WARNING: HTTP/2 requires the httpx and h2 packages, falling back to HTTP/1.1.")
+        else:
+            headers = dict(headers or dict(), **{'Accept-Encoding': accept_encoding()})
+            limits = httpx.Limits(max_connections=pool_maxsize)
+            return HTTP2Session(httpx.Client(http2=True, limits=limits, headers=headers))
+
+    session = requests.Session()
+    adapter = PooledAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers['Accept-Encoding'] = accept_encoding()
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def configure(**kwargs):
+    """
+    Changes the settings (see `make_session`) of the shared session. Takes effect on the next request.
+
+    A `factory` may also be passed: a function accepting the same arguments as `make_session`, which is used to create
+    the shared session instead of it. The `replay` module uses this to record, and replay, every request made. Call
+    `configure(factory=None)` to go back to `make_session`.
+    """
+    global _session
+    with _lock:
+        _settings.update(kwargs)
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def reset():
+    """
+    Puts every setting of the shared session back to its default. Takes effect on the next request.
+    """
+    configure(**_defaults)
+
+
+def after_fork():
+    """
+    Replaces the shared session's lock in a newly forked process, in case some other thread of the parent process held
+    it at the time of the fork (in which case it would never be released in the child). See `executor`.
+    """
+    global _lock
+    _lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the shared session for this process.
+    """
+    global _session, _pid
+    with _lock:
+        # Pooled connections must not be shared across a fork, so each process opens its own.
+        if _session is None or _pid != os.getpid():
+            settings = dict(_settings)
+            factory = settings.pop('factory') or make_session
+            _session = factory(**settings)
+            _pid = os.getpid()
+        return _session
+
+
+class HTTP2Response:
+    """
+    Wraps an `httpx.Response` in the parts of the `requests.Response` interface used by this package.
+    """
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = CaseInsensitiveDict(response.headers)
+        self.url = str(response.url)
+        self.reason = response.reason_phrase
+        self.http_version = response.http_version
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = self._response.read()
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode(self._response.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+    def iter_content(self, chunk_size=1):
+        return self._response.iter_bytes(chunk_size)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise requests.HTTPError("{0} Error for url: {1}".format(self.status_code, self.url), response=self)
+
+    def close(self):
+        self._response.close()
+
+
+class HTTP2Session:
+    """
+    Wraps an `httpx.Client` in the parts of the `requests.Session` interface used by this package.
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def request(self, method, url, params=None, headers=None, timeout=None, stream=False, allow_redirects=True,
+                **kwargs):
+        import httpx
+
+        request = self.client.build_request(method, url, params=params, headers=headers, timeout=timeout, **kwargs)
+        try:
+            response = self.client.send(request, stream=stream, follow_redirects=allow_redirects)
+        # Raise the equivalent requests exceptions, so that they are handled (and retried) the same way.
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e))
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(str(e))
+        return HTTP2Response(response)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def close(self):
+        self.client.close()
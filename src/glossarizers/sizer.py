@@ -0,0 +1,160 @@
+"""
+This module implements a streaming sizer for remote files.
+
+The original approach to sizing a file was to download it in full using `datafy.get`, which holds the entire payload
+(and, for archives, every one of its extracted members) in memory, and then to take `sys.getsizeof` of that payload,
+which also counts Python object overhead. A single multi-gigabyte blob was enough to exhaust the memory on the
+machine doing the glossarizing.
+
+Here we instead read the response in fixed-size chunks, counting bytes as they go by and then throwing them away. The
+MIME type is sniffed from the first few kilobytes of the file. ZIP archives are the one exception to the
+throw-it-away rule: the member listing of a ZIP file lives in its central directory, at the *end* of the file, so
+archives are spooled to a temporary file on disk (not to memory) and the central directory is then read from there.
+Members are never extracted.
+
+Either way peak memory use is on the order of the chunk size, regardless of the size of the file. And when the
+server supports Range requests, archives are not downloaded at all: see `remote_zip`.
+"""
+
+import mimetypes
+import os
+import re
+import tempfile
+import zipfile
+from urllib.parse import urlparse, unquote
+
+from . import throttle, metrics
+
+
+CHUNK_SIZE = 64 * 1024
+SNIFF_SIZE = 8 * 1024
+ZIP_SIGNATURES = (b"PK\x03\x04", b"PK\x05\x06")
+
+
+def sniff_mimetype(head):
+    """
+    Given the first few kilobytes of a file, returns its MIME type.
+    """
+    import magic
+    with metrics.span("sniff_mimetype"):
+        return magic.from_buffer(head, mime=True)
+
+
+def get_filename(response):
+    """
+    Returns the name of the file being served by a response, taken from its Content-Disposition header if it has one
+    and from its URL otherwise.
+    """
+    disposition = response.headers.get('content-disposition', '')
+    match = re.search(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', disposition, flags=re.IGNORECASE)
+    if match:
+        return unquote(match.group(1))
+    return unquote(os.path.basename(urlparse(response.url).path))
+
+
+def get_extension(filename, mimetype):
+    """
+    Returns the extension of a file, e.g. "csv", based on its name and (sniffed) MIME type.
+    """
+    # HTML files are usually landing pages being served at extension-less or misleadingly-named addresses (e.g.
+    # "mainView.do"). Downstream code relies on these being called what they are.
+    if mimetype == 'text/html':
+        return 'html'
+
+    _, ext = os.path.splitext(filename)
+    if ext:
+        return ext[1:].lower()
+
+    guess = mimetypes.guess_extension(mimetype) if mimetype else None
+    return guess[1:] if guess else ""
+
+
+def size_zip_members(fp):
+    """
+    Given a file object containing a ZIP archive, returns sizing information for each file in the archive. Only the
+    archive's central directory is read.
+    """
+    sizings = []
+    with zipfile.ZipFile(fp) as archive:
+        for member in archive.infolist():
+            # Skip directory entries.
+            if member.filename.endswith("/"):
+                continue
+
+            mimetype = mimetypes.guess_type(member.filename)[0] or 'application/octet-stream'
+            sizings.append({
+                'filesize': member.file_size / 1024,
+                'dataset': member.filename,
+                'mimetype': mimetype,
+                'extension': get_extension(member.filename, mimetype)
+            })
+    return sizings
+
+
+def size_up(uri, chunk_size=CHUNK_SIZE, sniff_size=SNIFF_SIZE, timeout=60, probe_archives=True):
+    """
+    Sizes up the file at a URI without ever holding more than one chunk of it in memory.
+
+    Parameters
+    ----------
+    uri: str
+        The resource URI.
+    chunk_size: int, default CHUNK_SIZE
+        The number of bytes to read off of the wire at a time.
+    sniff_size: int, default SNIFF_SIZE
+        The number of bytes at the head of the file to use for determining its MIME type.
+    timeout: int, default 60
+        The connect and read timeout passed to `requests`. Note that this is not a limit on the total download time.
+    probe_archives: bool, default True
+        Whether to first check, with a HEAD request, whether the URI is a ZIP archive on a server supporting Range
+        requests. If it is, only the archive's central directory is fetched (see `remote_zip`), not the archive.
+
+    Returns
+    -------
+    A list of dicts, one per dataset, with `filesize` (in kilobytes), `dataset`, `mimetype`, and `extension` keys. A
+    plain file is a single dataset, `"."`. A ZIP archive is one dataset per member file.
+    """
+    if probe_archives:
+        from .remote_zip import inspect
+        sizings = inspect(uri, timeout=timeout)
+        if sizings is not None:
+            return sizings
+
+    with metrics.span("download"):
+        r = throttle.get(uri, stream=True, timeout=timeout)
+        try:
+            r.raise_for_status()
+
+            head = b""
+            n_bytes = 0
+            spool = None
+
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                # Decide whether or not this is an archive once we have enough bytes to tell. Once we decide that it is,
+                # everything read so far (which is all in head) goes to the spool, and so does everything after it.
+                if spool is None and len(head) < 4 <= len(head) + len(chunk):
+                    if (head + chunk[:4])[:4] in ZIP_SIGNATURES:
+                        spool = tempfile.TemporaryFile()
+                        spool.write(head)
+
+                if spool is not None:
+                    spool.write(chunk)
+                if len(head) < sniff_size:
+                    head += chunk[:sniff_size - len(head)]
+                n_bytes += len(chunk)
+
+        finally:
+            r.close()
+
+    if spool is not None:
+        with spool, metrics.span("size_zip_members"):
+            spool.seek(0)
+            return size_zip_members(spool)
+
+    mimetype = sniff_mimetype(head)
+    return [{
+        'filesize': n_bytes / 1024,
+        'dataset': '.',
+        'mimetype': mimetype,
+        'extension': get_extension(get_filename(r), mimetype)
+    }]
@@ -2,25 +2,48 @@
 This module implements methodologies for glossarizing Socrata endpoints.
 """
 
-import pysocrata
 import json
-import numpy as np
-import pandas as pd
+import os
+import time
+import itertools
+import operator
 from tqdm import tqdm
-from .generic import (preexisting_cache, load_glossary_todo,
-                      write_resource_file, write_glossary_file)
-from selenium.common.exceptions import TimeoutException
+from .generic import (preexisting_cache, load_glossary_todo, load_incremental_todo, stream_glossary_todo,
+                      write_resource_file, write_glossary_file, update_resource_file, write_previous_resource_file,
+                      GlossaryJournal)
+from .records import Resource, Flag, glossary_entry
+from . import throttle, retry, metrics
 
 
-def resourcify(metadata, domain, endpoint_type):
+def get_resource_link(domain, endpoint, landing_page, views=True):
+    """
+    Returns the download link for a blob or link resource. The link is read off of the resource's view metadata (see
+    `soda.download_link`) if possible, and off of its landing page in the pager otherwise. Pass `views=False` to go
+    straight to the pager.
+    """
+    if views:
+        from .soda import get_download_links
+        link = get_download_links(domain, [endpoint], concurrency=1)[0]
+        if link is not None:
+            metrics.increment("download_links", source="views")
+            return link
+
+    # Conditional pager import (this imports selenium, don't necessarily want to if we don't have to).
+    from .pager import page_socrata_for_resource_link
+    metrics.increment("download_links", source="pager")
+    return page_socrata_for_resource_link(domain, landing_page)
+
+
+@metrics.timed("resourcify")
+def resourcify(metadata, domain, endpoint_type, link=None):
     """
     Given Socrata API metadata about a certain endpoint (as well as the domain of the endpoint
     e.g. "data.cityofnewyork.us", and the type, e.g. "table") return a resource-ified entry for the
     endpoint for inclusion in the resource listing.
+
+    The download links of blobs and links are looked up with `get_resource_link`, unless already known (pass `link`).
     """
-    # Conditional pager import (this inits PhantomJS, don't necessarily want to if we don't have to).
-    if endpoint_type == "blob" or endpoint_type == "link":
-        from .pager import page_socrata_for_resource_link
+    import pandas as pd
 
     endpoint = metadata['resource']['id']
 
@@ -33,8 +56,7 @@ def resourcify(metadata, domain, endpoint_type):
     elif endpoint_type == "geospatial dataset":
         slug = "https://" + domain + "/api/geospatial/" + endpoint + "?method=export&format=GeoJSON"
     else:  # endpoint_type == "blob" or endpoint_type == "link":
-        # noinspection PyUnboundLocalVariable
-        slug = page_socrata_for_resource_link(domain, landing_page)
+        slug = link or get_resource_link(domain, endpoint, landing_page)
 
     name = metadata['resource']['name']
     description = metadata['resource']['description']
@@ -49,7 +71,7 @@ def resourcify(metadata, domain, endpoint_type):
     topics_provided = [metadata['classification']['domain_category']]
     keywords_provided = metadata['classification']['domain_tags']
 
-    return {
+    return Resource({
         'landing_page': landing_page,
         'resource': slug,
         'protocol': 'https',
@@ -63,59 +85,135 @@ def resourcify(metadata, domain, endpoint_type):
         'topics_provided': topics_provided,
         'keywords_provided': keywords_provided,
         'flags': []
-    }
+    })
+
+
+# Socrata's names for its resource types, mapped onto our vocabulary of endpoint types.
+ENDPOINT_TYPES = {'dataset': 'table', 'href': 'link', 'map': 'geospatial dataset', 'file': 'blob'}
 
+# Portal catalogs fetched so far, keyed by domain and credentials file. See `get_portal_catalog`.
+_catalogs = dict()
 
-def get_portal_metadata(domain, credentials, endpoint_type):
+
+def partition_portal_metadata(resources):
     """
-    Given a domain, Socrata API credentials for that domain, and a type of endpoint of interest, returns the metadata
-    provided by the portal (via the pysocrata package).
+    Given the metadata for every resource on a portal (as returned by pysocrata), partitions it by endpoint type, in
+    a single pass. Returns a dict mapping each of our endpoint types to a list of the metadata for it.
     """
+    partitions = {endpoint_type: [] for endpoint_type in ENDPOINT_TYPES.values()}
+
+    for metadata in resources:
+        resource_type = metadata['resource']['type']
+
+        # We exclude stories manually---this is a type of resource the Socrata API considers to be a dataset that we
+        # are not interested in.
+        if resource_type == 'story':
+            continue
+        elif resource_type not in ENDPOINT_TYPES:
+            print("WARNING: skipping the '{0}' resource, which is of unknown type '{1}'.".format(
+                metadata['resource']['id'], resource_type))
+            continue
+
+        partitions[ENDPOINT_TYPES[resource_type]].append(metadata)
+
+    return partitions
+
+
+def get_portal_catalog(domain, credentials, catalog_filename=None, max_age=60 * 60 * 24):
+    """
+    Given a domain and Socrata API credentials for that domain, returns the metadata provided by the portal (via the
+    pysocrata package) for every resource on it, partitioned by endpoint type (see `partition_portal_metadata`).
+
+    Fetching the catalog is slow, and the same catalog serves all four endpoint types, so catalogs are cached: in
+    memory for the life of the process and, if `catalog_filename` is given, on disk there as well. A cached catalog
+    younger than `max_age` seconds (pass None to never expire it, or 0 to force a refetch) is used instead of fetching
+    the catalog again.
+    """
+    key = (domain, credentials)
+    if key in _catalogs:
+        fetched, partitions = _catalogs[key]
+        if max_age is None or time.time() - fetched < max_age:
+            return partitions
+
+    if catalog_filename and os.path.isfile(catalog_filename):
+        age = time.time() - os.path.getmtime(catalog_filename)
+        if max_age is None or age < max_age:
+            with open(catalog_filename, "r") as fp:
+                catalog = json.load(fp)
+            if catalog['domain'] == domain:
+                _catalogs[key] = (os.path.getmtime(catalog_filename), catalog['endpoints'])
+                return catalog['endpoints']
+
+    import pysocrata
+
     # Load credentials.
     with open(credentials, "r") as fp:
         auth = json.load(fp)
     auth['domain'] = domain
 
-    # If the metadata doesn't already exist, use pysocrata to fetch portal metadata. Otherwise, use what's provided.
-    resources = pysocrata.get_datasets(**auth)
+    with throttle.limit(domain), metrics.span("catalog_fetch", domain=domain):
+        partitions = partition_portal_metadata(retry.call(pysocrata.get_datasets, **auth))
+    _catalogs[key] = (time.time(), partitions)
 
-    # We exclude stories manually---this is a type of resource the Socrata API considers to be a dataset that we
-    # are not interested in.
-    resources = [d for d in resources if d['resource']['type'] != 'story']
+    if catalog_filename:
+        temporary_filename = catalog_filename + ".tmp"
+        with open(temporary_filename, "w") as fp:
+            json.dump({'domain': domain, 'endpoints': partitions}, fp)
+        os.replace(temporary_filename, catalog_filename)
 
-    # Munge the Socrata API output a bit beforehand: in this case reworking the name references to match our
-    # volcabulary.
-    types = [d['resource']['type'] for d in resources]
-    volcab_map = {'dataset': 'table', 'href': 'link', 'map': 'geospatial dataset', 'file': 'blob'}
-    types = list(map(lambda d: volcab_map[d], types))
+    return partitions
 
-    # Get the resources of interest.
-    indices = np.nonzero([t == endpoint_type for t in types])
-    roi = np.array(resources)[indices]
 
-    return roi
+def get_portal_metadata(domain, credentials, endpoint_type, catalog_filename=None, max_age=60 * 60 * 24):
+    """
+    Given a domain, Socrata API credentials for that domain, and a type of endpoint of interest, returns the metadata
+    provided by the portal (via the pysocrata package). See `get_portal_catalog` for the caching parameters.
+    """
+    return get_portal_catalog(domain, credentials, catalog_filename=catalog_filename, max_age=max_age)[endpoint_type]
 
 
-def get_resource_representation(domain, credentials, endpoint_type):
+def get_resource_representation(domain, credentials, endpoint_type, catalog_filename=None, max_age=60 * 60 * 24,
+                                concurrency=8):
     """
     Given a domain, Socrata API credentials for that domain, and a type of endpoint of interest, returns a full
     resource representation (using resourcify) for each resource therein.
+
+    The download links of blobs and links are read off of their view metadata, `concurrency` resources at a time (see
+    `soda.get_download_links`). Only those which can't be are paged for, one at a time.
     """
-    roi = get_portal_metadata(domain, credentials, endpoint_type)
+    roi = get_portal_metadata(domain, credentials, endpoint_type, catalog_filename=catalog_filename, max_age=max_age)
+
+    if endpoint_type == "blob" or endpoint_type == "link":
+        from .soda import get_download_links
+        with metrics.span("download_links", endpoint_type=endpoint_type):
+            links = get_download_links(domain, [metadata['resource']['id'] for metadata in roi],
+                                       concurrency=concurrency)
+        metrics.increment("download_links", sum(link is not None for link in links), source="views")
+    else:
+        links = [None] * len(roi)
 
     # Convert the pysocrata output to our data representation using resourcify.
     roi_repr = []
-    for metadata in tqdm(roi):
-        roi_repr.append(resourcify(metadata, domain, endpoint_type))
+    for metadata, link in tqdm(zip(roi, links), total=len(roi)):
+        if link is None and (endpoint_type == "blob" or endpoint_type == "link"):
+            endpoint = metadata['resource']['id']
+            link = get_resource_link(domain, endpoint, "https://{0}/d/{1}".format(domain, endpoint), views=False)
+        roi_repr.append(resourcify(metadata, domain, endpoint_type, link=link))
 
     return roi_repr
 
 
 def write_resource_representation(domain="data.cityofnewyork.us", out="nyc-tables.json", use_cache=True,
-                                  credentials="../../../auth/nyc-open-data.json", endpoint_type='table'):
+                                  credentials="../../../auth/nyc-open-data.json", endpoint_type='table',
+                                  catalog_filename=None, max_age=60 * 60 * 24, concurrency=8):
     """
     Fetches a resource representation for a single resource type from a Socrata portal. Simple I/O wrapper around
     get_resource_representation, using some utilities from generic.py.
+
+    Resource lists for the different endpoint types are built from the same portal catalog, which is only fetched
+    once (see `get_portal_catalog`). Pass the same `catalog_filename` to each call to share it across processes too.
+    `concurrency` is the number of view metadata requests to keep in flight when resolving the download links of blobs
+    and links.
     """
     # If the file already exists and we specify `use_cache=True`, simply return.
     if preexisting_cache(out, use_cache):
@@ -123,38 +221,79 @@ def write_resource_representation(domain="data.cityofnewyork.us", out="nyc-table
 
     # Generate to file and exit.
     roi_repr = []
-    roi_repr += get_resource_representation(domain, credentials, endpoint_type)
+    roi_repr += get_resource_representation(domain, credentials, endpoint_type, catalog_filename=catalog_filename,
+                                            max_age=max_age, concurrency=concurrency)
     write_resource_file(roi_repr, out)
 
 
-def glossarize_table(resource, domain, driver=None, timeout=60):
+def _fail(resource, error, queue=None):
     """
-    Given an individual resource (as would be loaded from the resource list) and a domain, and optionally a
-    PhantomJS driver (recommended), creates a glossaries entry for that resource.
+    Handles a failure to size a table: either defers it to the retry queue, if there is one and the failure is
+    transient, or else warns about it and flags it (as "removed" if the endpoint was deleted, or "error" otherwise).
     """
-    from .pager import page_socrata_for_endpoint_size, DeletedEndpointException
-
-    # If a PhantomJS driver has not been initialized (via import), initialize it now.
-    # In this case we will also quit it out at the end of the process.
-    # This is inefficient, but useful for testing.
-    driver_passed = bool(driver)
-    if not driver_passed:
-        from .pager import driver
+    if queue is not None and queue.defer(resource, error):
+        return []
 
-    try:
-        rowcol = page_socrata_for_endpoint_size(domain, resource['landing_page'], timeout=timeout)
-    except DeletedEndpointException:
+    if retry.classify(error) == retry.DELETED:
         print("WARNING: the '{0}' endpoint was deleted.".format(resource['landing_page']))
-        resource['flags'].append('removed')
-        return []
-    except TimeoutException:
+        resource['flags'].append(Flag.REMOVED)
+    else:
         print("WARNING: the '{0}' endpoint could not be processed.".format(resource['landing_page']))
-        resource['flags'].append('removed')
-        return []
+        resource['flags'].append(Flag.ERROR)
+    return []
+
+
+@metrics.timed("glossarize_table")
+def glossarize_table(resource, domain, driver=None, timeout=60, backend="pager", queue=None):
+    """
+    Given an individual resource (as would be loaded from the resource list) and a domain, and optionally a
+    webdriver (recommended, see `pager.engines`), creates a glossaries entry for that resource.
+
+    Sizing information may come from one of two backends. The default, "pager", reads the row and column counts off
+    of the portal page using a webdriver. "soda" instead asks the SODA API for an exact row count and takes the column
+    count from the resource list, and needs no browser (and no driver) at all.
+
+    If a `retry.RetryQueue` is passed, resources which fail with a transient error are deferred to it and left
+    unflagged, instead of being flagged as errors.
+    """
+    if backend == "soda":
+        from .soda import get_endpoint_size
+        from requests.exceptions import RequestException
+
+        try:
+            rowcol = get_endpoint_size(resource, timeout=timeout)
+        # A ValueError means that the count came back in a format we don't understand (or wasn't JSON at all).
+        except (RequestException, ValueError) as e:
+            return _fail(resource, e, queue=queue)
+
+        driver_passed = True
+
+    else:
+        import http.client
+        from urllib3.exceptions import HTTPError
+        from .pager import page_socrata_for_endpoint_size, DeletedEndpointException
+        from selenium.common.exceptions import WebDriverException
+
+        # If a driver has not been initialized (via import), initialize it now.
+        # In this case we will also quit it out at the end of the process.
+        # This is inefficient, but useful for testing.
+        driver_passed = bool(driver)
+        if not driver_passed:
+            from .pager import default_driver
+            driver = default_driver()
+
+        try:
+            rowcol = page_socrata_for_endpoint_size(domain, resource['landing_page'], timeout=timeout,
+                                                    driver=driver)
+        # Besides deleted endpoints and timeouts (a `WebDriverException`), this catches the errors raised by a driver
+        # which dies or wedges mid-page. A `pool.DriverPool` replaces such a driver, so the resource is deferred for
+        # another try on its replacement.
+        except (DeletedEndpointException, WebDriverException, HTTPError, http.client.HTTPException,
+                ConnectionError) as e:
+            return _fail(resource, e, queue=queue)
 
     # Remove the "processed" flag from the resource going into the glossaries, if one exists.
-    glossarized_resource = resource.copy()
-    glossarized_resource['flags'] = [flag for flag in glossarized_resource['flags'] if flag != 'processed']
+    glossarized_resource = glossary_entry(resource)
 
     # Attach sizing information.
     glossarized_resource['rows'] = rowcol['rows']
@@ -170,74 +309,75 @@ def glossarize_table(resource, domain, driver=None, timeout=60):
     glossarized_resource['dataset'] = '.'
 
     if not driver_passed:
-        driver.quit()
+        from .pager import quit_default_driver
+        quit_default_driver()
 
     return [glossarized_resource]
 
 
-def get_sizings(uri, q, timeout=60):
+@metrics.timed("get_sizings")
+def get_sizings(uri, q=None, timeout=60):
     """
-    Given a URI and a multiprocessing.Queue, returns a structured dict explaining file size and type if download is
-    successful, and None if the download process times out (takes too long).
+    Given a URI, returns a structured dict explaining file size and type if download is successful, and raises
+    `executor.TaskTimeoutError` if the download process times out (takes too long).
 
-    This method utilizes limited_process and datafy facilities, these are two small modules written for the purposes of
-    this project maintained as separate modules.
+    This method utilizes the streaming sizer in sizer.py, which measures the file as it goes by instead of holding
+    it in memory, so arbitrarily large files may be sized. The sizer is run in a single-process
+    `executor.WorkerPool`, which kills it outright once it overruns the timeout. `q` is unused, and is kept for
+    backwards compatibility.
     """
-    import datafy
-    import sys
-    from .generic import timeout_process
-
-    @timeout_process(timeout)
-    def _size_up(uri):
-        resource = datafy.get(uri)
-        thing_log = []
-        for thing in resource:
-            thing_log.append({
-                'filesize': sys.getsizeof(thing['data'].content) / 1024,
-                'dataset': thing['filepath'],
-                'mimetype': thing['mimetype'],
-                'extension': thing['extension']
-            })
-        return thing_log
-
-    return _size_up(uri)
-
-
-def glossarize_nontable(resource, timeout, q=None):
+    from .sizer import size_up
+    from .executor import WorkerPool
+
+    with WorkerPool(processes=1, timeout=timeout) as workers:
+        sizings = workers.run(size_up, uri, timeout=timeout)
+
+    if isinstance(sizings, BaseException):
+        raise sizings
+    return sizings
+
+
+@metrics.timed("glossarize_nontable")
+def glossarize_nontable(resource, timeout, q=None, sizings=None, queue=None):
     """
     Same as `glossarize_table`, but for the non-table resource types.
-    """
-    import limited_process
-    # TODO: Remove limited_process non-dependency.
 
+    If `sizings` is passed (e.g. because the resource was already sized in an `executor.WorkerPool`), it is used
+    instead of sizing the resource here. It may also be the exception that sizing the resource raised, which is then
+    handled as though it had been raised here.
+
+    If a `retry.RetryQueue` is passed, resources which fail with a transient error are deferred to it, and permanent
+    failures are recorded on it.
+    """
     import zipfile
     from requests.exceptions import ChunkedEncodingError
-
-    if not bool(q):
-        q = limited_process.q()
+    from .executor import TaskTimeoutError
 
     try:
-        sizings = get_sizings(
-            resource['resource'],
-            q, timeout=timeout
-        )
-    except zipfile.BadZipfile:
-        # cf. https://github.com/ResidentMario/datafy/issues/2
-        print("WARNING: the '{0}' endpoint is either misformatted or contains multiple levels of "
-              "archiving which failed to process.".format(resource['landing_page']))
-        resource['flags'].append('error')
-        return []
-    # This error is raised when the process takes too long.
-    except ChunkedEncodingError:
-        print("WARNING: the '{0}' endpoint took longer than the {1} second timeout to process.".format(
-            resource['landing_page'], timeout))
-        return []
-    except:
-        # External links may point anywhere, including HTML pages which don't exist or which raise errors when you
-        # try to visit them. During testing this occurred with e.g. https://data.cityofnewyork.us/d/sah3-jw2y. It's
-        # impossible to exclude everything; best we can do is raise a warning.
-        print("WARNING: an error was raised while processing the '{0}' endpoint.".format(resource['landing_page']))
-        resource['flags'].append('error')
+        if sizings is None:
+            sizings = get_sizings(resource['resource'], timeout=timeout)
+        if isinstance(sizings, BaseException):
+            raise sizings
+    except Exception as e:
+        if queue is not None and queue.defer(resource, e):
+            return []
+
+        if isinstance(e, zipfile.BadZipfile):
+            # cf. https://github.com/ResidentMario/datafy/issues/2
+            print("WARNING: the '{0}' endpoint is either misformatted or contains multiple levels of "
+                  "archiving which failed to process.".format(resource['landing_page']))
+            resource['flags'].append(Flag.ERROR)
+        # These errors are raised when the process takes too long.
+        elif isinstance(e, (ChunkedEncodingError, TaskTimeoutError)):
+            print("WARNING: the '{0}' endpoint took longer than the {1} second timeout to process.".format(
+                resource['landing_page'], timeout))
+        else:
+            # External links may point anywhere, including HTML pages which don't exist or which raise errors when
+            # you try to visit them. During testing this occurred with e.g. https://data.cityofnewyork.us/d/sah3-jw2y.
+            # It's impossible to exclude everything; best we can do is raise a warning.
+            print("WARNING: an error was raised while processing the '{0}' endpoint.".format(
+                resource['landing_page']))
+            resource['flags'].append(Flag.ERROR)
         return []
 
     # If successful, append the result to the glossaries...
@@ -262,9 +402,7 @@ def glossarize_nontable(resource, timeout, q=None):
             # maintained by hand for excluding specific pages. That, however, is a TODO.
             if sizing['extension'] != "htm" and sizing['extension'] != "html":
                 # Remove the "processed" flag from the resource going into the glossaries, if one exists.
-                glossarized_resource_element = resource.copy()
-                glossarized_resource_element['flags'] = [flag for flag in glossarized_resource_element['flags'] if
-                                                         flag != 'processed']
+                glossarized_resource_element = glossary_entry(resource)
 
                 # Attach sizing information.
                 glossarized_resource_element['filesize'] = sizing['filesize']
@@ -280,29 +418,57 @@ def glossarize_nontable(resource, timeout, q=None):
                 glossarized_resource.append(glossarized_resource_element)
 
                 # # Update the resource list to make note of the fact that this job has been processed.
-                # resource['flags'].append("processed")
+                # resource['flags'].append(Flag.PROCESSED)
 
         return glossarized_resource
 
     # If unsuccessful, append a signal result to the glossaries.
     else:
-        glossarized_resource = resource.copy()
-
-        glossarized_resource['flags'] = [flag for flag in glossarized_resource['flags'] if
-                                         flag != 'processed']
+        # Remove the "processed" flag from the resource going into the glossaries, if one exists.
+        glossarized_resource = glossary_entry(resource)
 
         glossarized_resource["filesize"] = ">{0}s".format(str(timeout))
         glossarized_resource['dataset'] = "."
 
-        return glossarized_resource
+        return [glossarized_resource]
 
     # Either way, update the resource list to make note of the fact that this job has been processed.
     # if 'processed' not in resource['flags']:
     #     resource["flags"].append("processed")
 
 
-def get_glossary(resource_list, glossary, domain='opendata.cityofnewyork.us', endpoint_type="table", timeout=60):
+def get_glossary(resource_list, glossary, domain='opendata.cityofnewyork.us', endpoint_type="table", timeout=60,
+                 pool_size=1, backend="pager", journal=None, processes=1, retries=None, failures=None, workers=None):
+    """
+    Glossarizes the resources in a resource list (which may be a lazy iterator), appending their glossary entries to
+    the glossary and flagging them "processed" as it goes. See `write_glossary` for the parameters. Non-table resources
+    are sized in a pool of `processes` worker processes, or in `workers`, if a running `executor.WorkerPool` is passed
+    (which is left running at the end).
+
+    Resources which fail with a transient error (see `retry.classify`) are deferred to a `retry.RetryQueue` and tried
+    again at the end of the run, per the `retries` policy (a `retry.RetryPolicy`). If a `failures` list is passed,
+    `retry.Failure` records for the resources which could not be glossarized are appended to it.
+    """
+    queue = retry.RetryQueue(retries)
+
+    def record(resource, glossarized_resource):
+        # Resources deferred for a retry are left as-is until they are retried.
+        if resource in queue:
+            metrics.increment("resources", endpoint_type=endpoint_type, outcome="deferred")
+            return
+        glossary.extend(glossarized_resource)
+        metrics.increment("resources", endpoint_type=endpoint_type,
+                          outcome="glossarized" if glossarized_resource else "failed")
+
+        # Update the resource list to make note of the fact that this job has been processed.
+        if Flag.PROCESSED not in resource['flags']:
+            resource['flags'].append(Flag.PROCESSED)
+        if journal:
+            journal.record(resource, glossarized_resource)
+
     # Whether we succeed or fail, we'll want to save the data we have at the end with a try-finally block.
+    pool = None
+    own_workers = workers is None
     try:
         # What we do with the data depends on the endpoint type.
 
@@ -310,43 +476,80 @@ def get_glossary(resource_list, glossary, domain='opendata.cityofnewyork.us', en
         # We take advantage of information provided on the Socrata portal pages to avoid having to work with the
         # datasets directly. The facilities provided by the pager module are used to handle reading in data
         # from the portal web interface, which displays, among other things, row and column counts.
-        if endpoint_type == "table":
-            # Only import pager if we have to.
-
-            from .pager import driver
+        if endpoint_type == "table" and backend == "soda":
+            # No browser needed: row counts come straight from the SODA API.
+            def process(resources):
+                for resource in tqdm(resources):
+                    record(resource, glossarize_table(resource, domain, timeout=timeout, backend="soda", queue=queue))
 
-            for resource in tqdm(resource_list):
-                glossarized_resource = glossarize_table(resource, domain, driver=driver)
-                glossary += glossarized_resource
+        elif endpoint_type == "table":
+            # Only import pager if we have to.
 
-                # Update the resource list to make note of the fact that this job has been processed.
-                resource['flags'].append("processed")
+            if pool_size > 1:
+                # Page several tables at once, one per driver in the pool. Results come back in resource list order.
+                from .pager.pool import DriverPool
+                pool = DriverPool(pool_size)
+
+                def process(resources):
+                    # The resource list may be a lazy iterator, so tee it rather than going over it twice.
+                    total = operator.length_hint(resources) or None
+                    resources, queued = itertools.tee(resources)
+                    glossarized_resources = pool.map(
+                        lambda resource, driver: glossarize_table(resource, domain, driver=driver, queue=queue), queued
+                    )
+                    for resource, glossarized_resource in tqdm(zip(resources, glossarized_resources), total=total):
+                        record(resource, glossarized_resource)
+
+            else:
+                from .pager import default_driver
+                driver = default_driver()
+
+                def process(resources):
+                    for resource in tqdm(resources):
+                        record(resource, glossarize_table(resource, domain, driver=driver, queue=queue))
 
         # geospatial datasets, blobs, links:
         # ...
         else:
-            import limited_process
-            q = limited_process.q()
+            # Size resources in a pool of worker processes, which enforces the timeout by killing workers outright.
+            from .executor import WorkerPool
+            from .sizer import size_up
+
+            if own_workers:
+                workers = WorkerPool(processes=processes, timeout=timeout)
+
+            def process(resources):
+                total = operator.length_hint(resources) or None
+                resources, queued = itertools.tee(resources)
+                outcomes = workers.imap(size_up, (resource['resource'] for resource in queued), timeout=timeout)
 
-            for resource in tqdm(list(resource_list)):
-                glossarized_resource = glossarize_nontable(resource, timeout, q=q)
-                glossary += glossarized_resource
+                for resource, sizings in tqdm(zip(resources, outcomes), total=total):
+                    record(resource, glossarize_nontable(resource, timeout, sizings=sizings, queue=queue))
 
-                # Update the resource list to make note of the fact that this job has been processed.
-                if 'processed' not in resource['flags']:
-                    resource["flags"].append("processed")
+        process(resource_list)
+
+        # Now that everything else is done, take another pass at whatever failed with a transient error.
+        for batch in queue.rounds():
+            process(batch)
 
     # Whether we succeeded or got caught on a fatal error, in either case clean up.
     finally:
-        # If a driver was open, close the driver instance.
-        if endpoint_type == "table":
-            # noinspection PyUnboundLocalVariable
-            driver.quit()  # pager.driver
+        # If a driver or worker pool was open, close it.
+        if workers and own_workers:
+            workers.close()
+        if pool:
+            pool.quit()
+        elif endpoint_type == "table" and backend != "soda":
+            from .pager import quit_default_driver
+            quit_default_driver()
+        if failures is not None:
+            failures.extend(queue.failures)
     return resource_list, glossary
 
 
 def write_glossary(domain='opendata.cityofnewyork.us', use_cache=True,
-                   endpoint_type="table", resource_filename=None, glossary_filename=None, timeout=60):
+                   endpoint_type="table", resource_filename=None, glossary_filename=None, timeout=60, pool_size=1,
+                   backend="pager", journal=False, processes=1, incremental=False, stream=False, retries=None):
     """
     Writes a dataset representation.
 
@@ -366,17 +569,127 @@ def write_glossary(domain='opendata.cityofnewyork.us', use_cache=True,
         The name of the resource file to read the jobs from.
     glossary_filename: str
         The name of the glossaries file to write the output to.
+    pool_size: int, default 1
+        The number of browser instances to page tables with in parallel. Only used for the "table" endpoint type.
+        Capped at `pager.pool.MAX_POOL_SIZE`.
+    backend: str, default "pager"
+        Where to get table sizes from. "pager" reads them off of the portal page in a browser; "soda" gets exact row
+        counts from the SODA API instead, with no browser involved. Only used for the "table" endpoint type.
+    journal: bool, default False
+        Whether to journal progress to disk as it is made (see `generic.GlossaryJournal`), so that a run which is
+        killed outright can be resumed. A journal left behind by a previous journaled run is replayed on startup.
+    processes: int, default 1
+        The number of worker processes to size resources with in parallel. Not used for the "table" endpoint type.
+    incremental: bool, default False
+        Whether to refresh the glossary incrementally against a freshly pulled resource list, only glossarizing
+        resources which are new or have changed (per their `last_updated` time) since the glossary was last written,
+        and dropping resources which have since been deleted. Overrides `use_cache`.
+    stream: bool, default False
+        Whether to read the resource list lazily, queueing up resources one at a time as they are needed rather than
+        loading the whole list up front (see `generic.stream_glossary_todo`). At the end of the run, the resources
+        worked on are merged back into the resource file, and the rest of the file is left as-is. Ignored if
+        `incremental` is True.
+    retries: retry.RetryPolicy, default None
+        How to retry resources which fail with a transient error. Defaults to `retry.RetryPolicy()`. Resources which
+        cannot be glossarized are logged alongside the glossary (see `retry.write_failures`).
     """
-
     # Begin by loading in the data that we have.
-    resource_list, glossary = load_glossary_todo(resource_filename, glossary_filename, use_cache)
+    if incremental:
+        resource_list, glossary, full_resource_list = load_incremental_todo(resource_filename, glossary_filename,
+                                                                            journal=journal)
+    elif stream:
+        resource_list, glossary, updated = stream_glossary_todo(resource_filename, glossary_filename,
+                                                                use_cache=use_cache, journal=journal)
+    else:
+        resource_list, glossary = load_glossary_todo(resource_filename, glossary_filename, use_cache,
+                                                     journal=journal)
+    glossary_journal = GlossaryJournal(glossary_filename) if journal else None
+    failures = []
 
     # Generate the glossaries.
     try:
         resource_list, glossary = get_glossary(resource_list, glossary, domain=domain, endpoint_type=endpoint_type,
-                                               timeout=timeout)
+                                               timeout=timeout, pool_size=pool_size, backend=backend,
+                                               journal=glossary_journal, processes=processes, retries=retries,
+                                               failures=failures)
 
     # Save output.
     finally:
-        write_resource_file(resource_list, resource_filename)
+        retry.write_failures(failures, glossary_filename)
+        if incremental:
+            # noinspection PyUnboundLocalVariable
+            resource_list = full_resource_list
+        elif stream:
+            # noinspection PyUnboundLocalVariable
+            resource_list = updated
+
+        if glossary_journal:
+            glossary_journal.compact(resource_list, glossary, resource_filename, glossary_filename,
+                                     update=stream and not incremental)
+        elif stream and not incremental:
+            update_resource_file(resource_filename, resource_list)
+            write_glossary_file(glossary, glossary_filename)
+        else:
+            write_resource_file(resource_list, resource_filename)
+            write_glossary_file(glossary, glossary_filename)
+        if incremental:
+            write_previous_resource_file(resource_list, glossary_filename)
+
+
+def write_pipeline(domain="data.cityofnewyork.us", credentials="../../../auth/nyc-open-data.json",
+                   endpoint_type="table", resource_filename=None, glossary_filename=None, timeout=60, pool_size=1,
+                   backend="pager", processes=1, maxsize=64, catalog_filename=None, max_age=60 * 60 * 24,
+                   retries=None):
+    """
+    Writes a resource representation and a glossary for a single resource type from a Socrata portal in a single
+    pipelined pass: resources are glossarized as soon as they have been resource-ified, instead of after the entire
+    resource list has been written out (as with `write_resource_representation` followed by `write_glossary`). This
+    matters most for blobs and links, whose resource URIs have to be looked up one at a time (see
+    `get_resource_link`). Both files are written out at the end, whether or not the run succeeded.
+
+    See `write_resource_representation` and `write_glossary` for the parameters. `maxsize` is the maximum number of
+    resources to queue up between the two.
+
+    Returns
+    -------
+    A dict of `pipeline.Pipeline.stats` for the run.
+    """
+    from .pipeline import Pipeline, Stage
+
+    resources = []
+    glossary = []
+    failures = []
+
+    def read_resource(metadata):
+        resource = resourcify(metadata, domain, endpoint_type)
+        resources.append(resource)
+        return [resource]
+
+    def glossarize_resources(resource_list):
+        get_glossary(resource_list, glossary, domain=domain, endpoint_type=endpoint_type, timeout=timeout,
+                     pool_size=pool_size, backend=backend, retries=retries, failures=failures, workers=workers)
+        return []
+
+    metadata = get_portal_metadata(domain, credentials, endpoint_type, catalog_filename=catalog_filename,
+                                   max_age=max_age)
+
+    # Blob and link resources whose links aren't in their view metadata are paged for in the shared pager driver, which
+    # only one thread can use at a time.
+    pipeline = Pipeline(metadata, [Stage(read_resource), Stage(glossarize_resources, stream=True)], maxsize=maxsize)
+
+    # Fork the workers for sizing non-table resources before the stage threads are started (see `executor`).
+    workers = None
+    if endpoint_type != "table":
+        from .executor import WorkerPool
+        workers = WorkerPool(processes=processes, timeout=timeout)
+
+    try:
+        pipeline.run()
+    finally:
+        if workers:
+            workers.close()
+        write_resource_file(resources, resource_filename)
         write_glossary_file(glossary, glossary_filename)
+        retry.write_failures(failures, glossary_filename)
+
+    return pipeline.stats()
@@ -0,0 +1,114 @@
+"""
+This module sizes Socrata tables using the SODA API, as an alternative to paging the portal for them.
+
+The pager gets row and column counts by rendering the table's "Primer" landing page in a headless browser and reading
+them back out of the page. That costs seconds per table, and the row counts it reads are rounded for display ("342K").
+But every Socrata table is also exposed via a SODA API endpoint, `/resource/<id>.json`, which supports SQL-like
+aggregation queries. A `select count(*)` against that endpoint returns the exact number of rows in a single small
+response, and the number of columns is already known from the `columns_name` metadata recorded in the resource list.
+
+Likewise, the pager gets the download links of blobs and links by rendering their landing pages and reading the link
+off of the first download button. But that link comes straight out of the resource's view metadata, served as JSON by
+`/api/views/<id>.json`: blobs are downloaded from a URL built from their MIME type, and links point at their first
+access point. `get_download_links` reads these off of the view metadata of many resources at once.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, quote
+
+from requests.exceptions import RequestException
+
+from . import throttle, retry
+
+
+def endpoint_id(landing_page):
+    """
+    Given a Socrata landing page, e.g. "https://data.cityofnewyork.us/d/9cw8-7heb", returns the endpoint id, e.g.
+    "9cw8-7heb".
+    """
+    return landing_page.rstrip("/").split("/")[-1]
+
+
+def count_rows(domain, endpoint, timeout=10):
+    """
+    Returns the exact number of rows in a Socrata table, via the SODA API.
+    """
+    r = throttle.get("https://{0}/resource/{1}.json".format(domain, endpoint),
+                     params={'$select': 'count(*)'}, timeout=timeout)
+    r.raise_for_status()
+
+    # The result is a single row with a single column, e.g. [{"count": "73900"}]. The column name has varied between
+    # SODA versions ("count", "count_1"), so don't rely on it.
+    result = r.json()
+    if len(result) != 1 or len(result[0]) != 1:
+        raise ValueError("{0} could not be processed because the SODA API response format has probably "
+                         "changed.".format(endpoint))
+
+    return int(list(result[0].values())[0])
+
+
+def get_endpoint_size(resource, timeout=10):
+    """
+    Given an individual table resource (as would be loaded from the resource list), returns information on the number
+    of rows and columns thereof, in the same format as `pager.page_socrata_for_endpoint_size`.
+
+    Raises a `requests.HTTPError` if the endpoint does not exist (anymore), and a `requests.Timeout` if the portal
+    does not respond within the allotted timeout.
+    """
+    # Portal homepages may live on a different subdomain (e.g. "opendata.cityofnewyork.us") than the datasets do
+    # ("data.cityofnewyork.us"), so take the domain from the landing page itself.
+    landing_page = resource['landing_page']
+    domain = urlparse(landing_page).netloc
+
+    rows = count_rows(domain, endpoint_id(landing_page), timeout=timeout)
+    columns = len(resource['column_names'])
+
+    return {'rows': rows, 'columns': columns}
+
+
+def get_view(domain, endpoint, timeout=10):
+    """
+    Returns the view metadata for a Socrata resource.
+    """
+    r = throttle.get("https://{0}/api/views/{1}.json".format(domain, endpoint), timeout=timeout)
+    r.raise_for_status()
+    return r.json()
+
+
+def download_link(view, domain):
+    """
+    Given the view metadata for a blob or a link on a Socrata portal, returns the link that its landing page's download
+    button points to, or None if the view metadata doesn't say.
+    """
+    # Blobs are files uploaded to the portal, e.g. "https://data.cityofnewyork.us/download/q68s-8qxv/application%2Fzip".
+    if view.get('blobId') or view.get('blobMimeType'):
+        mimetype = view.get('blobMimeType') or "application/octet-stream"
+        return "https://{0}/download/{1}/{2}".format(domain, view['id'], quote(mimetype, safe=""))
+
+    # Links point elsewhere, through one or more "access points", each with a URL per format. Older views list a single
+    # set of these as `accessPoints`.
+    metadata = view.get('metadata') or dict()
+    for access_point in metadata.get('additionalAccessPoints') or []:
+        for url in (access_point.get('urls') or dict()).values():
+            if url:
+                return url
+    for url in (metadata.get('accessPoints') or dict()).values():
+        if url:
+            return url
+    return None
+
+
+def get_download_links(domain, endpoints, concurrency=8, timeout=10):
+    """
+    Returns the download links for a list of Socrata blobs and links, as a list in the same order as `endpoints`, by
+    way of their view metadata. Up to `concurrency` views are fetched at once. Resources whose view metadata could not
+    be fetched (after retrying transient failures), or doesn't have a link in it, are given a link of None.
+    """
+    def get_link(endpoint):
+        try:
+            return download_link(retry.call(get_view, domain, endpoint, timeout=timeout), domain)
+        except (RequestException, ValueError):
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        return list(executor.map(get_link, endpoints))
@@ -0,0 +1,178 @@
+"""
+This module implements a SQLite storage backend for resource lists and glossaries.
+
+Resource lists and glossaries are ordinarily kept as flat JSON arrays. That is simple, but every consumer has to parse
+the entire file and scan it linearly to find anything in it. A `GlossaryStore` instead keeps resources and glossary
+entries in a SQLite database, one row per record, with the fields we look things up by (`landing_page`, `resource`,
+the "processed" and "ignore" flags, `last_updated`, and the sizing fields) broken out into indexed columns.
+
+Each row also keeps the original record as a JSON document, and records keep their original order, so importing a JSON
+file into the store and exporting it back out again is lossless. This covers both the flat layout that the
+glossarizers write and the older grouped layout (with `id`, `sizing`, `usage` and so on sub-dicts) that some of the
+files in the data folder use.
+
+The read and write helpers in `generic` use this backend for any filename ending in ".sqlite" or ".db". The resource
+list and the glossary may live in the same database.
+"""
+
+import json
+import os
+import sqlite3
+
+
+SQLITE_EXTENSIONS = (".sqlite", ".db")
+
+TABLES = ('resources', 'glossary')
+
+INDEXED_COLUMNS = ('landing_page', 'resource', 'dataset', 'last_updated', 'processed', 'ignored', 'rows', 'columns',
+                   'filesize')
+
+
+def is_store(filename):
+    """
+    Returns whether or not a filename refers to a SQLite store, as opposed to a JSON file.
+    """
+    return os.path.splitext(filename)[1].lower() in SQLITE_EXTENSIONS
+
+
+def get_field(record, name):
+    """
+    Gets a field from a record in either the flat layout or the older grouped layout.
+    """
+    if name in record:
+        return record[name]
+    for value in record.values():
+        if isinstance(value, dict) and name in value:
+            return value[name]
+    return None
+
+
+def _text(value):
+    return value if isinstance(value, str) else None
+
+
+def _number(value):
+    # Sizes are sometimes recorded as strings, e.g. "4438", or as timeout markers, e.g. ">60s".
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(position, record):
+    flags = get_field(record, 'flags') or []
+    return (position, _text(get_field(record, 'landing_page')), _text(get_field(record, 'resource')),
+            _text(get_field(record, 'dataset')), _text(get_field(record, 'last_updated')),
+            int('processed' in flags), int('ignore' in flags),
+            _number(get_field(record, 'rows')), _number(get_field(record, 'columns')),
+            _number(get_field(record, 'filesize')), json.dumps(record))
+
+
+class GlossaryStore:
+    """
+    A SQLite-backed store of resources and glossary entries.
+
+    Parameters
+    ----------
+    filename: str
+        The database file. Created if it does not already exist.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.conn = sqlite3.connect(filename)
+
+        with self.conn:
+            for table in TABLES:
+                self.conn.execute("CREATE TABLE IF NOT EXISTS {0} (position INTEGER PRIMARY KEY, landing_page TEXT, "
+                                  "resource TEXT, dataset TEXT, last_updated TEXT, processed INTEGER, "
+                                  "ignored INTEGER, rows REAL, columns REAL, filesize REAL, "
+                                  "doc TEXT)".format(table))
+                for column in INDEXED_COLUMNS:
+                    self.conn.execute("CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1})".format(table, column))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, table, records):
+        """
+        Replaces the contents of a table with a list of records.
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM {0}".format(table))
+            self.conn.executemany("INSERT INTO {0} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)".format(table),
+                                  (_row(i, record) for i, record in enumerate(records)))
+
+    def upsert(self, table, records):
+        """
+        Inserts or updates records in bulk. A record replaces the first existing record with the same landing page,
+        resource, and (for glossary entries) dataset, if there is one, and is appended to the table otherwise.
+        """
+        with self.conn:
+            position = self.conn.execute("SELECT COALESCE(MAX(position), -1) FROM {0}".format(table)).fetchone()[0]
+
+            for record in records:
+                existing = self.conn.execute(
+                    "SELECT MIN(position) FROM {0} WHERE landing_page IS ? AND resource IS ? AND "
+                    "dataset IS ?".format(table),
+                    _row(None, record)[1:4]
+                ).fetchone()[0]
+
+                if existing is None:
+                    position += 1
+                    existing = position
+                self.conn.execute("INSERT OR REPLACE INTO {0} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)".format(table),
+                                  _row(existing, record))
+
+    def iterate(self, table, where=None, params=(), batch_size=1000):
+        """
+        Yields the records in a table, in order, reading them in batches of `batch_size`. Takes the same `where` clause
+        as `read`. No cursor is held open between batches, so the store may be written to while it is being iterated.
+        """
+        query = "SELECT position, doc FROM {0} WHERE position > ?".format(table)
+        if where:
+            query += " AND (" + where + ")"
+        query += " ORDER BY position LIMIT {0}".format(batch_size)
+
+        position = -1
+        while True:
+            rows = self.conn.execute(query, (position,) + tuple(params)).fetchall()
+            for position, doc in rows:
+                yield json.loads(doc)
+            if len(rows) < batch_size:
+                return
+
+    def read(self, table, where=None, params=()):
+        """
+        Returns the records in a table, in order. An SQL `where` clause over the indexed columns (and its parameters)
+        may be passed to return only some of them, e.g. `store.read('glossary', 'rows > ?', (10000,))`.
+        """
+        return list(self.iterate(table, where=where, params=params))
+
+    def lookup(self, table, landing_page):
+        """
+        Returns the records in a table with the given landing page.
+        """
+        return self.read(table, "landing_page = ?", (landing_page,))
+
+    def todo(self, use_cache=True):
+        """
+        Returns the resources still to be glossarized: those without the "ignore" flag and, if `use_cache` is True,
+        without the "processed" flag. Equivalent to the filtering done by `generic.load_glossary_todo`.
+        """
+        if use_cache:
+            return self.read('resources', "processed = 0 AND ignored = 0")
+        return self.read('resources', "ignored = 0")
+
+    def import_json(self, table, filename):
+        with open(filename, "r") as fp:
+            self.write(table, json.load(fp))
+
+    def export_json(self, table, filename):
+        with open(filename, "w") as fp:
+            json.dump(self.read(table), fp, indent=4)
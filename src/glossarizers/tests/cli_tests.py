@@ -0,0 +1,87 @@
+"""
+Unit tests for the cli module. These run a stand-in platform, whose steps write placeholder files, not a live portal.
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import cli, metrics
+
+
+def fake_resources(portal, job, catalog_filename):
+    with open(job['resource_filename'], "w") as fp:
+        json.dump([{'landing_page': portal['domain'], 'flags': []}], fp)
+
+
+def fake_glossary(portal, job):
+    # Portals whose domain has a ".fail" marker file next to the manifest fail, until the marker is deleted.
+    if os.path.isfile(os.path.join(os.path.dirname(job['glossary_filename']), portal['domain'] + ".fail")):
+        raise IOError("The portal is down.")
+    with open(job['glossary_filename'], "w") as fp:
+        json.dump([{'landing_page': portal['domain']}], fp)
+
+
+cli.PLATFORMS['fake'] = {'resources': fake_resources, 'glossary': fake_glossary, 'endpoint_types': True}
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest_filename = os.path.join(self.directory, "crawl.json")
+        manifest = {'concurrency': 2, 'portals': [
+            {'platform': "fake", 'domain': "a", 'endpoint_types': ["table"], 'resource_filename': "a-resources.json",
+             'glossary_filename': "a-glossary.json"},
+            {'name': "b", 'platform': "fake", 'domain': "b", 'resource_filename': "b-resources-{endpoint_type}.json",
+             'glossary_filename': "b-glossary-{endpoint_type}.json", 'endpoint_types': ["table", "blob"]}
+        ]}
+        with open(self.manifest_filename, "w") as fp:
+            json.dump(manifest, fp)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load_manifest(self):
+        manifest = cli.load_manifest(self.manifest_filename)
+        a, b = manifest['portals']
+
+        assert manifest['state'] == os.path.join(self.directory, "crawl.state")
+        assert a['name'] == "a" and a['timeout'] == 60
+        assert a['resource_filename'] == os.path.join(self.directory, "a-resources.json")
+        assert [job['name'] for job in cli.portal_jobs(b)] == ["table", "blob"]
+        assert cli.portal_jobs(b)[1]['glossary_filename'] == os.path.join(self.directory, "b-glossary-blob.json")
+
+        with open(self.manifest_filename, "w") as fp:
+            json.dump({'portals': [{'platform': "fake", 'domain': "a", 'timeuot': 10}]}, fp)
+        with self.assertRaises(ValueError):
+            cli.load_manifest(self.manifest_filename)
+
+    def test_resume(self):
+        open(os.path.join(self.directory, "b.fail"), "w").close()
+        manifest = cli.load_manifest(self.manifest_filename)
+
+        assert cli.run_manifest(manifest) == ["b"]
+        assert [row[3] for row in cli.status(manifest)] == ["done", "done", "done", "failed", None, None]
+
+        # Resuming only redoes what didn't get done.
+        os.remove(os.path.join(self.directory, "b.fail"))
+        os.remove(os.path.join(self.directory, "a-resources.json"))
+        os.remove(os.path.join(self.directory, "b-resources-table.json"))
+        assert cli.run_manifest(manifest, concurrency=1) == []
+        assert all(row[3] == "done" for row in cli.status(manifest))
+        assert not os.path.isfile(os.path.join(self.directory, "a-resources.json"))
+        assert not os.path.isfile(os.path.join(self.directory, "b-resources-table.json"))
+        assert os.path.isfile(os.path.join(self.directory, "b-glossary-blob.json"))
+
+        # Unless we ask to start over.
+        metrics_filename = os.path.join(self.directory, "metrics.jsonl")
+        assert cli.main(["run", self.manifest_filename, "--restart", "--only", "a", "--metrics", metrics_filename]) == 0
+        assert os.path.isfile(os.path.join(self.directory, "metrics.prom"))
+        assert metrics.load(metrics_filename).histogram("span_seconds", span="step", portal="a", job="table",
+                                                        step="glossary").count == 1
+        assert os.path.isfile(os.path.join(self.directory, "a-resources.json"))
+        assert not os.path.isfile(os.path.join(self.directory, "b-resources-table.json"))
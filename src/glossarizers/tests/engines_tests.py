@@ -0,0 +1,72 @@
+"""
+Unit tests for the pager's browser engines. These page synthetic portal pages served by a local stub server with the
+static engine, which needs no browser; the browser engines are exercised by benchmarks/pager_benchmark.py.
+"""
+
+import unittest
+import time
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import replay, throttle
+# noinspection PyUnresolvedReferences
+from glossarizers.pager import engines, pager, pool
+
+
+def dimensions(sizing):
+    # Extra metadata pairs (see `pager.page_socrata_for_endpoint_size`) are left in, but not checked.
+    return {'rows': sizing['rows'], 'columns': sizing['columns']}
+
+
+def unthrottle(url):
+    host = throttle.host(url)
+    host.bucket.rate = host.bucket.burst = host.max_rate = float(10 ** 6)
+    host.limit = host.max_concurrency = 1024
+
+
+class TestStaticEngine(unittest.TestCase):
+    def setUp(self):
+        self.server = replay.StubServer(replay.Fixtures()).start()
+        self.domain = "{0}:{1}".format(*self.server.server_address)
+        unthrottle(self.server.root)
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_page(self):
+        pages, self.server.fixtures = replay.synthesize_socrata_pages(4, self.server.root)
+        driver = engines.start("static")
+
+        for uri, sizing in pages.items():
+            assert dimensions(pager.page_socrata_for_endpoint_size(self.domain, uri, driver=driver)) == sizing
+
+        uri = next(iter(pages))
+        link = pager.page_socrata_for_resource_link(self.domain, uri, driver=driver)
+        assert link == "{0}/api/views/{1}/rows.csv?accessType=DOWNLOAD".format(self.server.root, uri.split("/")[-1])
+        assert driver.title == "Resource 0"
+
+        # No browser, so the page's stylesheets, images and fonts are never asked for.
+        assert self.server.counts['requests'] == 5
+
+    def test_script_rendered(self):
+        # Pages rendered by scripts can't be read without a browser. But there's no point in waiting to find that out.
+        pages, self.server.fixtures = replay.synthesize_socrata_pages(1, self.server.root, render="script")
+        start = time.monotonic()
+        with self.assertRaises(pager.TimeoutException):
+            pager.page_socrata_for_endpoint_size(self.domain, next(iter(pages)), timeout=10,
+                                                 driver=engines.start("static"))
+        assert time.monotonic() - start < 5
+
+    def test_pool(self):
+        pages, self.server.fixtures = replay.synthesize_socrata_pages(5, self.server.root)
+        with pool.DriverPool(1, driver_factory=lambda: engines.start("static"), max_uses=2) as drivers:
+            sizings = list(drivers.map(lambda uri, driver: pager.page_socrata_for_endpoint_size(
+                self.domain, uri, driver=driver), pages))
+            assert list(map(dimensions, sizings)) == list(pages.values())
+            assert drivers.restarts == 2
+
+    def test_configure(self):
+        with self.assertRaises(ValueError):
+            engines.configure(engine="netscape")
+        with self.assertRaises(ValueError):
+            engines.start("netscape")
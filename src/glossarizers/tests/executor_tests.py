@@ -0,0 +1,59 @@
+"""
+Unit tests for the executor module.
+"""
+
+import unittest
+import threading
+import time
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import executor, metrics, session, throttle
+
+
+def sleep_for(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def take_locks(url):
+    session.get_session()
+    metrics.increment("locks")
+    with throttle.limit(url):
+        return throttle.host(url).in_flight
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_imap_timeouts(self):
+        with executor.WorkerPool(processes=2, timeout=0.5) as workers:
+            outcomes = list(workers.imap(sleep_for, [0, 5, 0.1, 0]))
+            assert outcomes[0] == 0 and outcomes[2] == 0.1 and outcomes[3] == 0
+            assert isinstance(outcomes[1], executor.TaskTimeoutError)
+            assert workers.kills == 1
+
+            # The replacement worker should be usable.
+            assert workers.run(sleep_for, 0) == 0
+
+    def test_fork_with_locks_held(self):
+        # Some other thread holds the shared locks, and a throttle slot, whenever the workers are forked.
+        url = "http://example.org"
+        throttle.host(url).limit = 1
+        held, done = threading.Event(), threading.Event()
+
+        def hold():
+            with throttle.limit(url), session._lock, metrics.registry.lock:
+                held.set()
+                done.wait()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        held.wait()
+        try:
+            with executor.WorkerPool(processes=1, timeout=5) as workers:
+                assert workers.run(take_locks, url) == 1
+                workers.run(sleep_for, 10)
+                assert workers.run(take_locks, url) == 1
+                assert workers.kills == 1
+        finally:
+            done.set()
+            thread.join()
@@ -0,0 +1,58 @@
+"""
+Unit tests for the export module.
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import export
+
+
+FLAT_ENTRY = {'landing_page': "https://data.cityofnewyork.us/d/9cw8-7heb",
+              'resource': "https://data.cityofnewyork.us/api/views/9cw8-7heb/rows.csv?accessType=DOWNLOAD",
+              'name': ".nyc Domain Registrations", 'dataset': ".", 'protocol': "https",
+              'preferred_format': "csv", 'preferred_mimetype': "text/csv",
+              'sources': ["Department of Information Technology & Telecommunications (DoITT)"],
+              'column_names': ["Domain Registration Date ", "Domain Name ", "Nexus Category"],
+              'rows': 73900, 'columns': 3, 'page_views': 1521, 'flags': [],
+              'last_updated': "2017-05-12 17:28:55+00:00"}
+
+GROUPED_ENTRY = {'id': {'landing_page': "data.gov.sg/dataset/secondhandcollecn", 'dataset': ".",
+                        'resource': "https://geo.data.gov.sg/secondhandcollecn/kml/secondhandcollecn.zip"},
+                 'sizing': {'filesize': ">60s"},
+                 'usage': {'last_updated': "2016-12-21 03:50:37.438393"},
+                 'provenance': {'sources': "National Environment Agency"},
+                 'flags': []}
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.root_path = os.path.join(self.directory, "glossary.parquet")
+        for name, entry in [("table.json", FLAT_ENTRY), ("resources.json", GROUPED_ENTRY)]:
+            with open(os.path.join(self.directory, name), "w") as fp:
+                json.dump([entry], fp)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        count = export.write_parquet([("nyc", "table", os.path.join(self.directory, "table.json")),
+                                      ("singapore", "resources", os.path.join(self.directory, "resources.json"))],
+                                     self.root_path)
+        assert count == 2
+
+        df = export.read_parquet(self.root_path).set_index('portal')
+        assert df.loc['nyc', 'rows'] == 73900
+        assert df.loc['nyc', 'last_updated'].year == 2017
+        assert df.loc['singapore', 'landing_page'] == "data.gov.sg/dataset/secondhandcollecn"
+        assert list(df.loc['singapore', 'sources']) == ["National Environment Agency"]
+        assert df[['filesize']].isnull().all().all()
+
+        df = export.read_parquet(self.root_path, columns=['name'], filters=[('portal', '=', 'nyc')])
+        assert list(df['name']) == [".nyc Domain Registrations"]
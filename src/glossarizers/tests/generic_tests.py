@@ -0,0 +1,142 @@
+"""
+Unit tests for the generic module.
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import generic
+
+
+def make_resource(i):
+    return {'landing_page': "https://data.cityofnewyork.us/d/{0}".format(i),
+            'resource': "https://data.cityofnewyork.us/download/{0}".format(i),
+            'flags': []}
+
+
+class TestGlossaryJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.resource_filename = os.path.join(self.directory, "resources.json")
+        self.glossary_filename = os.path.join(self.directory, "glossary.json")
+        generic.write_resource_file([make_resource(i) for i in range(5)], self.resource_filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resume_from_journal(self):
+        resource_list, glossary = generic.load_glossary_todo(self.resource_filename, self.glossary_filename,
+                                                             journal=True)
+        journal = generic.GlossaryJournal(self.glossary_filename, batch_size=1)
+
+        for resource in resource_list[:2]:
+            entry = dict(resource, dataset='.')
+            glossary.append(entry)
+            resource['flags'].append('processed')
+            journal.record(resource, [entry])
+
+        # Simulate a hard kill: no compaction, and a torn final line.
+        journal.fp.write('{"glossary": {"landing_')
+        journal.fp.close()
+
+        resource_list, glossary = generic.load_glossary_todo(self.resource_filename, self.glossary_filename,
+                                                             journal=True)
+        assert [r['landing_page'] for r in resource_list] == [make_resource(i)['landing_page'] for i in range(2, 5)]
+        assert len(glossary) == 2
+
+        journal = generic.GlossaryJournal(self.glossary_filename)
+        journal.compact(resource_list, glossary, self.resource_filename, self.glossary_filename)
+        assert not os.path.isfile(generic.journal_filename(self.glossary_filename))
+
+        with open(self.glossary_filename, "r") as fp:
+            assert len(json.load(fp)) == 2
+
+
+class TestDiffGlossary(unittest.TestCase):
+    def test_diff_glossary(self):
+        resource_list = [make_resource(i) for i in range(4)]
+        for i, resource in enumerate(resource_list):
+            resource['last_updated'] = "2017-01-0{0}".format(i + 1)
+        # Resource 2 has been modified since it was glossarized.
+        glossary = [dict(resource, dataset='.') for resource in resource_list[:3]]
+        glossary[2]['last_updated'] = "2016-12-31"
+        # Resource 4 has been deleted since it was glossarized.
+        glossary.append(dict(make_resource(4), last_updated="2017-01-05", dataset='.'))
+        # Resource 3 is new.
+
+        kept = generic.diff_glossary(resource_list, glossary)
+        assert [e['landing_page'] for e in kept] == [r['landing_page'] for r in resource_list[:2]]
+        assert [r['flags'] for r in resource_list] == [['processed'], ['processed'], [], []]
+
+    def test_diff_previous_resource_list(self):
+        # The resources of a single CKAN package share a landing page.
+        def make_package_resource(i):
+            return dict(make_resource(0), resource="http://catalog.data.ug/{0}.csv".format(i),
+                        last_updated="2017-01-01", flags=[])
+
+        previous = [make_package_resource(i) for i in range(4)]
+        for resource, flags in zip(previous, [['processed'], ['processed', 'removed'], ['processed', 'error'], []]):
+            resource['flags'] = flags
+        previous[3]['last_updated'] = "2016-12-31"
+        glossary = [dict(previous[0], dataset='.')]
+
+        directory = tempfile.mkdtemp()
+        resource_filename = os.path.join(directory, "resources.json")
+        glossary_filename = os.path.join(directory, "glossary.json")
+        generic.write_resource_file([make_package_resource(i) for i in range(5)], resource_filename)
+        generic.write_glossary_file(glossary, glossary_filename)
+        generic.write_previous_resource_file(previous, glossary_filename)
+
+        todo, kept, resource_list = generic.load_incremental_todo(resource_filename, glossary_filename)
+        shutil.rmtree(directory)
+
+        # Resources which were processed, but generated no glossary entries, are not redone: only the modified and new
+        # resources are.
+        assert [r['flags'] for r in resource_list] == [['processed'], ['processed', 'removed'],
+                                                       ['processed', 'error'], [], []]
+        assert [r['resource'] for r in todo] == [resource_list[3]['resource'], resource_list[4]['resource']]
+        assert len(kept) == 1
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.resource_filename = os.path.join(self.directory, "resources.json")
+        self.glossary_filename = os.path.join(self.directory, "glossary.json")
+
+        self.resource_list = [make_resource(i) for i in range(6)]
+        self.resource_list[1]['flags'].append('processed')
+        self.resource_list[2]['flags'].append('ignore')
+        self.resource_list[3]['description'] = "Brackets [], braces {}, and \"quotes\", inside of a string."
+        with open(self.resource_filename, "w") as fp:
+            json.dump(self.resource_list, fp, indent=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_iter_json_array(self):
+        for chunk_size in [1, 7, 1024]:
+            with open(self.resource_filename, "r") as fp:
+                assert list(generic.iter_json_array(fp, chunk_size=chunk_size)) == self.resource_list
+
+    def test_dump_records(self):
+        generic.write_resource_file(iter(self.resource_list), self.glossary_filename)
+        with open(self.resource_filename, "r") as fp, open(self.glossary_filename, "r") as gp:
+            assert fp.read() == gp.read()
+
+    def test_stream_glossary_todo(self):
+        todo, glossary, updated = generic.stream_glossary_todo(self.resource_filename, self.glossary_filename)
+        for resource in todo:
+            resource['flags'].append('processed')
+            glossary.append(dict(resource, dataset='.'))
+        generic.update_resource_file(self.resource_filename, updated)
+
+        assert len(glossary) == 4
+        resource_list = generic.read_file(self.resource_filename, 'resources')
+        assert [r['flags'] for r in resource_list] == [['processed'], ['processed'], ['ignore'],
+                                                       ['processed'], ['processed'], ['processed']]
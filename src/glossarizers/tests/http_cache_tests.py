@@ -0,0 +1,100 @@
+"""
+Unit tests for the http_cache module. These run against a local HTTP server, not a live portal.
+"""
+
+import unittest
+import pickle
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import http_cache
+from glossarizers.crawler import fetch_json_all
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    """
+    Serves a small JSON document per path, with an ETag, and answers matching conditional requests with a 304.
+    """
+    version = "1"
+
+    def do_GET(self):
+        etag = '"{0}-{1}"'.format(self.path, self.version)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = '{{"path": "{0}", "version": "{1}"}}'.format(self.path, self.version).encode('utf-8')
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server = HTTPServer(('127.0.0.1', 0), ETagHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.root = "http://127.0.0.1:{0}".format(self.server.server_address[1])
+        ETagHandler.version = "1"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_revalidation(self):
+        cache = http_cache.HTTPCache(self.directory)
+
+        r = cache.get(self.root + "/a")
+        assert not r.from_cache and r.json()['version'] == "1"
+
+        r = cache.get(self.root + "/a")
+        assert r.from_cache and r.status_code == 200 and r.json()['version'] == "1"
+
+        ETagHandler.version = "2"
+        r = cache.get(self.root + "/a")
+        assert not r.from_cache and r.json()['version'] == "2"
+
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 2
+
+    def test_eviction(self):
+        cache = http_cache.HTTPCache(self.directory, max_size=70)
+        for path in ["/a", "/b", "/c"]:
+            cache.get(self.root + path)
+
+        # Each body is 30 bytes, so only the two most recently used fit.
+        assert cache.stats()['evictions'] == 1
+        assert cache.request_headers(self.root + "/a") == dict()
+        assert cache.request_headers(self.root + "/c") != dict()
+
+    def test_concurrent_fetch(self):
+        cache = http_cache.HTTPCache(self.directory)
+        uris = [self.root + "/{0}".format(i) for i in range(10)]
+
+        first = fetch_json_all(uris, concurrency=4, cache=cache)
+        second = fetch_json_all(uris, concurrency=4, cache=cache)
+        assert first == second
+        assert cache.stats()['hits'] == 10
+
+    def test_shared_across_threads(self):
+        cache = http_cache.HTTPCache(self.directory)
+        threads = [threading.Thread(target=cache.get, args=(self.root + "/{0}".format(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert cache.stats()['stores'] == 4
+
+        # As are the workers of an `executor.WorkerPool`, which are sent their copy of the cache pickled.
+        assert pickle.loads(pickle.dumps(cache)).get(self.root + "/0").from_cache
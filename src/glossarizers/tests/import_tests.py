@@ -0,0 +1,56 @@
+"""
+Import-time tests for the package, guarding against heavy imports creeping back into `import glossarizers`.
+"""
+
+import unittest
+import json
+import os
+import subprocess
+import sys
+
+
+# Modules which take a long time to import, or which have side effects when they are imported.
+HEAVY = ['pandas', 'numpy', 'pysocrata', 'selenium', 'pyarrow', 'glossarizers.pager']
+
+SCRIPT = """
+import json, sys, time
+sys.path.insert(0, '../../')
+start = time.perf_counter()
+import {0}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def time_import(module):
+    """
+    Imports a module in a fresh interpreter. Returns how long the import took, and the modules it imported.
+    """
+    out = subprocess.check_output([sys.executable, "-c", SCRIPT.format(module)],
+                                  cwd=os.path.dirname(os.path.abspath(__file__)))
+    result = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+    return result['elapsed'], set(result['modules'])
+
+
+class TestImportTime(unittest.TestCase):
+    def test_package_import(self):
+        # Wall-clock import times are too noisy to assert on; what matters is that no heavy module gets imported.
+        _, modules = time_import("glossarizers")
+        assert not [module for module in HEAVY if module in modules]
+
+    def test_glossarizer_import(self):
+        # The glossarizers themselves defer their heavy imports until they are needed, too.
+        for glossarizer in ["glossarizers.ckan_glossarizer", "glossarizers.socrata_glossarizer"]:
+            _, modules = time_import(glossarizer)
+            assert not [module for module in HEAVY if module in modules]
+
+    def test_lazy_attributes(self):
+        sys.path.insert(0, '../../')
+        # noinspection PyUnresolvedReferences
+        import glossarizers
+
+        assert glossarizers.write_glossary.__module__ == "glossarizers.socrata_glossarizer"
+        assert glossarizers.package_resources.__module__ == "glossarizers.ckan_glossarizer"
+        assert glossarizers.records.Flag.PROCESSED == "processed"
+        with self.assertRaises(AttributeError):
+            glossarizers.not_an_attribute
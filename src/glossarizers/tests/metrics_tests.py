@@ -0,0 +1,92 @@
+"""
+Unit tests for the metrics module.
+"""
+
+import unittest
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import metrics, replay, throttle
+
+
+def report_from_worker(n):
+    metrics.increment("resources", outcome="glossarized")
+    with metrics.span("get_sizing"):
+        pass
+    return n
+
+
+class TestHistogram(unittest.TestCase):
+    def test_quantile(self):
+        histogram = metrics.Histogram(buckets=(1, 2, 3, float('inf')))
+        for value in [0.5] * 50 + [1.5] * 49 + [100]:
+            histogram.observe(value)
+
+        assert histogram.count == 100 and histogram.sum == 25 + 73.5 + 100
+        assert 0 < histogram.quantile(0.5) <= 1
+        assert 1 < histogram.quantile(0.99) <= 2
+        assert histogram.quantile(1) == 100
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        metrics.configure(jsonl=None)
+        metrics.registry.reset()
+        shutil.rmtree(self.directory)
+
+    def test_spans(self):
+        registry = metrics.Registry()
+        with registry.span("resourcify"):
+            with registry.span("page_load"):
+                pass
+        with self.assertRaises(ValueError):
+            with registry.span("resourcify"):
+                raise ValueError()
+
+        assert registry.histogram("span_seconds", span="resourcify").count == 2
+        assert registry.histogram("span_seconds", span="page_load", parent="resourcify").count == 1
+        assert registry.histogram("span_seconds", span="page_load") is None
+
+    def test_export(self):
+        jsonl = os.path.join(self.directory, "metrics.jsonl")
+        metrics.configure(jsonl=jsonl)
+
+        # Metrics reported by worker processes end up in the file too.
+        with mp.Pool(2) as pool:
+            assert pool.map(report_from_worker, range(4)) == list(range(4))
+        metrics.increment("resources", outcome="failed")
+
+        registry = metrics.load(jsonl)
+        assert registry.counter("resources", outcome="glossarized") == 4
+        assert registry.counter("resources", outcome="failed") == 1
+        assert registry.histogram("span_seconds", span="get_sizing").count == 4
+
+        prometheus = registry.to_prometheus()
+        assert '# TYPE glossarizers_resources counter' in prometheus
+        assert 'glossarizers_resources{outcome="glossarized"} 4' in prometheus
+        assert 'glossarizers_span_seconds_bucket{span="get_sizing",le="+Inf"} 4' in prometheus
+        assert 'glossarizers_span_seconds_count{span="get_sizing"} 4' in prometheus
+
+        report = registry.report()
+        assert "get_sizing" in report and "outcome=glossarized" in report
+
+    def test_requests(self):
+        with replay.StubServer(replay.Fixtures()) as server:
+            root = server.root + "/"
+            server.fixtures.add("GET", root)
+            host = throttle.host_of(root)
+
+            for _ in range(3):
+                throttle.get(root)
+
+        assert metrics.registry.counter("requests", host=host, method="GET", status=200) == 3
+        assert metrics.registry.histogram("request_seconds", host=host, method="GET").count == 3
+        # The connection is kept alive, so it is only opened once.
+        assert metrics.registry.histogram("span_seconds", span="connect", host="127.0.0.1").count == 1
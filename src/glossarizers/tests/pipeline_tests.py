@@ -0,0 +1,60 @@
+"""
+Unit tests for the pipeline module.
+"""
+
+import unittest
+import time
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers.pipeline import Pipeline, Stage
+
+
+class TestPipeline(unittest.TestCase):
+    def test_results(self):
+        def split(n):
+            return [n, -n]
+
+        def total(items):
+            yield sum(items)
+
+        expected = sorted(list(range(100)) + [-n for n in range(100)])
+        assert sorted(Pipeline(range(100), [Stage(split, workers=4)])) == expected
+        assert list(Pipeline(range(100), [Stage(split, workers=4), Stage(total, stream=True)])) == [0]
+
+        pipeline = Pipeline(range(10), [Stage(lambda n: [], workers=3, name="drop")])
+        pipeline.run()
+        assert pipeline.stats()['drop']['in'] == 10 and pipeline.stats()['drop']['out'] == 0
+
+    def test_backpressure(self):
+        produced = []
+
+        def source():
+            for n in range(100):
+                produced.append(n)
+                yield n
+
+        pipeline = Pipeline(source(), [Stage(lambda n: [n])], maxsize=2)
+        iterator = iter(pipeline)
+        next(iterator)
+        time.sleep(0.5)
+
+        # Two queues of two, one item in the stage's hands, one in the source's, and the one we consumed.
+        assert len(produced) <= 7
+        assert sorted(iterator) == list(range(1, 100))
+
+    def test_errors(self):
+        def fail(n):
+            if n == 50:
+                raise ValueError(n)
+            return [n]
+
+        pipeline = Pipeline(range(10 ** 6), [Stage(fail, workers=2), Stage(lambda n: [n])], maxsize=4)
+        with self.assertRaises(ValueError):
+            list(pipeline)
+
+        # Every thread is shut down, including the source.
+        assert not any(thread.is_alive() for thread in pipeline.threads)
+
+        with self.assertRaises(ValueError):
+            Stage(fail, workers=2, stream=True)
@@ -0,0 +1,60 @@
+"""
+Unit tests for the records module.
+"""
+
+import unittest
+import json
+import pickle
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import records
+
+
+RESOURCE = {'landing_page': "data.gov.sg/dataset/secondhandcollecn",
+            'resource': "https://geo.data.gov.sg/secondhandcollecn/2017/04/26/kml/secondhandcollecn.zip",
+            'protocol': "https",
+            'name': "2nd Hand Goods Collection Points",
+            'publisher': "National Environment Agency",
+            'sources': ["National Environment Agency"],
+            'last_updated': "2017-04-26 06:39:49.466539",
+            'tags_provided': ["onemap", "recycle"],
+            'available_formats': ["kml", "shp"],
+            'preferred_format': "kml",
+            'flags': ["processed"]}
+
+
+class TestRecords(unittest.TestCase):
+    def test_serialization(self):
+        resource = records.Resource(RESOURCE)
+        resource['filesize'] = 4438
+        expected = dict(RESOURCE, filesize=4438)
+
+        assert resource == expected and isinstance(resource, dict)
+        assert json.dumps(resource, indent=4) == json.dumps(expected, indent=4)
+        assert pickle.loads(pickle.dumps(resource)) == expected
+        assert isinstance(pickle.loads(pickle.dumps(resource)), records.Resource)
+
+        resource['tags_provided'].append("second-hand")
+        assert resource['tags_provided'] == ["onemap", "recycle", "second-hand"]
+
+    def test_interning(self):
+        a, b = records.Resource(json.loads(json.dumps(RESOURCE))), records.Resource(json.loads(json.dumps(RESOURCE)))
+        assert a['sources'][0] is b['sources'][0] and a['sources'] is not b['sources']
+        assert a['publisher'] is b['publisher']
+        assert isinstance(a['sources'], list)
+        assert a['flags'] == [records.Flag.PROCESSED] and 'processed' in a['flags']
+
+    def test_glossary_entry(self):
+        resource = records.Resource(RESOURCE)
+        entry = records.glossary_entry(resource)
+        entry['dataset'] = "."
+
+        assert isinstance(entry, records.GlossaryEntry)
+        assert entry['flags'] == [] and resource['flags'] == ['processed']
+        assert 'dataset' not in resource
+        assert list(entry.keys()) == list(RESOURCE.keys()) + ['dataset']
+
+    def test_grouped_layout(self):
+        entry = {'id': {'landing_page': RESOURCE['landing_page']}, 'sizing': {'filesize': ">60s"}, 'flags': []}
+        assert records.GlossaryEntry.wrap(entry) is entry
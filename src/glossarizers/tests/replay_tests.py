@@ -0,0 +1,133 @@
+"""
+Unit tests for the replay module. These record from, and replay to, local HTTP servers, not a live portal.
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import replay, retry, session, throttle
+# noinspection PyUnresolvedReferences
+from glossarizers import ckan_glossarizer, generic
+
+
+def origin_fixtures(root):
+    """
+    Makes up fixtures for an origin server at `root`, which serves a JSON document at /api, and a few bytes of binary
+    at /download.
+    """
+    fixtures = replay.Fixtures()
+    fixtures.add("GET", root + "/api?id=a+b", headers={'Content-Type': "application/json"},
+                 body=json.dumps({'path': "/api?id=a+b"}).encode('utf-8'))
+    fixtures.add("GET", root + "/download", headers={'Content-Type': "application/octet-stream"},
+                 body=bytes(range(256)))
+    return fixtures
+
+
+def unthrottle(url):
+    host = throttle.host(url)
+    host.bucket.rate = host.bucket.burst = host.max_rate = float(10 ** 6)
+    host.limit = host.max_concurrency = 1024
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        session.configure(factory=None)
+        shutil.rmtree(self.directory)
+
+    def test_record_and_replay(self):
+        fixtures_filename = os.path.join(self.directory, "fixtures.jsonl")
+
+        with replay.StubServer(replay.Fixtures()) as origin:
+            root = origin.root
+            origin.fixtures = origin_fixtures(root)
+            unthrottle(root)
+
+            with replay.record(fixtures_filename):
+                recorded = [throttle.get(root + "/api", params={'id': "a b"}).json(),
+                            throttle.get(root + "/download", stream=True).content]
+
+        fixtures = replay.Fixtures.load(fixtures_filename)
+        assert len(fixtures) == 2
+
+        with replay.StubServer(fixtures) as server, replay.replay(server):
+            assert throttle.get(root + "/api?id=a+b").json() == recorded[0]
+            assert throttle.get(root + "/download").content == recorded[1]
+            assert throttle.head(root + "/download").headers['Content-Length'] == "256"
+            assert throttle.get(root + "/download", headers={'Range': "bytes=-2"}).content == bytes([254, 255])
+            assert throttle.get(root + "/elsewhere").status_code == 404
+            assert server.counts['missing'] == 1
+
+    def test_failures(self):
+        fixtures = replay.Fixtures([{'method': "GET", 'url': "https://example.com/", 'body': b"ok"}])
+
+        with replay.StubServer(fixtures, failure_rate=1) as server, replay.replay(server):
+            assert session.get_session().get("https://example.com/").status_code == 503
+
+        with replay.StubServer(fixtures, rate=1, burst=1) as server, replay.replay(server):
+            assert session.get_session().get("https://example.com/").content == b"ok"
+            r = session.get_session().get("https://example.com/")
+            assert r.status_code == 429 and float(r.headers['Retry-After']) > 0
+            assert server.counts == {'requests': 2, 'throttled': 1, 'failed': 0, 'missing': 0}
+
+    def test_synthetic_ckan(self):
+        resource_filename = os.path.join(self.directory, "resources.json")
+        glossary_filename = os.path.join(self.directory, "glossary.json")
+        unthrottle("http://catalog.data.ug")
+
+        with replay.StubServer(replay.synthesize_ckan(10)) as server, replay.replay(server):
+            ckan_glossarizer.write_resource_representation(domain="catalog.data.ug", out=resource_filename,
+                                                           protocol="http")
+            ckan_glossarizer.write_glossary(domain="catalog.data.ug", resource_filename=resource_filename,
+                                            glossary_filename=glossary_filename, processes=2)
+
+        resources = generic.load_resource_list(resource_filename)
+        glossary = generic.load_glossary(glossary_filename)
+        assert len(resources) == len(glossary) > 0
+        assert all("processed" in resource['flags'] for resource in resources)
+        assert all(entry['preferred_mimetype'] == "text/csv" for entry in glossary)
+        assert server.counts['missing'] == 0
+
+    def test_synthetic_ckan_concurrent(self):
+        # The asynchronous crawler doesn't go through the shared session, but is replayed all the same.
+        resource_filename = os.path.join(self.directory, "resources.json")
+        log_filename = os.path.join(self.directory, "requests.log")
+        unthrottle("http://catalog.data.ug")
+
+        with replay.StubServer(replay.synthesize_ckan(10)) as server, replay.replay(server, log_filename):
+            ckan_glossarizer.write_resource_representation(domain="catalog.data.ug", out=resource_filename,
+                                                           protocol="http", concurrency=4)
+            assert server.counts == {'requests': 11, 'throttled': 0, 'failed': 0, 'missing': 0}
+
+        assert len(generic.load_resource_list(resource_filename)) > 0
+        with open(log_filename, "r") as fp:
+            assert len(fp.readlines()) == 11
+
+    def test_synthetic_ckan_failures(self):
+        resource_filename = os.path.join(self.directory, "resources.json")
+        glossary_filename = os.path.join(self.directory, "glossary.json")
+        unthrottle("http://catalog.data.ug")
+        fixtures = replay.synthesize_ckan(10)
+
+        with replay.StubServer(fixtures) as server, replay.replay(server):
+            ckan_glossarizer.write_resource_representation(domain="catalog.data.ug", out=resource_filename,
+                                                           protocol="http")
+
+        # A 503 comes without a content-type, but is deferred and tried again, not dropped as though it had none.
+        with replay.StubServer(fixtures, failure_rate=0.3, seed=0) as server, replay.replay(server):
+            ckan_glossarizer.write_glossary(domain="catalog.data.ug", resource_filename=resource_filename,
+                                            glossary_filename=glossary_filename, processes=2,
+                                            retries=retry.RetryPolicy(attempts=10, base=0))
+            assert server.counts['failed'] > 0
+
+        resources = generic.load_resource_list(resource_filename)
+        assert len(generic.load_glossary(glossary_filename)) == len(resources)
+        assert all("processed" in resource['flags'] for resource in resources)
+        assert not os.path.exists(retry.failures_filename(glossary_filename))
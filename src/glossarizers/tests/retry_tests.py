@@ -0,0 +1,118 @@
+"""
+Unit tests for the retry module.
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+import requests
+import urllib3
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import retry
+# noinspection PyUnresolvedReferences
+from glossarizers.executor import TaskTimeoutError
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+
+RESOURCE = {'landing_page': "https://data.cityofnewyork.us/d/9cw8-7heb",
+            'resource': "https://data.cityofnewyork.us/download/9cw8-7heb/application/zip",
+            'flags': []}
+
+
+class TestClassify(unittest.TestCase):
+    def test_classify(self):
+        assert retry.classify(TaskTimeoutError()) == retry.TIMEOUT
+        assert retry.classify(requests.ReadTimeout()) == retry.TIMEOUT
+        assert retry.classify(ConnectionResetError()) == retry.CONNECTION
+        assert retry.classify(requests.exceptions.ChunkedEncodingError()) == retry.CONNECTION
+        assert retry.classify(urllib3.exceptions.MaxRetryError(None, "http://localhost:4444")) == retry.CONNECTION
+        assert retry.classify(http_error(503)) == retry.SERVER_ERROR
+        assert retry.classify(http_error(429)) == retry.SERVER_ERROR
+        assert retry.classify(http_error(404)) == retry.DELETED
+        assert retry.classify(http_error(403)) == retry.CLIENT_ERROR
+        assert retry.classify(zipfile.BadZipfile()) == retry.BAD_ARCHIVE
+        assert retry.classify(ValueError()) == retry.UNKNOWN
+
+        assert retry.is_transient(http_error(502)) and not retry.is_transient(http_error(410))
+
+    def test_classify_aiohttp(self):
+        # Failures of the asynchronous crawler, if aiohttp is installed.
+        try:
+            import aiohttp
+        except ImportError:
+            return
+        assert retry.classify(aiohttp.ClientResponseError(None, (), status=503)) == retry.SERVER_ERROR
+        assert retry.classify(aiohttp.ClientResponseError(None, (), status=404)) == retry.DELETED
+        assert retry.classify(aiohttp.ServerDisconnectedError()) == retry.CONNECTION
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_call(self):
+        policy = retry.RetryPolicy(attempts=3, base=0)
+        errors = [requests.ConnectionError(), http_error(500)]
+
+        def flaky():
+            if errors:
+                raise errors.pop()
+            return "ok"
+
+        assert policy.call(flaky) == "ok"
+
+        errors = [requests.ConnectionError()] * 3
+        with self.assertRaises(requests.ConnectionError):
+            policy.call(flaky)
+        assert errors == []
+
+        # Permanent failures are not retried.
+        errors = [requests.ConnectionError(), zipfile.BadZipfile()]
+        with self.assertRaises(zipfile.BadZipfile):
+            policy.call(flaky)
+        assert len(errors) == 1
+
+    def test_backoff(self):
+        assert all(0 <= retry.backoff(n, base=1, cap=10) <= min(10, 2 ** n) for n in range(10))
+
+
+class TestRetryQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_queue(self):
+        queue = retry.RetryQueue(retry.RetryPolicy(attempts=2, base=0))
+        other = dict(RESOURCE, resource="https://data.cityofnewyork.us/download/9cw8-7heb/text/csv")
+
+        assert queue.defer(RESOURCE, TaskTimeoutError())
+        assert not queue.defer(other, http_error(404))
+        assert RESOURCE in queue and other not in queue
+
+        batches = []
+        for batch in queue.rounds():
+            batches.append(batch)
+            assert RESOURCE not in queue
+            # Second time unlucky: the resource is out of attempts.
+            assert not queue.defer(batch[0], TaskTimeoutError())
+
+        assert batches == [[RESOURCE]]
+        assert [(f.category, f.transient, f.attempts) for f in queue.failures] == [(retry.DELETED, False, 1),
+                                                                                   (retry.TIMEOUT, True, 2)]
+
+        glossary_filename = os.path.join(self.directory, "glossary.json")
+        retry.write_failures(queue.failures, glossary_filename)
+        with open(retry.failures_filename(glossary_filename)) as fp:
+            records = [json.loads(line) for line in fp]
+        assert [r['landing_page'] for r in records] == [RESOURCE['landing_page']] * 2
+        assert records[1]['error'].startswith("TaskTimeoutError")
@@ -0,0 +1,55 @@
+"""
+Unit tests for the session module.
+"""
+
+import unittest
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import replay, session, throttle
+
+
+class TestSession(unittest.TestCase):
+    def setUp(self):
+        self.server = replay.StubServer(replay.Fixtures()).start()
+        self.root = self.server.root + "/"
+        self.server.fixtures.add("GET", self.root, headers={'Content-Type': "application/json"},
+                                 body=b'{"success": true}')
+
+    def tearDown(self):
+        self.server.close()
+        session.reset()
+
+    def test_shared_session(self):
+        s = session.get_session()
+        assert session.get_session() is s
+        assert 'gzip' in s.headers['Accept-Encoding']
+
+        session.configure(pool_maxsize=4, headers={'User-Agent': "glossarizers"})
+        t = session.get_session()
+        assert t is not s and t.headers['User-Agent'] == "glossarizers"
+        assert t.get_adapter("https://data.gov.sg/")._pool_maxsize == 4
+
+        session.reset()
+        u = session.get_session()
+        assert u.headers['User-Agent'] != "glossarizers"
+        assert u.get_adapter("https://data.gov.sg/")._pool_maxsize == 32
+
+    def test_keep_alive(self):
+        for _ in range(10):
+            assert throttle.get(self.root).json() == {'success': True}
+
+        # Every request went over the same connection.
+        assert self.server.connections == 1
+
+    def test_http2_fallback(self):
+        try:
+            import httpx  # noqa: F401
+            import h2  # noqa: F401
+            return
+        except ImportError:
+            pass
+
+        # Without httpx and h2 installed, asking for HTTP/2 gets an ordinary pooled session.
+        s = session.make_session(http2=True)
+        assert s.get(self.root).json() == {'success': True}
@@ -0,0 +1,128 @@
+"""
+Unit tests for the sizer module. These run against a local HTTP server, not a live portal.
+"""
+
+import unittest
+import io
+import os
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import sizer, remote_zip
+
+
+def make_zip():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("data/rows.csv", "a,b\n" + "1,2\n" * 10000)
+        archive.writestr("README.txt", "Hello.")
+    return buffer.getvalue()
+
+
+def make_big_zip():
+    # Random bytes don't compress, so this archive is a couple of megabytes on the wire.
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for i in range(20):
+            archive.writestr("tiles/{0}.bin".format(i), os.urandom(100 * 1024))
+    return buffer.getvalue()
+
+
+FILES = {
+    "/rows.csv": b"a,b\n" + b"1,2\n" * 100000,
+    "/archive.zip": make_zip(),
+    "/big.zip": make_big_zip()
+}
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = FILES[self.path]
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RangeFileHandler(FileHandler):
+    """
+    A file handler which supports HEAD and (single) Range requests, and keeps count of the bytes it serves.
+    """
+    bytes_served = 0
+
+    def do_HEAD(self):
+        body = FILES[self.path]
+        self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+    def do_GET(self):
+        body = FILES[self.path]
+        start, end = self.headers['Range'][len("bytes="):].split("-")
+        part = body[int(start):int(end) + 1]
+        RangeFileHandler.bytes_served += len(part)
+
+        self.send_response(206)
+        self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(start, end, len(body)))
+        self.send_header("Content-Length", str(len(part)))
+        self.end_headers()
+        self.wfile.write(part)
+
+
+class TestSizeUp(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), FileHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.root = "http://127.0.0.1:{0}".format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_size_up_plain_file(self):
+        sizings = sizer.size_up(self.root + "/rows.csv", chunk_size=1024)
+        assert len(sizings) == 1
+        assert sizings[0]['dataset'] == '.'
+        assert sizings[0]['extension'] == 'csv'
+        assert sizings[0]['filesize'] == len(FILES["/rows.csv"]) / 1024
+
+    def test_size_up_zip(self):
+        sizings = sizer.size_up(self.root + "/archive.zip", chunk_size=1024)
+        assert [s['dataset'] for s in sizings] == ["data/rows.csv", "README.txt"]
+        assert [s['extension'] for s in sizings] == ["csv", "txt"]
+        assert sizings[0]['filesize'] == (4 + 4 * 10000) / 1024
+
+
+class TestRemoteZip(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), RangeFileHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.root = "http://127.0.0.1:{0}".format(self.server.server_address[1])
+        RangeFileHandler.bytes_served = 0
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_inspect(self):
+        sizings = remote_zip.inspect(self.root + "/big.zip")
+        assert len(sizings) == 20
+        assert all(s['filesize'] == 100 for s in sizings)
+        # Only the tail end of the archive should have gone over the wire.
+        assert RangeFileHandler.bytes_served < 64 * 1024
+        assert len(FILES["/big.zip"]) > 2000 * 1024
+
+    def test_size_up_uses_ranges(self):
+        sizings = sizer.size_up(self.root + "/big.zip")
+        assert [s['dataset'] for s in sizings] == ["tiles/{0}.bin".format(i) for i in range(20)]
+        assert RangeFileHandler.bytes_served < 64 * 1024
+
+    def test_inspect_non_zip(self):
+        assert remote_zip.inspect(self.root + "/rows.csv") is None
@@ -8,8 +8,13 @@ import json
 
 import sys; sys.path.insert(0, '../../')
 # noinspection PyUnresolvedReferences
-from glossarizers import socrata_glossarizer
-import requests
+from glossarizers import socrata_glossarizer, replay, session, throttle, executor
+
+
+def unthrottle(url):
+    host = throttle.host(url)
+    host.bucket.rate = host.bucket.burst = host.max_rate = float(10 ** 6)
+    host.limit = host.max_concurrency = 1024
 
 
 # @slow
@@ -40,6 +45,39 @@ class TestGetPortalMetadata(unittest.TestCase):
                                                'columns_name'}
 
 
+class TestPortalCatalog(unittest.TestCase):
+    def setUp(self):
+        self.resources = [{'resource': {'id': str(i), 'type': t}}
+                          for i, t in enumerate(['dataset', 'story', 'map', 'file', 'href', 'dataset'])]
+        socrata_glossarizer._catalogs.clear()
+
+    def test_partition_portal_metadata(self):
+        partitions = socrata_glossarizer.partition_portal_metadata(self.resources)
+        assert {k: [m['resource']['id'] for m in v] for k, v in partitions.items()} == {
+            'table': ['0', '5'], 'geospatial dataset': ['2'], 'blob': ['3'], 'link': ['4']
+        }
+
+    def test_cached_catalog(self):
+        import os
+        import tempfile
+
+        directory = tempfile.mkdtemp()
+        catalog_filename = os.path.join(directory, "catalog.json")
+        with open(catalog_filename, "w") as fp:
+            json.dump({'domain': "data.cityofnewyork.us",
+                       'endpoints': socrata_glossarizer.partition_portal_metadata(self.resources)}, fp)
+
+        # The credentials file doesn't exist, so this would fail if it tried to go to the network.
+        tables = socrata_glossarizer.get_portal_metadata("data.cityofnewyork.us", "nonexistent.json", "table",
+                                                         catalog_filename=catalog_filename)
+        os.remove(catalog_filename)
+        links = socrata_glossarizer.get_portal_metadata("data.cityofnewyork.us", "nonexistent.json", "link",
+                                                        catalog_filename=catalog_filename)
+        os.rmdir(directory)
+
+        assert len(tables) == 2 and len(links) == 1
+
+
 class TestResourcify(unittest.TestCase):
     def test_resourcify_table(self):
         """
@@ -70,6 +108,43 @@ class TestGlossarizeTable(unittest.TestCase):
         assert glossarized_resource[0].keys() == table_glossary_keys
 
 
+class TestGlossarizeTableSoda(unittest.TestCase):
+    """
+    Same as the above, but using the browserless SODA API sizing backend, replayed from a local stub server.
+    """
+    def setUp(self):
+        with open("data/example_metadata-f4rp-2kvy.json", "r") as fp:
+            self.resource = socrata_glossarizer.resourcify(json.load(fp), "data.cityofnewyork.us", "table")
+        self.count_uri = "https://data.cityofnewyork.us/resource/f4rp-2kvy.json?$select=count(*)"
+        self.fixtures = replay.Fixtures()
+        self.server = replay.StubServer(self.fixtures).start()
+        unthrottle("https://data.cityofnewyork.us")
+
+    def tearDown(self):
+        self.server.close()
+        session.configure(factory=None)
+
+    def test_glossarize_table_soda(self):
+        self.fixtures.add("GET", self.count_uri, headers={'Content-Type': "application/json"},
+                          body=json.dumps([{'count': "73900"}]).encode('utf-8'))
+        with replay.replay(self.server):
+            glossarized_resource = socrata_glossarizer.glossarize_table(self.resource, "opendata.cityofnewyork.us",
+                                                                        backend="soda")
+        assert glossarized_resource[0].keys() == table_glossary_keys
+        assert glossarized_resource[0]['rows'] == 73900
+        assert glossarized_resource[0]['columns'] == len(self.resource['column_names'])
+
+    def test_glossarize_table_soda_bad_response(self):
+        # A count in a format we don't understand flags the resource, rather than taking the run down with it.
+        self.fixtures.add("GET", self.count_uri, headers={'Content-Type': "application/json"},
+                          body=json.dumps([{'count': "73900", 'count_1': "0"}]).encode('utf-8'))
+        with replay.replay(self.server):
+            glossarized_resource = socrata_glossarizer.glossarize_table(self.resource, "opendata.cityofnewyork.us",
+                                                                        backend="soda")
+        assert glossarized_resource == []
+        assert "error" in self.resource['flags']
+
+
 class TestGetSizings(unittest.TestCase):
     def setUp(self):
         self.zip_test_uri = "https://data.cityofnewyork.us/api/views/q68s-8qxv/files/511dbe78-65f3-470f-9cc8" \
@@ -79,21 +154,17 @@ class TestGetSizings(unittest.TestCase):
                                  "-707c785caa08?filename=Broadband%20Data%20Dig%20-%20Datasets.zip"
 
     def test_get_sizings_success_csv(self):
-        sizings = socrata_glossarizer.get_sizings(self.csv_test_uri, None, timeout=20)
+        sizings = socrata_glossarizer.get_sizings(self.csv_test_uri, timeout=20)
         assert sizings and len(sizings) != 0
 
     def test_get_sizings_success_zip(self):
         # More difficult problem than that of a single CSV file.
-        sizings = socrata_glossarizer.get_sizings(self.zip_test_uri, None, timeout=20)
+        sizings = socrata_glossarizer.get_sizings(self.zip_test_uri, timeout=20)
         assert sizings and len(sizings) != 0
 
     def test_get_sizing_fail(self):
-        """
-        The error being raises is not something I am comfortable with, but it is what works for the moment and what
-        the module depends on. See the notes in timeout_process for more details.
-        """
-        with pytest.raises(requests.exceptions.ChunkedEncodingError):
-            socrata_glossarizer.get_sizings(self.zip_fail_test_uri, None, timeout=1)
+        with pytest.raises(executor.TaskTimeoutError):
+            socrata_glossarizer.get_sizings(self.zip_fail_test_uri, timeout=1)
 
 
 nontable_glossary_keys = {'resource', 'column_names', 'created', 'page_views', 'landing_page', 'flags',
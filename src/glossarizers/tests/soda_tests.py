@@ -0,0 +1,83 @@
+"""
+Unit tests for the soda module's view metadata lookups. These replay to a local stub server, not a live portal.
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import soda, replay, session, throttle, metrics, socrata_glossarizer
+# noinspection PyUnresolvedReferences
+from glossarizers.generic import load_resource_list
+
+
+def unthrottle(url):
+    host = throttle.host(url)
+    host.bucket.rate = host.bucket.burst = host.max_rate = float(10 ** 6)
+    host.limit = host.max_concurrency = 1024
+
+
+class TestDownloadLink(unittest.TestCase):
+    def test_blob(self):
+        view = {'id': "q68s-8qxv", 'blobId': "abc", 'blobMimeType': "application/zip"}
+        assert soda.download_link(view, "data.cityofnewyork.us") == \
+            "https://data.cityofnewyork.us/download/q68s-8qxv/application%2Fzip"
+
+    def test_link(self):
+        view = {'id': "rnnj-5mmi", 'metadata': {'additionalAccessPoints': [
+            {'title': "Data", 'urls': {'csv': "http://x.org/a.csv", 'json': "http://x.org/a.json"}}]}}
+        assert soda.download_link(view, "data.cityofnewyork.us") == "http://x.org/a.csv"
+
+        view = {'id': "rnnj-5mmi", 'metadata': {'accessPoints': {'zip': "http://x.org/a.zip"}}}
+        assert soda.download_link(view, "data.cityofnewyork.us") == "http://x.org/a.zip"
+
+        assert soda.download_link({'id': "rnnj-5mmi", 'metadata': {}}, "data.cityofnewyork.us") is None
+
+
+class TestResourceRepresentation(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.domain = "data.cityofnewyork.us"
+        catalog, fixtures = replay.synthesize_socrata(64, domain=self.domain)
+        self.catalog_filename = os.path.join(self.directory, "catalog.json")
+        with open(self.catalog_filename, "w") as fp:
+            json.dump(catalog, fp)
+
+        self.server = replay.StubServer(fixtures).start()
+        unthrottle("https://" + self.domain)
+        metrics.registry.reset()
+
+    def tearDown(self):
+        self.server.close()
+        session.configure(factory=None)
+        shutil.rmtree(self.directory)
+
+    def test_get_download_links(self):
+        with replay.replay(self.server):
+            links = soda.get_download_links(self.domain, ["0000-0000", "aaaa-aaaa"], concurrency=2)
+        assert links == [None, None]
+
+    def test_write_resource_representation(self):
+        for endpoint_type in ["blob", "link"]:
+            out = os.path.join(self.directory, "{0}.json".format(endpoint_type))
+            with replay.replay(self.server):
+                socrata_glossarizer.write_resource_representation(domain=self.domain, out=out,
+                                                                  endpoint_type=endpoint_type,
+                                                                  catalog_filename=self.catalog_filename,
+                                                                  max_age=None, concurrency=4)
+            resources = load_resource_list(out)
+            assert len(resources) == 4
+            for resource in resources:
+                endpoint = resource['landing_page'].split("/")[-1]
+                if endpoint_type == "blob":
+                    assert resource['resource'] == "https://{0}/download/{1}/text%2Fcsv".format(self.domain, endpoint)
+                else:
+                    assert resource['resource'] == "https://files.example.org/{0}.csv".format(endpoint)
+
+        # Without ever needing a browser.
+        assert metrics.registry.counter("download_links", source="views") == 8
+        assert metrics.registry.counter("download_links", source="pager") == 0
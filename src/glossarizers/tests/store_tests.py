@@ -0,0 +1,62 @@
+"""
+Unit tests for the store module.
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import generic, store
+
+
+def make_entry(i, rows):
+    return {'landing_page': "https://data.cityofnewyork.us/d/{0}".format(i),
+            'resource': "https://data.cityofnewyork.us/download/{0}".format(i),
+            'dataset': '.',
+            'rows': rows,
+            'columns': 4,
+            'flags': ['processed'] if i % 2 else []}
+
+
+class TestGlossaryStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "glossary.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_roundtrip(self):
+        glossary = [make_entry(i, i * 1000) for i in range(10)]
+        json_filename = os.path.join(self.directory, "glossary.json")
+        with open(json_filename, "w") as fp:
+            json.dump(glossary, fp)
+
+        with store.GlossaryStore(self.filename) as s:
+            s.import_json('glossary', json_filename)
+            s.export_json('glossary', json_filename)
+            assert len(s.read('glossary', 'rows > ?', (5000,))) == 4
+
+        with open(json_filename, "r") as fp:
+            assert json.load(fp) == glossary
+
+    def test_upsert_and_lookup(self):
+        with store.GlossaryStore(self.filename) as s:
+            s.write('glossary', [make_entry(i, 10) for i in range(3)])
+            s.upsert('glossary', [make_entry(1, 20), make_entry(3, 30)])
+
+            assert [e['rows'] for e in s.read('glossary')] == [10, 20, 10, 30]
+            assert s.lookup('glossary', make_entry(1, 0)['landing_page'])[0]['rows'] == 20
+
+    def test_generic_dispatch(self):
+        resource_list = [make_entry(i, 10) for i in range(4)]
+        generic.write_resource_file(resource_list, self.filename)
+
+        todo, glossary = generic.load_glossary_todo(self.filename, self.filename)
+        assert [r['landing_page'] for r in todo] == [resource_list[0]['landing_page'],
+                                                     resource_list[2]['landing_page']]
+        assert glossary == []
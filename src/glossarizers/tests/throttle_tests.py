@@ -0,0 +1,156 @@
+"""
+Unit tests for the throttle module.
+"""
+
+import unittest
+import asyncio
+import signal
+import threading
+import time
+
+import sys; sys.path.insert(0, '../../')
+# noinspection PyUnresolvedReferences
+from glossarizers import throttle
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or dict()
+
+
+class FakeSession:
+    """
+    Stands in for `requests`, answering every request with the given status code.
+    """
+    def __init__(self, status_code, headers=None, delay=0):
+        self.status_code = status_code
+        self.headers = headers
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return FakeResponse(self.status_code, self.headers)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_reserve(self):
+        bucket = throttle.TokenBucket(rate=10, burst=2)
+        now = bucket.updated
+
+        assert bucket.reserve(now) == 0 and bucket.reserve(now) == 0
+        assert abs(bucket.reserve(now) - 0.1) < 1e-9
+        assert abs(bucket.reserve(now) - 0.2) < 1e-9
+
+        # Tokens drip back in, but no more than the burst.
+        assert bucket.reserve(now + 10) == 0
+        assert bucket.tokens == 1
+
+    def test_pause(self):
+        bucket = throttle.TokenBucket(rate=10, burst=2)
+        now = bucket.updated
+        bucket.pause(5, now=now)
+
+        assert abs(bucket.reserve(now) - 5.1) < 1e-9
+        assert abs(bucket.reserve(now + 5.1) - 0.1) < 1e-9
+
+
+class TestThrottle(unittest.TestCase):
+    def test_aimd(self):
+        t = throttle.Throttle(rate=10, burst=100, concurrency=4, cooldown=60)
+        url = "https://data.gov.sg/api/3/action/package_list"
+
+        for _ in range(10):
+            t.get(url, session=FakeSession(200))
+        stats = t.stats()['data.gov.sg']
+        assert stats['rate'] > 10 and stats['concurrency'] > 4
+
+        # A burst of complaints only cuts the limits once per cooldown.
+        rate = stats['rate']
+        for _ in range(3):
+            t.get(url, session=FakeSession(429))
+        stats = t.stats()['data.gov.sg']
+        assert stats['rate'] == rate / 2 and stats['decreases'] == 1 and stats['throttled'] == 3
+
+        # Hosts are throttled independently.
+        assert t.host("https://example.com/").rate == 10
+
+    def test_retry_after(self):
+        t = throttle.Throttle(rate=100, burst=1)
+        t.get("https://example.com/", session=FakeSession(503, headers={'retry-after': "0.3"}))
+
+        start = time.time()
+        t.get("https://example.com/", session=FakeSession(200))
+        assert time.time() - start >= 0.3
+
+    def test_failures(self):
+        class FailingSession:
+            def request(self, method, url, **kwargs):
+                raise IOError()
+
+        t = throttle.Throttle(rate=10, burst=10)
+        with self.assertRaises(IOError):
+            t.get("https://example.com/", session=FailingSession())
+        with self.assertRaises(ValueError):
+            with t.limit("https://example.com/page"):
+                raise ValueError()
+
+        stats = t.stats()['example.com']
+        assert stats['throttled'] == 2 and t.host("example.com").in_flight == 0
+
+    def test_concurrency(self):
+        t = throttle.Throttle(rate=1000, burst=1000, concurrency=2, max_concurrency=2)
+        session = FakeSession(200, delay=0.05)
+
+        threads = [threading.Thread(target=t.get, args=("https://example.com/",), kwargs={'session': session})
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert session.max_in_flight == 2
+
+    def test_interrupted_wait(self):
+        # A request which is timed out (as by `generic.timeout_process`) while it waits for a token gives its slot back.
+        t = throttle.Throttle(rate=1, burst=1, concurrency=1, max_concurrency=1)
+        host = t.host("example.com")
+        host.reserve()
+
+        def timeout(signum, frame):
+            raise TimeoutError()
+
+        handler = signal.signal(signal.SIGALRM, timeout)
+        try:
+            signal.setitimer(signal.ITIMER_REAL, 0.1)
+            with self.assertRaises(TimeoutError):
+                t.get("https://example.com/", session=FakeSession(200))
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, handler)
+        assert host.in_flight == 0 and host.counts['requests'] == 0
+
+        # Likewise for a task which is cancelled while it waits.
+        host.reserve()
+
+        async def cancel():
+            task = asyncio.ensure_future(host.wait())
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(cancel())
+        finally:
+            loop.close()
+        assert host.in_flight == 0
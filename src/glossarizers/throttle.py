@@ -0,0 +1,371 @@
+"""
+This module implements a per-host request throttle, which every fetch path in this package makes its requests through.
+
+Portals rate limit their clients, some of them heavily (Socrata portals throttle page loads in particular), and a crawl
+which hits a portal too hard gets slowed to a crawl, or banned outright. A crawl which hits it too gently wastes time.
+The right rate differs from portal to portal, and from hour to hour, so rather than guess at it we find it empirically.
+
+Each host gets a `HostThrottle`, which gates requests against that host in two ways. A token bucket limits the rate at
+which requests are started: tokens drip into the bucket at `rate` per second, up to `burst` of them, and each request
+takes one (waiting for it if need be). A concurrency limit caps the number of requests in flight at once. Both limits
+are adjusted after every response, AIMD style (additive increase, multiplicative decrease, as in TCP congestion
+control):
+
+* A response which comes back quickly and without complaint raises the limits a little. The rate goes up by about
+  `increase` requests per second for every second's worth of requests, and the concurrency limit by about one for
+  every limit's worth of responses. Until the host first complains, limits instead go up by `increase` (and one) for
+  every response, doubling every round trip or so, so that a fresh host gets up to speed quickly ("slow start").
+* A response which signals that we are pushing the server too hard cuts the limits by a factor of `decrease`. These
+  are 429 Too Many Requests, any 5xx, failures to get a response at all, and responses much slower (`latency_factor`
+  times, plus `latency_slack` seconds) than the typical response from that host, which is how an overloaded server
+  looks before it starts erroring.
+  Since one overload tends to fail a whole burst of requests at once, limits are cut at most once per `cooldown`
+  seconds. A `Retry-After` header, if there is one, also pauses the bucket for that long.
+
+Left to itself, a host's limits therefore climb until the host starts to complain, back off, and climb again, hovering
+just under the highest rate that the host will sustain.
+
+Hosts are throttled by a shared, module-level `Throttle`. Use `throttle.get`, `throttle.head` and `throttle.request` in
+place of their `requests` namesakes, `HostThrottle.wait` (a coroutine) and `HostThrottle.release` in asynchronous code,
+and the `throttle.limit` context manager for anything else that makes a request (a page load in a browser, say).
+Note that the throttle is per-process: the workers in an `executor.WorkerPool` each throttle themselves separately.
+
+Time spent waiting on the throttle is reported as the `throttle_wait` span, and requests made through it are counted
+(by host, method and status) and timed (see `metrics.py`).
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from . import metrics
+from .session import get_session
+
+
+# Status codes which mean that the server would like us to slow down.
+THROTTLED_STATUS_CODES = frozenset([429, 503])
+
+
+class TokenBucket:
+    """
+    A token bucket. Not thread-safe on its own; `HostThrottle` serializes access to it.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        # `updated` may be in the future, if the bucket has been paused.
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, now=None):
+        """
+        Takes a token from the bucket, going into debt for it if need be. Returns the number of seconds to wait
+        before the token may be used.
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens -= 1
+
+        wait = max(0, self.updated - now)
+        if self.tokens < 0:
+            wait += -self.tokens / self.rate
+        return wait
+
+    def pause(self, seconds, now=None):
+        """
+        Stops tokens from dripping into the bucket for the next `seconds` seconds, and empties it.
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        self.tokens = min(self.tokens, 0)
+        self.updated = max(self.updated, now + seconds)
+
+
+class HostThrottle:
+    """
+    Throttles requests against a single host. See the module docstring for the parameters.
+    """
+    def __init__(self, host, rate=5, burst=5, concurrency=4, min_rate=0.1, max_rate=100, max_concurrency=16,
+                 increase=1, decrease=0.5, latency_factor=4, latency_slack=0.25, cooldown=1):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = float(concurrency)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.latency_slack = latency_slack
+        self.cooldown = cooldown
+        self.slow_start = True
+
+        self.in_flight = 0
+        self.latency = None
+        self.last_decrease = -float('inf')
+        self.counts = {'requests': 0, 'throttled': 0, 'slow': 0, 'decreases': 0}
+        self._condition = threading.Condition()
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def after_fork(self):
+        """
+        Resets the throttle in a newly forked process. The requests that the parent process had in flight at the time
+        of the fork are not the child's to finish, so their concurrency slots are freed up, and the lock is replaced in
+        case some other thread of the parent held it.
+        """
+        self._condition = threading.Condition()
+        self.in_flight = 0
+
+    def try_enter(self):
+        """
+        Takes a concurrency slot, if one is free. Returns whether or not one was.
+        """
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def reserve(self):
+        """
+        Takes a token from the bucket, returning the number of seconds to wait before using it.
+        """
+        with self._condition:
+            return self.bucket.reserve()
+
+    def acquire(self):
+        """
+        Blocks until a request may be made against the host. Every call must be paired with a call to `release`.
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        # The wait for a token may be cut short, e.g. by a SIGALRM timeout (see `generic.timeout_process`) or a
+        # KeyboardInterrupt. Hand the slot back if it is, or else it would be gone for good.
+        try:
+            time.sleep(self.reserve())
+        except BaseException:
+            self._leave()
+            raise
+
+    async def wait(self):
+        """
+        The asynchronous counterpart to `acquire`.
+        """
+        while not self.try_enter():
+            await asyncio.sleep(0.05)
+        # As in `acquire`, if the task is cancelled while it waits for a token.
+        try:
+            await asyncio.sleep(self.reserve())
+        except BaseException:
+            self._leave()
+            raise
+
+    def _leave(self):
+        # Hands back a concurrency slot without having made a request with it.
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def release(self, status=None, latency=None, retry_after=None):
+        """
+        Hands back a concurrency slot, and adjusts the limits based on how the request went.
+
+        Parameters
+        ----------
+        status: int, default None
+            The response's status code, or None if no response was received.
+        latency: float, default None
+            The number of seconds it took for the response to arrive.
+        retry_after: float, default None
+            The number of seconds the server asked us to wait before trying again, if it asked.
+        """
+        now = time.monotonic()
+        with self._condition:
+            self.in_flight -= 1
+            self.counts['requests'] += 1
+
+            throttled = status is None or status in THROTTLED_STATUS_CODES or status >= 500
+            slow = (not throttled and latency is not None and self.latency is not None and
+                    latency > self.latency_factor * self.latency + self.latency_slack)
+
+            if throttled or slow:
+                self.counts['throttled' if throttled else 'slow'] += 1
+                if now - self.last_decrease >= self.cooldown:
+                    self.bucket.rate = max(self.min_rate, self.bucket.rate * self.decrease)
+                    self.limit = max(1.0, self.limit * self.decrease)
+                    self.last_decrease = now
+                    self.counts['decreases'] += 1
+                self.slow_start = False
+            elif self.slow_start:
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.increase)
+                self.limit = min(self.max_concurrency, self.limit + 1)
+            else:
+                self.bucket.rate = min(self.max_rate, self.bucket.rate + self.increase / self.bucket.rate)
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+            if retry_after:
+                self.bucket.pause(retry_after, now=now)
+
+            # Keep a moving average of the latency of healthy responses, to compare new responses against.
+            if latency is not None and not throttled:
+                self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+
+            self._condition.notify_all()
+
+    def stats(self):
+        """
+        Returns the host's current limits and its request counts so far.
+        """
+        with self._condition:
+            return dict(self.counts, rate=self.bucket.rate, concurrency=int(self.limit), latency=self.latency)
+
+
+def retry_after(response):
+    """
+    Returns the number of seconds a response's `Retry-After` header asks us to wait, or None if it has none.
+    """
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def host_of(url):
+    """
+    Returns the host of a URL. Bare hosts are returned as-is.
+    """
+    return urlparse(url).netloc or url
+
+
+class Throttle:
+    """
+    A collection of `HostThrottle` objects, one per host, created as they are needed. Keyword arguments are passed on
+    to each of them.
+    """
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self.hosts = dict()
+        self._lock = threading.Lock()
+
+    def after_fork(self):
+        """
+        Resets every host's throttle in a newly forked process (see `HostThrottle.after_fork`).
+        """
+        self._lock = threading.Lock()
+        for host in self.hosts.values():
+            host.after_fork()
+
+    def host(self, url):
+        """
+        Returns the `HostThrottle` for a URL (or host).
+        """
+        host = host_of(url)
+        with self._lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostThrottle(host, **self.defaults)
+            return self.hosts[host]
+
+    @contextmanager
+    def limit(self, url):
+        """
+        A context manager which throttles whatever is done inside of it as a single request against the URL's host.
+        Exceptions raised inside of it count as failed requests.
+        """
+        host = self.host(url)
+        with metrics.span("throttle_wait", host=host.host):
+            host.acquire()
+        start = time.monotonic()
+        try:
+            yield host
+        except BaseException:
+            host.release(None)
+            raise
+        host.release(200, time.monotonic() - start)
+
+    def request(self, method, url, session=None, **kwargs):
+        """
+        Makes a throttled request. Accepts the same arguments as `requests.request`, plus the session to make the
+        request with (by default, the shared session from `session.get_session`). Note that for streamed requests, the
+        request is considered finished once the response headers arrive.
+        """
+        if session is None:
+            session = get_session()
+        host = self.host(url)
+        with metrics.span("throttle_wait", host=host.host):
+            host.acquire()
+        start = time.monotonic()
+        try:
+            r = session.request(method, url, **kwargs)
+        except BaseException as e:
+            host.release(None)
+            metrics.increment("requests", host=host.host, method=method, status=type(e).__name__)
+            raise
+        elapsed = time.monotonic() - start
+        host.release(r.status_code, elapsed, retry_after(r))
+        metrics.increment("requests", host=host.host, method=method, status=r.status_code)
+        metrics.observe("request_seconds", elapsed, host=host.host, method=method)
+        return r
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        # As with `requests.head`, don't follow redirects unless asked to.
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def stats(self):
+        """
+        Returns `HostThrottle.stats` for every host seen so far.
+        """
+        with self._lock:
+            hosts = list(self.hosts.values())
+        return {host.host: host.stats() for host in hosts}
+
+
+# The throttle shared by every fetch path in this package.
+default_throttle = Throttle()
+
+
+def after_fork():
+    default_throttle.after_fork()
+
+
+def request(method, url, **kwargs):
+    return default_throttle.request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return default_throttle.get(url, **kwargs)
+
+
+def head(url, **kwargs):
+    return default_throttle.head(url, **kwargs)
+
+
+def limit(url):
+    return default_throttle.limit(url)
+
+
+def host(url):
+    return default_throttle.host(url)